@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试程序
+使用可复现的测试数据测量关键路径的性能：
+- recognition: recognize_qr_codes_board1 / recognize_ocr_board2 处理生成的板面图像
+- dispatch: TaskController.handle_command 端到端处理（串口、识别、语音均为桩对象）
+- logger: SystemLogger 每秒写入条目数
+- voice: VoicePlayer 播报队列延迟（从speak()到开始播报）
+- framing: 串口分帧吞吐量（LineFramer / BinaryFramer）
+结果保存为JSON基线，compare命令对比两次结果并标记超过阈值的性能退化。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# 添加模块路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.binary_protocol import BinaryFramer, encode_command
+from modules.logger import SystemLogger
+from modules.serial_comm import LineFramer
+from modules.board_generator import render_board1, render_board2
+from modules.simulation import NullVoicePlayer, STANDARD_COMMANDS
+
+# 可复现的板面测试数据
+BOARD1_FIXTURES = [
+    {'top_left': 'AB', 'top_right': 'BC', 'bottom_left': 'C'},
+    {'top_left': 'A', 'top_right': 'ABC', 'bottom_right': 'B'},
+    {'top_left': 'ABC', 'top_right': 'A', 'bottom_left': 'B', 'bottom_right': 'C'},
+    {'bottom_left': 'AC'},
+    {}
+]
+BOARD2_FIXTURES = [
+    {1: True, 2: True, 3: True, 4: True},
+    {1: True, 2: False, 3: True, 4: False},
+    {1: False, 2: False, 3: False, 4: False}
+]
+
+# 默认的性能退化阈值（百分比）
+DEFAULT_THRESHOLD = 10.0
+
+def metric(value: float, unit: str, higher_is_better: bool) -> Dict:
+    """构建一项指标"""
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """计算已排序数据的分位数"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class _Null:
+    """桩对象：任意方法调用都不做任何事"""
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+class _StubSerial:
+    """桩串口：发送立即完成"""
+    
+    protocol_mode = 'ascii'
+    
+    def send_command_async(self, command):
+        future = Future()
+        future.set_result(True)
+        return future
+        
+    def send_frame_async(self, opcode, payload=b''):
+        return self.send_command_async(payload)
+
+def _load_image_recognition():
+    """导入图像识别模块（依赖pyzbar/pytesseract），不可用时返回None"""
+    try:
+        from modules.image_recognition import ImageRecognition
+        return ImageRecognition
+    except ImportError as e:
+        print(f"跳过: 图像识别依赖不可用 ({str(e)})")
+        return None
+
+def bench_recognition(rounds: int) -> Dict:
+    """二维码/OCR识别耗时"""
+    ImageRecognition = _load_image_recognition()
+    if ImageRecognition is None:
+        return {}
+    
+    import pytesseract
+    recognition = ImageRecognition(frame_source=_Null())
+    results = {}
+    
+    def measure(name, func, images):
+        timings = []
+        for _ in range(rounds):
+            for image in images:
+                start = time.perf_counter()
+                func(image_data=image)
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        results[f'{name}.p50_ms'] = metric(percentile(timings, 0.5) * 1000, 'ms', False)
+        results[f'{name}.p95_ms'] = metric(percentile(timings, 0.95) * 1000, 'ms', False)
+        results[f'{name}.images_per_sec'] = metric(len(timings) / sum(timings), 'images/s', True)
+    
+    board1_images = [render_board1(board) for board in BOARD1_FIXTURES]
+    measure('recognition.qr_board1', recognition.recognize_qr_codes_board1, board1_images)
+    
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        print("跳过OCR: 未安装tesseract")
+        return results
+    
+    board2_images = [render_board2(board) for board in BOARD2_FIXTURES]
+    measure('recognition.ocr_board2', recognition.recognize_ocr_board2, board2_images)
+    return results
+
+def bench_dispatch(rounds: int) -> Dict:
+    """指令处理端到端耗时（识别结果预先计算，不含图像处理）"""
+    ImageRecognition = _load_image_recognition()
+    if ImageRecognition is None:
+        return {}
+    from modules.task_controller import TaskController
+    
+    qr_results = {'top_left': 'AB', 'top_right': 'BC', 'bottom_left': 'C'}
+    ocr_results = {
+        'window_status': {num: {'text': '空闲', 'available': True} for num in range(1, 5)},
+        'available': True
+    }
+    
+    recognition = ImageRecognition(frame_source=_Null())
+    recognition.recognize_qr_codes_board1 = lambda *args, **kwargs: dict(qr_results)
+    recognition.recognize_ocr_board2 = lambda *args, **kwargs: ocr_results
+    
+    controller = TaskController(_Null(), _StubSerial(), recognition, _Null())
+    controller.start()
+    
+    timings = []
+    for _ in range(rounds * 100):
+        for command in STANDARD_COMMANDS:
+            start = time.perf_counter()
+            controller.handle_command(command)
+            timings.append(time.perf_counter() - start)
+    controller.stop()
+    
+    timings.sort()
+    return {
+        'dispatch.commands_per_sec': metric(len(timings) / sum(timings), 'commands/s', True),
+        'dispatch.p50_us': metric(percentile(timings, 0.5) * 1e6, 'us', False),
+        'dispatch.p99_us': metric(percentile(timings, 0.99) * 1e6, 'us', False)
+    }
+
+def bench_logger(rounds: int) -> Dict:
+    """日志写入吞吐量（从log()调用到全部写入文件）"""
+    count = 1000 * rounds
+    with tempfile.TemporaryDirectory() as log_dir:
+        # 日志同时输出到控制台，测量期间屏蔽输出
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            logger = SystemLogger(log_dir=log_dir)
+            start = time.perf_counter()
+            for index in range(count):
+                logger.log_uart_receive(f"check board {index % 2 + 1}")
+            logger.flush_logs()
+            elapsed = time.perf_counter() - start
+            logger.stop()
+    
+    return {'logger.entries_per_sec': metric(count / elapsed, 'entries/s', True)}
+
+def bench_voice(rounds: int) -> Dict:
+    """语音播报队列延迟（模拟播报器，不含TTS本身的耗时）"""
+    started = threading.Event()
+    spoken_at = []
+    
+    class _TimedVoicePlayer(NullVoicePlayer):
+        def _speak_text(self, text):
+            spoken_at.append(time.perf_counter())
+            started.set()
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        player = _TimedVoicePlayer()
+        latencies = []
+        for _ in range(50 * rounds):
+            started.clear()
+            queued_at = time.perf_counter()
+            player.speak("收到静脉血样本")
+            started.wait(timeout=2)
+            latencies.append(spoken_at[-1] - queued_at)
+        player.stop()
+    
+    latencies.sort()
+    return {
+        'voice.queue_latency_p50_ms': metric(percentile(latencies, 0.5) * 1000, 'ms', False),
+        'voice.queue_latency_p95_ms': metric(percentile(latencies, 0.95) * 1000, 'ms', False)
+    }
+
+def bench_framing(rounds: int) -> Dict:
+    """串口分帧吞吐量"""
+    lines = [command.encode('utf-8') + b'\n' for command in STANDARD_COMMANDS] * 2000
+    text_stream = b''.join(lines)
+    frames = [encode_command(command) for command in STANDARD_COMMANDS] * 2000
+    binary_stream = b''.join(frames)
+    chunk_size = 64
+    
+    def measure(framer, stream):
+        best = None
+        for _ in range(rounds):
+            framer.reset()
+            start = time.perf_counter()
+            for offset in range(0, len(stream), chunk_size):
+                framer.feed(stream[offset:offset + chunk_size])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    
+    text_time = measure(LineFramer(), text_stream)
+    binary_time = measure(BinaryFramer(), binary_stream)
+    return {
+        'framing.line_mb_per_sec': metric(len(text_stream) / text_time / 1e6, 'MB/s', True),
+        'framing.lines_per_sec': metric(len(lines) / text_time, 'lines/s', True),
+        'framing.binary_frames_per_sec': metric(len(frames) / binary_time, 'frames/s', True)
+    }
+
+BENCHMARKS: Dict[str, Callable[[int], Dict]] = {
+    'recognition': bench_recognition,
+    'dispatch': bench_dispatch,
+    'logger': bench_logger,
+    'voice': bench_voice,
+    'framing': bench_framing
+}
+
+def run_benchmarks(names: List[str], rounds: int) -> Dict:
+    """运行指定的基准测试"""
+    results = {}
+    for name in names:
+        print(f"运行基准测试: {name} ...")
+        start = time.perf_counter()
+        results.update(BENCHMARKS[name](rounds))
+        print(f"  完成，耗时 {time.perf_counter() - start:.2f}s")
+    
+    return {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rounds': rounds,
+        'results': results
+    }
+
+def print_results(report: Dict):
+    """打印基准测试结果"""
+    print("\n=== 基准测试结果 ===")
+    for name, item in sorted(report['results'].items()):
+        print(f"{name:<40}{item['value']:>14.2f} {item['unit']}")
+    print("====================\n")
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """对比两次结果
+    
+    Args:
+        baseline: 基线结果
+        current: 当前结果
+        threshold: 退化阈值（百分比）
+    
+    Returns:
+        list: 退化的指标名称
+    """
+    regressions = []
+    print(f"\n=== 基准对比（阈值 {threshold:g}%）===")
+    print(f"{'指标':<40}{'基线':>12}{'当前':>12}{'变化':>10}")
+    
+    for name, item in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            print(f"{name:<40}{'-':>12}{item['value']:>12.2f}{'新增':>10}")
+            continue
+        
+        change = (item['value'] - base['value']) / base['value'] * 100
+        worse = -change if item['higher_is_better'] else change
+        mark = ''
+        if worse > threshold:
+            regressions.append(name)
+            mark = '  ✗ 退化'
+        elif -worse > threshold:
+            mark = '  ✓ 提升'
+        print(f"{name:<40}{base['value']:>12.2f}{item['value']:>12.2f}{change:>+9.1f}%{mark}")
+    
+    print(f"\n退化指标: {len(regressions)}")
+    print("=" * 30 + "\n")
+    return regressions
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试程序')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--only', help=f"只运行指定项（逗号分隔: {','.join(BENCHMARKS)}）")
+    run_parser.add_argument('--rounds', type=int, default=3, help='每项测试的轮数 (默认: 3)')
+    run_parser.add_argument('--output', '-o', help='保存结果的JSON文件（可作为基线）')
+    run_parser.add_argument('--baseline', help='运行后与此基线对比')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help=f'退化阈值百分比 (默认: {DEFAULT_THRESHOLD:g})')
+    
+    compare_parser = subparsers.add_parser('compare', help='对比两次基准测试结果')
+    compare_parser.add_argument('baseline', help='基线结果JSON')
+    compare_parser.add_argument('current', help='当前结果JSON')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f'退化阈值百分比 (默认: {DEFAULT_THRESHOLD:g})')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'compare':
+        regressions = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+        return 1 if regressions else 0
+    
+    if args.command != 'run':
+        parser.print_help()
+        return 0
+    
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"未知的基准测试: {', '.join(unknown)}")
+        return 1
+    
+    report = run_benchmarks(names, args.rounds)
+    print_results(report)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+    
+    if args.baseline:
+        regressions = compare_results(load_results(args.baseline), report, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
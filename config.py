@@ -25,6 +25,29 @@ class Config:
     # 串口重试次数
     SERIAL_MAX_RETRIES = 3
     
+    # 串口发送队列长度（队列满时新的响应将被丢弃并记录错误）
+    SERIAL_SEND_QUEUE_SIZE = 64
+    
+    # 指令流水线：下位机指令带序列号（如 "#17 check board 2" -> "#17 ok"），
+    # 多条指令并发处理并可乱序返回；不带序列号的指令仍按一问一答处理
+    SERIAL_PIPELINING = False
+    
+    # 流水线并发处理线程数
+    PIPELINE_WORKERS = 4
+    
+    # Linux低延迟模式：关闭USB转串口驱动的缓冲延迟（默认最多16ms），不支持的设备自动跳过
+    SERIAL_LOW_LATENCY = False
+    
+    # 串口断开（如USB转串口适配器复位）后自动重连，重连间隔按指数退避增长到最大值（秒）
+    SERIAL_AUTO_RECONNECT = True
+    SERIAL_RECONNECT_MAX_DELAY = 10
+    
+    # 启动时指定串口连接失败，则并行探测候选串口，握手成功的作为机器人串口
+    SERIAL_AUTO_DISCOVER = True
+    SERIAL_DISCOVERY_PATTERNS = ['/dev/ttyUSB*', '/dev/ttyACM*']
+    SERIAL_HANDSHAKE_REQUEST = 'ping'
+    SERIAL_HANDSHAKE_RESPONSE = 'pong'
+    
     # ==================== 图像识别配置 ====================
     # 摄像头设备ID
     CAMERA_DEVICE_ID = 0
@@ -33,6 +56,10 @@ class Config:
     IMAGE_WIDTH = 640
     IMAGE_HEIGHT = 480
     
+    # 图像来源（None为CAMERA_DEVICE_ID对应的摄像头），可设为视频文件、图像目录
+    # 或共享内存环形缓冲 "shm:<名称>:<宽>x<高>"，用于离线回放录制的画面
+    FRAME_SOURCE = None
+    
     # OCR语言设置
     OCR_LANGUAGE = 'chi_sim'  # 简体中文
     
@@ -62,12 +89,65 @@ class Config:
     # 日志文件名格式
     LOG_FILENAME_FORMAT = 'pharmacy_robot_%Y%m%d_%H%M%S.log'
     
-    # 日志级别
+    # 日志级别（DEBUG/INFO/WARNING/ERROR）
     LOG_LEVEL = 'INFO'
     
+    # 各事件类型的日志级别（覆盖默认值：错误为ERROR，调试为DEBUG，其他为INFO）
+    # 例如 {'识别': 'DEBUG'} 在INFO级别下不记录识别细节
+    LOG_EVENT_LEVELS = {}
+    
     # 日志保留天数
     LOG_RETENTION_DAYS = 30
     
+    # 日志定期落盘（fsync）间隔（秒），错误日志和停止时立即落盘
+    LOG_FSYNC_INTERVAL = 1.0
+    
+    # 结构化日志格式（'jsonl'、'binary'紧凑二进制，None表示不输出）
+    LOG_STRUCTURED_FORMAT = 'jsonl'
+    
+    # 日志轮转：单个文件最大字节数（0表示不按大小轮转）
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    
+    # 日志轮转：单个文件最长时间（秒，0表示不按时间轮转）
+    LOG_ROTATE_INTERVAL = 24 * 3600
+    
+    # 是否在后台压缩轮转后的日志（gzip）
+    LOG_COMPRESS_ROTATED = True
+    
+    # 内存中保留的最近日志条数（get_recent_logs）
+    LOG_RECENT_BUFFER_SIZE = 1000
+    
+    # 重复日志合并窗口（秒）：同一事件类型、同一消息在窗口内只记录第一条，
+    # 窗口结束时记录一条重复次数汇总（0表示不合并）
+    LOG_REPEAT_WINDOW = 10.0
+    
+    # 是否为轮转后的日志建立索引（logs/log_index.jsonl，供log_query.py按时间、事件类型和指令快速查询）
+    LOG_INDEX = True
+    
+    # 飞行记录器保留的最近事件条数（mmap环形文件logs/flight_recorder.bin，
+    # 进程崩溃后用flight_recorder_dump.py查看；0表示不启用）
+    LOG_FLIGHT_RECORDER_SLOTS = 4096
+    
+    # 控制台日志输出速率限制（行/秒，0表示不限速，None表示不输出到控制台）
+    # 超出的日志只写入日志文件，控制台显示省略的条数
+    LOG_CONSOLE_RATE = 50
+    
+    # syslog/journald套接字路径（如'/dev/log'，None表示不发送）
+    LOG_SYSLOG_ADDRESS = None
+    
+    # ==================== 遥测数据配置 ====================
+    # 是否记录遥测数据（任务耗时、指令响应耗时、识别成功率，SQLite，用telemetry_report.py查看）
+    TELEMETRY_ENABLED = False
+    
+    # 遥测数据库路径
+    TELEMETRY_DB_PATH = 'logs/telemetry.db'
+    
+    # 每个事务最多写入的记录数
+    TELEMETRY_BATCH_SIZE = 200
+    
+    # 最长写入间隔（秒）
+    TELEMETRY_FLUSH_INTERVAL = 1.0
+    
     # ==================== 任务控制配置 ====================
     # 任务超时时间（秒）
     TASK_TIMEOUT = 30
@@ -82,12 +162,33 @@ class Config:
     # 调试模式
     DEBUG_MODE = False
     
-    # 模拟模式（不连接真实硬件）
+    # 模拟模式（不连接真实硬件）：虚拟下位机通过伪终端发送场景指令，
+    # 摄像头替换为生成的板面图像，语音播报不发声
     SIMULATION_MODE = False
     
+    # 模拟模式运行的场景（modules/simulation.py中的预定义场景名称或JSON场景文件）
+    SIMULATION_SCENARIO = 'standard'
+    
+    # 模拟语音播报耗时（按字数估算），用于测试播报队列积压
+    SIMULATION_VOICE_TIMING = False
+    
+    # 录制的板面图像（为None时按场景内容生成）
+    SIMULATION_BOARD1_IMAGE = None
+    SIMULATION_BOARD2_IMAGE = None
+    
     # 系统启动延迟（秒）
     STARTUP_DELAY = 2
     
+    # ==================== 多机器人会话配置 ====================
+    # 会话列表，每项为一个机器人（使用 --multi 启动）
+    # 必填: name, port；可选: baudrate, timeout, camera_device_id, low_latency（默认取上面的单机配置）
+    # 示例: [{'name': 'robot1', 'port': '/dev/ttyUSB0', 'camera_device_id': 0},
+    #        {'name': 'robot2', 'port': '/dev/ttyUSB1', 'camera_device_id': 1}]
+    ROBOT_SESSIONS = []
+    
+    # 共享图像识别工作线程数
+    VISION_WORKER_COUNT = 2
+    
     # ==================== 窗口映射配置 ====================
     # 体检区窗口映射
     MEDICAL_EXAM_WINDOWS = {
@@ -111,7 +212,11 @@ class Config:
             'port': cls.SERIAL_PORT,
             'baudrate': cls.SERIAL_BAUDRATE,
             'timeout': cls.SERIAL_TIMEOUT,
-            'max_retries': cls.SERIAL_MAX_RETRIES
+            'max_retries': cls.SERIAL_MAX_RETRIES,
+            'send_queue_size': cls.SERIAL_SEND_QUEUE_SIZE,
+            'auto_reconnect': cls.SERIAL_AUTO_RECONNECT,
+            'reconnect_max_delay': cls.SERIAL_RECONNECT_MAX_DELAY,
+            'low_latency': cls.SERIAL_LOW_LATENCY
         }
     
     @classmethod
@@ -120,7 +225,8 @@ class Config:
         return {
             'device_id': cls.CAMERA_DEVICE_ID,
             'width': cls.IMAGE_WIDTH,
-            'height': cls.IMAGE_HEIGHT
+            'height': cls.IMAGE_HEIGHT,
+            'frame_source': cls.FRAME_SOURCE
         }
     
     @classmethod
@@ -141,9 +247,56 @@ class Config:
             'log_dir': cls.LOG_DIR,
             'filename_format': cls.LOG_FILENAME_FORMAT,
             'level': cls.LOG_LEVEL,
-            'retention_days': cls.LOG_RETENTION_DAYS
+            'retention_days': cls.LOG_RETENTION_DAYS,
+            'fsync_interval': cls.LOG_FSYNC_INTERVAL,
+            'structured_format': cls.LOG_STRUCTURED_FORMAT,
+            'max_bytes': cls.LOG_MAX_BYTES,
+            'rotate_interval': cls.LOG_ROTATE_INTERVAL,
+            'compress_rotated': cls.LOG_COMPRESS_ROTATED,
+            'recent_size': cls.LOG_RECENT_BUFFER_SIZE,
+            'event_levels': cls.LOG_EVENT_LEVELS,
+            'repeat_window': cls.LOG_REPEAT_WINDOW,
+            'flight_recorder_slots': cls.LOG_FLIGHT_RECORDER_SLOTS,
+            'index_logs': cls.LOG_INDEX,
+            'console_rate': cls.LOG_CONSOLE_RATE,
+            'syslog_address': cls.LOG_SYSLOG_ADDRESS
         }
     
+    @classmethod
+    def get_logger_options(cls):
+        """获取SystemLogger的参数（不含日志目录）"""
+        log_config = cls.get_log_config()
+        return {key: log_config[key] for key in (
+            'filename_format', 'retention_days', 'fsync_interval', 'structured_format',
+            'max_bytes', 'rotate_interval', 'compress_rotated', 'recent_size', 'level', 'event_levels',
+            'repeat_window', 'flight_recorder_slots', 'index_logs', 'console_rate', 'syslog_address'
+        )}
+    
+    @classmethod
+    def get_telemetry_config(cls):
+        """获取遥测数据配置"""
+        return {
+            'enabled': cls.TELEMETRY_ENABLED,
+            'db_path': cls.TELEMETRY_DB_PATH,
+            'batch_size': cls.TELEMETRY_BATCH_SIZE,
+            'flush_interval': cls.TELEMETRY_FLUSH_INTERVAL
+        }
+    
+    @classmethod
+    def get_session_configs(cls):
+        """获取多机器人会话配置（缺省项使用单机配置补全）"""
+        session_configs = []
+        for i, session in enumerate(cls.ROBOT_SESSIONS, 1):
+            session_configs.append({
+                'name': session.get('name', f'robot{i}'),
+                'port': session['port'],
+                'baudrate': session.get('baudrate', cls.SERIAL_BAUDRATE),
+                'timeout': session.get('timeout', cls.SERIAL_TIMEOUT),
+                'camera_device_id': session.get('camera_device_id', cls.CAMERA_DEVICE_ID),
+                'low_latency': session.get('low_latency', cls.SERIAL_LOW_LATENCY)
+            })
+        return session_configs
+    
     @classmethod
     def load_from_env(cls):
         """从环境变量加载配置（仅覆盖已设置的环境变量）"""
@@ -159,6 +312,15 @@ class Config:
         if 'SERIAL_TIMEOUT' in os.environ:
             cls.SERIAL_TIMEOUT = float(os.getenv('SERIAL_TIMEOUT'))
             env_loaded = True
+        if 'SERIAL_PIPELINING' in os.environ:
+            cls.SERIAL_PIPELINING = os.getenv('SERIAL_PIPELINING', 'False').lower() == 'true'
+            env_loaded = True
+        if 'SERIAL_LOW_LATENCY' in os.environ:
+            cls.SERIAL_LOW_LATENCY = os.getenv('SERIAL_LOW_LATENCY', 'False').lower() == 'true'
+            env_loaded = True
+        if 'SERIAL_AUTO_DISCOVER' in os.environ:
+            cls.SERIAL_AUTO_DISCOVER = os.getenv('SERIAL_AUTO_DISCOVER', 'True').lower() == 'true'
+            env_loaded = True
         
         # 摄像头配置
         if 'CAMERA_DEVICE_ID' in os.environ:
@@ -170,6 +332,9 @@ class Config:
         if 'IMAGE_HEIGHT' in os.environ:
             cls.IMAGE_HEIGHT = int(os.getenv('IMAGE_HEIGHT'))
             env_loaded = True
+        if 'FRAME_SOURCE' in os.environ:
+            cls.FRAME_SOURCE = os.getenv('FRAME_SOURCE')
+            env_loaded = True
         
         # TTS配置
         if 'TTS_ENGINE' in os.environ:
@@ -190,6 +355,11 @@ class Config:
             cls.SIMULATION_MODE = os.getenv('SIMULATION_MODE', 'False').lower() == 'true'
             env_loaded = True
         
+        # 日志配置
+        if 'LOG_LEVEL' in os.environ:
+            cls.LOG_LEVEL = os.getenv('LOG_LEVEL').upper()
+            env_loaded = True
+        
         if env_loaded:
             print("已从环境变量加载部分配置")
         else:
@@ -207,6 +377,11 @@ class Config:
         print(f"日志目录: {cls.LOG_DIR}")
         print(f"调试模式: {cls.DEBUG_MODE}")
         print(f"模拟模式: {cls.SIMULATION_MODE}")
+        if cls.SIMULATION_MODE:
+            print(f"模拟场景: {cls.SIMULATION_SCENARIO}")
+        if cls.ROBOT_SESSIONS:
+            print(f"多机器人会话: {', '.join(s['name'] + '@' + s['port'] for s in cls.get_session_configs())}")
+            print(f"图像识别工作线程: {cls.VISION_WORKER_COUNT}")
         print("================\n")
 
     @classmethod
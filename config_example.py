@@ -17,6 +17,21 @@ SERIAL_BAUDRATE = 115200
 # 串口超时时间（秒）
 SERIAL_TIMEOUT = 1
 
+# 指令流水线（下位机固件需支持 "#序号 指令" 格式）
+# SERIAL_PIPELINING = True
+# PIPELINE_WORKERS = 4
+
+# Linux低延迟模式（USB转串口适配器，需要对设备有写权限）
+# SERIAL_LOW_LATENCY = True
+
+# 串口断线自动重连（指数退避，最大间隔秒数）
+# SERIAL_AUTO_RECONNECT = True
+# SERIAL_RECONNECT_MAX_DELAY = 10
+
+# 启动时串口不可用则并行探测候选串口（下位机需对 "ping" 回复 "pong"）
+# SERIAL_AUTO_DISCOVER = True
+# SERIAL_DISCOVERY_PATTERNS = ['/dev/ttyUSB*', '/dev/ttyACM*']
+
 # ==================== 图像识别配置 ====================
 # 摄像头设备ID
 CAMERA_DEVICE_ID = 0
@@ -25,6 +40,9 @@ CAMERA_DEVICE_ID = 0
 IMAGE_WIDTH = 640
 IMAGE_HEIGHT = 480
 
+# 图像来源（默认摄像头），离线回放录制的画面时可设为视频文件或图像目录
+# FRAME_SOURCE = 'captures/run_20250628.avi'
+
 # ==================== 语音播报配置 ====================
 # TTS引擎类型 ('pyttsx3' 或 'system')
 TTS_ENGINE = 'pyttsx3'
@@ -42,6 +60,22 @@ DEBUG_MODE = False
 # 模拟模式（不连接真实硬件）
 SIMULATION_MODE = False
 
+# 模拟场景：standard / window_busy / no_qr / ping，或JSON场景文件路径
+# SIMULATION_SCENARIO = 'standard'
+# 使用录制的板面图像代替生成的图像
+# SIMULATION_BOARD1_IMAGE = 'captures/board1.jpg'
+# SIMULATION_BOARD2_IMAGE = 'captures/board2.jpg'
+
+# ==================== 多机器人会话配置 ====================
+# 一台上位机同时驱动多个机器人（使用 --multi 启动）
+# ROBOT_SESSIONS = [
+#     {'name': 'robot1', 'port': '/dev/ttyUSB0', 'camera_device_id': 0},
+#     {'name': 'robot2', 'port': '/dev/ttyUSB1', 'camera_device_id': 1},
+# ]
+#
+# 共享图像识别工作线程数
+# VISION_WORKER_COUNT = 2
+
 # ==================== 使用说明 ====================
 """
 1. 复制此文件为 config_local.py
@@ -52,9 +86,11 @@ SIMULATION_MODE = False
 常用命令行参数：
   --port /dev/ttyUSB0    指定串口设备
   --debug               启用调试模式
-  --simulation          启用模拟模式
+  --simulation          启用模拟模式（虚拟下位机运行场景脚本后退出）
+  --scenario ping       指定模拟场景（配合 --repeat 100 做延迟测试）
   --config              显示当前配置
   --interactive         启动交互模式
+  --multi               按 ROBOT_SESSIONS 启动多机器人会话
 
 环境变量配置（可选）：
   export SERIAL_PORT=/dev/ttyUSB0
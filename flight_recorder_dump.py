@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞行记录解码程序
+解码飞行记录器的mmap环形文件（logs/flight_recorder.bin，上次运行的记录为
+flight_recorder.prev.bin），按时间顺序输出崩溃或卡死前的最近事件。
+系统运行中也可以直接读取，查看卡死进程最后在做什么。
+
+示例:
+    python flight_recorder_dump.py
+    python flight_recorder_dump.py logs/flight_recorder.prev.bin --last 100 --type 错误
+    python flight_recorder_dump.py logs/robot1 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+# 添加模块路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.flight_recorder import STATE_CLOSED, read_flight_recorder
+
+def resolve_path(path):
+    """日志目录解析为其中的记录文件"""
+    if os.path.isdir(path):
+        return os.path.join(path, 'flight_recorder.bin')
+    return path
+
+def format_record(record):
+    """格式化为与系统日志相同的行格式（时间精确到毫秒）"""
+    timestamp = datetime.fromtimestamp(record['ts']).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return f"[{timestamp}] [{record['type']}] {record['msg']}"
+
+def main():
+    parser = argparse.ArgumentParser(description='飞行记录解码程序')
+    parser.add_argument('path', nargs='?', default='logs',
+                        help='记录文件或日志目录 (默认: logs)')
+    parser.add_argument('--last', '-n', type=int, help='只输出最后N条记录')
+    parser.add_argument('--type', '-t', action='append', dest='event_types',
+                        help='只输出该事件类型（可重复指定）')
+    parser.add_argument('--json', action='store_true', help='每行输出一个JSON记录')
+    
+    args = parser.parse_args()
+    path = resolve_path(args.path)
+    
+    try:
+        header, records = read_flight_recorder(path)
+    except (OSError, ValueError) as e:
+        print(f"读取飞行记录失败: {str(e)}", file=sys.stderr)
+        return 1
+    
+    if args.event_types:
+        records = [record for record in records if record['type'] in args.event_types]
+    if args.last:
+        records = records[-args.last:]
+    
+    if args.json:
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False))
+        return 0
+    
+    start_time = datetime.fromtimestamp(header['start_time']).strftime('%Y-%m-%d %H:%M:%S')
+    state = '正常退出' if header['state'] == STATE_CLOSED else '未正常退出（崩溃、被杀或仍在运行）'
+    print(f"飞行记录: {path}")
+    print(f"进程: {header['pid']}，启动时间: {start_time}，状态: {state}")
+    print(f"槽位: {header['slot_count']} x {header['slot_size']}B，输出 {len(records)} 条记录")
+    print('=' * 50)
+    for record in records:
+        print(format_record(record))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
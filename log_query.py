@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志查询程序
+按时间范围、事件类型、文字或指令/响应查询多个会话、多个轮转文件（含.log.gz）的日志。
+查询前增量索引新增或增长的日志（已索引的部分不再读取），
+然后只读取索引中可能匹配的块，不需要扫描全部日志。
+
+示例:
+    python log_query.py logs --type 错误 --since 2025-06-01
+    python log_query.py logs --command "check board 2" --reply wait
+    python log_query.py logs --since "2025-06-28 12:00" --until "2025-06-28 13:00" --text timeout
+    python log_query.py logs --count --since 2025-06-01
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加模块路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.log_index import LOG_FILE_PATTERN, count_logs, normalize_time, query_logs
+
+def main():
+    parser = argparse.ArgumentParser(description='日志查询程序')
+    parser.add_argument('log_dirs', nargs='*', default=['logs'],
+                        help='日志目录，包含子目录中的会话日志 (默认: logs)')
+    parser.add_argument('--since', '-s', help='开始时间（YYYY-MM-DD [HH:MM[:SS]]）')
+    parser.add_argument('--until', '-u', help='结束时间（YYYY-MM-DD [HH:MM[:SS]]，只有日期时包含当天）')
+    parser.add_argument('--type', '-t', action='append', dest='event_types',
+                        help='事件类型，如 错误、UART接收（可重复指定）')
+    parser.add_argument('--text', help='消息包含的文字')
+    parser.add_argument('--command', '-c', help='UART接收指令，输出指令及其响应')
+    parser.add_argument('--reply', '-r', help='只输出响应为此内容的指令（与--command一起使用）')
+    parser.add_argument('--count', action='store_true', help='只统计各事件类型的条数')
+    parser.add_argument('--with-filename', '-H', action='store_true', help='每条日志前输出文件名')
+    parser.add_argument('--no-update', action='store_true', help='不索引新日志，只查询已有索引')
+    parser.add_argument('--file-pattern', default=LOG_FILE_PATTERN,
+                        help=f'日志文件名通配符，不含扩展名 (默认: {LOG_FILE_PATTERN})')
+    
+    args = parser.parse_args()
+    
+    if args.reply and not args.command:
+        parser.error("--reply需要与--command一起使用")
+    try:
+        since = normalize_time(args.since) if args.since else None
+        until = normalize_time(args.until, end=True) if args.until else None
+    except ValueError as e:
+        parser.error(str(e))
+    
+    start_time = time.time()
+    
+    if args.count:
+        counts = count_logs(args.log_dirs, since, until, update=not args.no_update,
+                            file_pattern=args.file_pattern)
+        for event_type, count in sorted(counts.items(), key=lambda item: -item[1]):
+            if not args.event_types or event_type in args.event_types:
+                print(f"{event_type:<10} {count}")
+        print(f"耗时 {time.time() - start_time:.3f}s", file=sys.stderr)
+        return 0
+    
+    matched = 0
+    try:
+        for path, text in query_logs(args.log_dirs, since, until, args.event_types, args.text,
+                                     args.command, args.reply, update=not args.no_update,
+                                     file_pattern=args.file_pattern):
+            matched += 1
+            if args.with_filename:
+                text = ''.join(f"{path}: {line}" for line in text.splitlines(keepends=True))
+            sys.stdout.write(text)
+    except BrokenPipeError:
+        # 输出到head等命令时提前关闭
+        return 0
+    
+    print(f"匹配 {matched} 条，耗时 {time.time() - start_time:.3f}s", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志回放压测程序
+解析系统日志中的 [UART接收] 指令和 [UART发送] 响应，通过伪终端（或指定串口）
+按原速、N倍速或最大速度重新发送给运行中的系统，对比响应与日志记录是否一致，
+并统计每种指令的响应延迟分位数和吞吐量。线上运行的日志即可作为回归和性能测试用例。
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import serial
+
+# 添加模块路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.serial_comm import LineFramer, read_serial_chunk
+from modules.sequenced_protocol import parse_sequenced
+from modules.simulation import VirtualMCU
+
+# 日志行格式: [2025-06-28 12:20:12] [UART接收] start
+LOG_LINE_PATTERN = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] \[(UART接收|UART发送)\] (.*)$')
+
+# 重复日志汇总: check board 1 （又重复12次，12:20:12.345 ~ 12:20:20.123）
+REPEAT_PATTERN = re.compile(r'^(.*) （又重复(\d+)次，(\d{2}:\d{2}:\d{2}\.\d{3}) ~ (\d{2}:\d{2}:\d{2}\.\d{3})）$')
+
+def expand_repeats(timestamp: datetime, text: str):
+    """展开重复日志汇总为各次的(时间, 消息)，时间在首末次之间均匀分布
+    
+    Args:
+        timestamp: 汇总日志行的时间（晚于末次重复）
+        text: 日志消息
+    """
+    match = REPEAT_PATTERN.match(text)
+    if not match:
+        return [(timestamp, text)]
+    
+    def to_datetime(clock):
+        value = datetime.combine(timestamp.date(), datetime.strptime(clock, '%H:%M:%S.%f').time())
+        # 汇总在次日写入
+        return value - timedelta(days=1) if value > timestamp + timedelta(seconds=1) else value
+    
+    count = int(match.group(2))
+    first, last = to_datetime(match.group(3)), to_datetime(match.group(4))
+    return [(first + (last - first) * i / count, match.group(1)) for i in range(1, count + 1)]
+
+def parse_log_files(paths: List[str]) -> List[Dict]:
+    """解析日志文件，将每条指令与其响应配对
+    
+    不带序列号的指令与其后的第一条响应配对；带序列号的指令（流水线模式）
+    按序列号配对。没有记录到响应的指令，其响应为None。
+    合并的重复日志按重复次数展开。
+    
+    Args:
+        paths: 日志文件列表
+    
+    Returns:
+        list: [{'time': datetime, 'command': str, 'reply': str或None, 'file': str}, ...]
+    """
+    entries = []
+    for path in paths:
+        pending = []
+        sequenced = {}
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = LOG_LINE_PATTERN.match(line.rstrip('\n'))
+                if not match:
+                    continue
+                timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
+                event_type = match.group(2)
+                
+                for timestamp, text in expand_repeats(timestamp, match.group(3).strip()):
+                    if event_type == 'UART接收':
+                        entry = {'time': timestamp, 'command': text, 'reply': None, 'file': path}
+                        entries.append(entry)
+                        seq, _ = parse_sequenced(text)
+                        if seq is not None:
+                            sequenced[seq] = entry
+                        else:
+                            pending.append(entry)
+                        continue
+                    
+                    seq, _ = parse_sequenced(text)
+                    if seq is not None and seq in sequenced:
+                        sequenced.pop(seq)['reply'] = text
+                    elif pending:
+                        pending.pop(0)['reply'] = text
+    return entries
+
+def expand_log_paths(patterns: List[str]) -> List[str]:
+    """展开日志路径（支持目录和通配符，包括轮转后压缩的.log.gz），按文件名排序"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in ('pharmacy_robot_*.log', 'pharmacy_robot_*.log.gz'):
+                paths.extend(glob.glob(os.path.join(pattern, '**', name), recursive=True))
+        else:
+            paths.extend(glob.glob(pattern))
+    return sorted(set(paths))
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """计算已排序数据的分位数"""
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+class SerialTarget:
+    """通过已有串口（如实机或socat桥接的伪终端）回放"""
+    
+    def __init__(self, port: str, baudrate: int = 115200):
+        self.serial_conn = serial.Serial(port=port, baudrate=baudrate, timeout=0)
+        self.framer = LineFramer()
+        
+    def request(self, command: str, timeout: float = 10.0):
+        """发送指令并等待一行响应，返回(响应, 往返时间)，超时返回(None, None)"""
+        self.serial_conn.reset_input_buffer()
+        self.framer.reset()
+        sent_at = time.monotonic()
+        self.serial_conn.write((command + '\n').encode('utf-8'))
+        
+        while True:
+            remaining = timeout - (time.monotonic() - sent_at)
+            if remaining <= 0:
+                return None, None
+            chunk = read_serial_chunk(self.serial_conn, timeout=remaining)
+            lines = self.framer.feed(chunk) if chunk else []
+            if lines:
+                reply, received_at = lines[0]
+                return reply, received_at - sent_at
+        
+    def close(self):
+        self.serial_conn.close()
+
+class LogReplayer:
+    """日志回放器"""
+    
+    def __init__(self, target, speed: Optional[float] = 1.0, timeout: float = 10.0,
+                 max_gap: Optional[float] = None):
+        """初始化回放器
+        
+        Args:
+            target: 提供request(command, timeout)的对象（VirtualMCU或SerialTarget）
+            speed: 回放倍速（None表示最大速度：收到响应立即发送下一条）
+            timeout: 单条指令等待响应的超时（秒）
+            max_gap: 日志中两条指令的最大间隔（秒），更长的空闲时间被压缩
+        """
+        self.target = target
+        self.speed = speed
+        self.timeout = timeout
+        self.max_gap = max_gap
+        
+    def _schedule(self, entries: List[Dict]) -> List[float]:
+        """计算每条指令相对回放开始的发送时间（秒，未除以倍速）
+        
+        不同日志文件之间的间隔不计入，超过max_gap的间隔按max_gap计算。
+        """
+        offsets = []
+        offset = 0.0
+        previous = None
+        for entry in entries:
+            if previous is not None and previous['file'] == entry['file']:
+                gap = (entry['time'] - previous['time']).total_seconds()
+                if self.max_gap is not None:
+                    gap = min(gap, self.max_gap)
+                offset += max(gap, 0.0)
+            offsets.append(offset)
+            previous = entry
+        return offsets
+        
+    def replay(self, entries: List[Dict]) -> Dict:
+        """回放指令并生成报告
+        
+        指令按日志中的时间间隔（除以倍速）发送；和下位机一样，
+        收到上一条响应后才发送下一条。
+        
+        Args:
+            entries: parse_log_files()的结果
+        """
+        results = []
+        offsets = self._schedule(entries)
+        start_time = time.monotonic()
+        
+        for index, (entry, offset) in enumerate(zip(entries, offsets), 1):
+            if self.speed:
+                delay = start_time + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            
+            reply, rtt = self.target.request(entry['command'], self.timeout)
+            results.append({
+                'command': entry['command'],
+                'expected': entry['reply'],
+                'reply': reply,
+                'rtt': rtt,
+                'match': entry['reply'] is None or reply == entry['reply']
+            })
+            
+            if index % 100 == 0:
+                print(f"已回放 {index}/{len(entries)} 条指令")
+        
+        elapsed = time.monotonic() - start_time
+        return self._build_report(results, elapsed)
+        
+    def _build_report(self, results: List[Dict], elapsed: float) -> Dict:
+        """按指令统计延迟分位数和吞吐量"""
+        by_command = {}
+        for result in results:
+            if result['rtt'] is not None:
+                # 带序列号的指令按指令内容归类
+                _, body = parse_sequenced(result['command'])
+                by_command.setdefault(body, []).append(result['rtt'])
+        
+        latency = {}
+        for command, rtts in sorted(by_command.items()):
+            rtts.sort()
+            latency[command] = {
+                'count': len(rtts),
+                'p50': percentile(rtts, 0.50),
+                'p95': percentile(rtts, 0.95),
+                'p99': percentile(rtts, 0.99),
+                'max': rtts[-1]
+            }
+        
+        return {
+            'total': len(results),
+            'mismatches': [result for result in results if not result['match']],
+            'timeouts': sum(1 for result in results if result['reply'] is None),
+            'elapsed': elapsed,
+            'throughput': len(results) / elapsed if elapsed > 0 else 0,
+            'latency': latency,
+            'results': results
+        }
+
+def print_report(report: Dict, max_diffs: int = 20):
+    """打印回放报告"""
+    print("\n=== 回放报告 ===")
+    print(f"指令数: {report['total']}，超时: {report['timeouts']}，"
+          f"响应不一致: {len(report['mismatches'])}")
+    print(f"总耗时: {report['elapsed']:.3f}s，吞吐量: {report['throughput']:.1f}条/秒")
+    
+    if report['latency']:
+        print(f"\n{'指令':<20}{'次数':>6}{'P50(ms)':>10}{'P95(ms)':>10}{'P99(ms)':>10}{'最大(ms)':>10}")
+        for command, stats in report['latency'].items():
+            if not command.isprintable():
+                command = repr(command)
+            print(f"{command:<20}{stats['count']:>6}{stats['p50'] * 1000:>10.2f}"
+                  f"{stats['p95'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}")
+    
+    if report['mismatches']:
+        print(f"\n响应不一致（前{min(max_diffs, len(report['mismatches']))}条）:")
+        for result in report['mismatches'][:max_diffs]:
+            print(f"  {result['command']}")
+            print(f"    - 日志: {result['expected']}")
+            print(f"    + 回放: {result['reply']}")
+    print("================\n")
+
+def wait_until_ready(target, timeout: float = 20.0) -> bool:
+    """等待系统启动（ping收到pong）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        reply, _ = target.request('ping', timeout=0.5)
+        if reply == 'pong':
+            return True
+    return False
+
+def spawn_system(port: str, system_args: str, frame_source: Optional[str]) -> subprocess.Popen:
+    """启动连接到指定串口的系统进程"""
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    env = dict(os.environ, SERIAL_AUTO_DISCOVER='false')
+    if frame_source:
+        env['FRAME_SOURCE'] = frame_source
+    command = [sys.executable, main_path, '--port', port] + shlex.split(system_args or '')
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser(description='日志回放压测程序')
+    parser.add_argument('logs', nargs='+', help='日志文件、目录或通配符')
+    parser.add_argument('--speed', default='1',
+                        help='回放速度：倍速数字（如 1、10），或 max 表示收到响应立即发送下一条')
+    parser.add_argument('--port', '-p', help='回放到已运行系统的串口（默认启动系统并通过伪终端连接）')
+    parser.add_argument('--baudrate', '-b', type=int, default=115200, help='波特率 (默认: 115200)')
+    parser.add_argument('--timeout', '-t', type=float, default=10.0, help='单条指令响应超时 (默认: 10s)')
+    parser.add_argument('--system-args', default='', help='启动系统时附加的命令行参数')
+    parser.add_argument('--frame-source', help='启动系统时使用的图像来源（录制的视频/图像目录）')
+    parser.add_argument('--max-gap', type=float, help='压缩日志中超过此秒数的空闲间隔')
+    parser.add_argument('--limit', type=int, help='最多回放的指令数')
+    parser.add_argument('--json', help='将报告保存为JSON文件')
+    
+    args = parser.parse_args()
+    
+    paths = expand_log_paths(args.logs)
+    entries = parse_log_files(paths)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("日志中没有找到UART指令")
+        return 1
+    
+    speed = None if args.speed.lower() == 'max' else float(args.speed)
+    print(f"从 {len(paths)} 个日志文件解析到 {len(entries)} 条指令，"
+          f"回放速度: {'最大' if speed is None else f'{speed:g}x'}")
+    
+    process = None
+    if args.port:
+        target = SerialTarget(args.port, args.baudrate)
+    else:
+        target = VirtualMCU()
+        target.start()
+        process = spawn_system(target.port, args.system_args, args.frame_source)
+    
+    try:
+        if not wait_until_ready(target):
+            print("系统未响应ping，无法回放")
+            return 1
+        
+        report = LogReplayer(target, speed=speed, timeout=args.timeout, max_gap=args.max_gap).replay(entries)
+        print_report(report)
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"回放报告已保存到: {args.json}")
+        
+        return 1 if report['mismatches'] or report['timeouts'] else 0
+    
+    finally:
+        if process:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        target.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
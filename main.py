@@ -10,64 +10,126 @@ import os
 import time
 import threading
 import argparse
+import asyncio
 from datetime import datetime
 
 # 导入配置文件
 from config import Config
 
 # 导入自定义模块
-from modules.serial_comm import SerialCommunication
+from modules.serial_comm import SerialCommunication, discover_ports
 from modules.image_recognition import ImageRecognition
+from modules.frame_source import open_frame_source
 from modules.voice_player import VoicePlayer
 from modules.logger import SystemLogger
 from modules.task_controller import TaskController
+from modules.session_manager import SessionManager
+from modules.telemetry import TelemetryStore
+from modules.async_serial import AsyncSerialTransport
+from modules.async_task_controller import AsyncTaskController
+from modules.simulation import (
+    VirtualMCU, SimulatedCamera, NullVoicePlayer, load_scenario, print_scenario_report
+)
 
 class PharmacyRobotSystem:
     """智慧药房机器人系统主类"""
     
-    def __init__(self, port=None):
+    def __init__(self, port=None, use_asyncio=False):
         """初始化系统
         
         Args:
             port: 串口端口（可选，默认使用配置文件中的设置）
+            use_asyncio: 是否在单个asyncio事件循环中运行串口收发和指令处理
         """
         # 使用传入的端口或配置文件中的默认端口
         self.port = port or Config.SERIAL_PORT
+        self.use_asyncio = use_asyncio
         self.running = False
         
+        # 模拟模式：连接虚拟下位机的伪终端
+        self.virtual_mcu = None
+        self.camera = None
+        if Config.SIMULATION_MODE:
+            self.virtual_mcu = VirtualMCU()
+            self.port = self.virtual_mcu.port
+        
         # 打印当前配置
         if Config.DEBUG_MODE:
             Config.print_config()
         
         # 初始化日志系统
-        self.logger = SystemLogger()
+        self.logger = SystemLogger(log_dir=Config.LOG_DIR, **Config.get_logger_options())
+        
+        # 初始化遥测数据记录（可选）
+        self.telemetry = create_telemetry_store()
         
         # 初始化串口通信
         serial_config = Config.get_serial_config()
         serial_config['port'] = self.port  # 使用指定的端口
-        self.serial_comm = SerialCommunication(
-            port=serial_config['port'],
-            baudrate=serial_config['baudrate'],
-            timeout=serial_config['timeout']
-        )
-        self.serial_comm.set_data_callback(self._handle_serial_data)
-        
-        # 初始化图像识别
-        self.image_recognition = ImageRecognition(self.logger)
-        
-        # 初始化语音播报
-        self.voice_player = VoicePlayer(self.logger)
+        if self.use_asyncio:
+            self.serial_comm = AsyncSerialTransport(
+                port=serial_config['port'],
+                baudrate=serial_config['baudrate']
+            )
+        else:
+            self.serial_comm = SerialCommunication(
+                port=serial_config['port'],
+                baudrate=serial_config['baudrate'],
+                timeout=serial_config['timeout'],
+                send_queue_size=serial_config['send_queue_size'],
+                auto_reconnect=serial_config['auto_reconnect'],
+                reconnect_max_delay=serial_config['reconnect_max_delay'],
+                low_latency=serial_config['low_latency']
+            )
         
-        # 初始化任务控制器
-        self.task_controller = TaskController(
+        # 初始化图像识别和语音播报（模拟模式下使用模拟摄像头和不发声的播报器）
+        if Config.SIMULATION_MODE:
+            scenario = load_scenario(Config.SIMULATION_SCENARIO)
+            self.camera = SimulatedCamera(
+                board1=scenario.get('board1'),
+                board2=scenario.get('board2'),
+                board1_image=Config.SIMULATION_BOARD1_IMAGE,
+                board2_image=Config.SIMULATION_BOARD2_IMAGE,
+                width=Config.IMAGE_WIDTH,
+                height=Config.IMAGE_HEIGHT
+            )
+            self.voice_player = NullVoicePlayer(self.logger, simulate_timing=Config.SIMULATION_VOICE_TIMING)
+            frame_source = self.camera
+        else:
+            self.voice_player = VoicePlayer(self.logger)
+            frame_source = open_frame_source(Config.FRAME_SOURCE) if Config.FRAME_SOURCE else None
+            
+        self.image_recognition = ImageRecognition(
             self.logger,
-            self.serial_comm,
-            self.image_recognition,
-            self.voice_player
+            camera_device_id=Config.CAMERA_DEVICE_ID,
+            frame_source=frame_source,
+            telemetry=self.telemetry
         )
         
-        # 设置串口数据接收回调
-        self.serial_comm.set_data_callback(self._handle_serial_data)
+        # 初始化任务控制器
+        if self.use_asyncio:
+            self.task_controller = AsyncTaskController(
+                self.logger,
+                self.serial_comm,
+                self.image_recognition,
+                self.voice_player,
+                telemetry=self.telemetry
+            )
+        else:
+            self.task_controller = TaskController(
+                self.logger,
+                self.serial_comm,
+                self.image_recognition,
+                self.voice_player,
+                pipelining=Config.SERIAL_PIPELINING,
+                pipeline_workers=Config.PIPELINE_WORKERS,
+                telemetry=self.telemetry
+            )
+        
+        # 设置串口数据接收回调（asyncio模式下由事件循环直接读取）
+        if not self.use_asyncio:
+            self.serial_comm.set_data_callback(self._handle_serial_data, with_timestamp=True)
+            self.serial_comm.set_connection_callback(self.task_controller.handle_connection_change)
         
         print("智慧药房机器人系统初始化完成")
         
@@ -80,8 +142,14 @@ class PharmacyRobotSystem:
             self.logger.start()
             self.logger.log_system("系统启动")
             
-            # 启动串口通信
-            if not self.serial_comm.connect():
+            if self.telemetry:
+                self.telemetry.start()
+            
+            if self.virtual_mcu:
+                self.virtual_mcu.start()
+                
+            # 启动串口通信（asyncio模式下在run_async中连接）
+            if not self.use_asyncio and not self._connect_serial():
                 raise Exception("串口连接失败")
                 
             # 启动语音播报
@@ -101,6 +169,29 @@ class PharmacyRobotSystem:
             self.stop()
             raise
             
+    def _connect_serial(self):
+        """连接串口，指定串口不可用时并行探测候选串口"""
+        if self.serial_comm.connect():
+            return True
+            
+        if not Config.SERIAL_AUTO_DISCOVER or self.virtual_mcu:
+            return False
+            
+        print("正在探测机器人串口...")
+        ports = discover_ports(
+            patterns=Config.SERIAL_DISCOVERY_PATTERNS,
+            baudrate=self.serial_comm.baudrate,
+            request=Config.SERIAL_HANDSHAKE_REQUEST,
+            expected=Config.SERIAL_HANDSHAKE_RESPONSE
+        )
+        if not ports:
+            print("未探测到机器人串口")
+            return False
+            
+        self.port = self.serial_comm.port = ports[0]
+        self.logger.log_system(f"探测到机器人串口: {self.port}")
+        return self.serial_comm.connect()
+        
     def stop(self):
         """停止系统"""
         self.running = False
@@ -115,10 +206,21 @@ class PharmacyRobotSystem:
         if hasattr(self, 'voice_player'):
             self.voice_player.stop()
             
+        # 释放摄像头
+        if hasattr(self, 'image_recognition'):
+            self.image_recognition.stop()
+            
+        # 写完遥测数据
+        if getattr(self, 'telemetry', None):
+            self.telemetry.stop()
+            
         # 停止串口通信
         if hasattr(self, 'serial_comm'):
             self.serial_comm.disconnect()
             
+        if self.virtual_mcu:
+            self.virtual_mcu.close()
+            
         # 停止日志系统
         if hasattr(self, 'logger'):
             self.logger.log_system("系统停止")
@@ -126,11 +228,45 @@ class PharmacyRobotSystem:
             
         print("智慧药房机器人系统已停止")
         
-    def _handle_serial_data(self, data):
+    async def run_async(self):
+        """在asyncio事件循环中运行系统，直到串口断开或被取消"""
+        self.start()
+        
+        if not await self.serial_comm.connect():
+            raise Exception("串口连接失败")
+            
+        try:
+            print("系统正在事件循环中运行，按 Ctrl+C 停止...")
+            await self.task_controller.run(self.serial_comm)
+        finally:
+            # 在事件循环关闭前注销串口
+            self.serial_comm.disconnect()
+        
+    def run_simulation(self, scenario_name=None, repeat=None, verbose=True):
+        """由虚拟下位机运行场景脚本（需在模拟模式下启动系统）
+        
+        Args:
+            scenario_name: 场景名称或JSON场景文件（默认取配置）
+            repeat: 重复次数
+            verbose: 是否打印每条指令的结果
+            
+        Returns:
+            dict: 场景运行报告
+        """
+        scenario = load_scenario(scenario_name or Config.SIMULATION_SCENARIO)
+        print(f"运行模拟场景: {scenario['name']} - {scenario.get('description', '')}")
+        
+        report = self.virtual_mcu.run_scenario(scenario, camera=self.camera, repeat=repeat)
+        print_scenario_report(report, verbose=verbose)
+        self.logger.log_system(f"模拟场景{scenario['name']}完成，通过: {report['passed']}/{report['total']}")
+        return report
+        
+    def _handle_serial_data(self, data, received_at=None):
         """处理串口接收到的数据
         
         Args:
             data: 接收到的数据
+            received_at: 数据到达时间（time.monotonic()）
         """
         if not self.running:
             return
@@ -141,7 +277,7 @@ class PharmacyRobotSystem:
             
             if command:
                 # 交给任务控制器处理
-                self.task_controller.handle_command(command)
+                self.task_controller.handle_command(command, received_at)
                 
         except Exception as e:
             error_msg = f"处理串口数据异常: {str(e)}"
@@ -165,6 +301,7 @@ class PharmacyRobotSystem:
         """运行交互模式（用于测试）"""
         print("\n进入交互模式，输入指令进行测试:")
         print("可用指令: start, check board 1, check A/B/C, check board 2, check 1/2/3/4, over")
+        print("批量指令: check A,B,C, check 1-4, plan")
         print("输入 'quit' 退出交互模式\n")
         
         while self.running:
@@ -176,6 +313,13 @@ class PharmacyRobotSystem:
                 elif command.lower() == 'status':
                     status = self.get_system_status()
                     print(f"系统状态: {status}")
+                elif command and self.virtual_mcu:
+                    # 模拟模式下经虚拟下位机发送，走完整的串口收发流程
+                    reply, rtt = self.virtual_mcu.request(command)
+                    if reply is None:
+                        print("等待响应超时")
+                    else:
+                        print(f"响应: {reply} ({rtt * 1000:.1f}ms)")
                 elif command:
                     self.task_controller.handle_command(command)
                     
@@ -184,6 +328,48 @@ class PharmacyRobotSystem:
             except Exception as e:
                 print(f"处理指令异常: {str(e)}")
                 
+def create_telemetry_store():
+    """按配置创建遥测数据存储，未启用时返回None"""
+    telemetry_config = Config.get_telemetry_config()
+    if not telemetry_config['enabled']:
+        return None
+    db_dir = os.path.dirname(telemetry_config['db_path'])
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    return TelemetryStore(
+        telemetry_config['db_path'],
+        batch_size=telemetry_config['batch_size'],
+        flush_interval=telemetry_config['flush_interval']
+    )
+        
+def run_multi_session():
+    """运行多机器人会话模式（按Config.ROBOT_SESSIONS）"""
+    session_configs = Config.get_session_configs()
+    if not session_configs:
+        print("未配置多机器人会话，请在 config_local.py 中设置 ROBOT_SESSIONS")
+        return
+        
+    manager = SessionManager(
+        session_configs,
+        vision_workers=Config.VISION_WORKER_COUNT,
+        log_dir=Config.LOG_DIR,
+        log_options=Config.get_logger_options(),
+        telemetry=create_telemetry_store()
+    )
+    
+    try:
+        manager.start()
+        print("多机器人会话正在运行，按 Ctrl+C 停止...")
+        while manager.running:
+            time.sleep(1)
+            
+    except KeyboardInterrupt:
+        print("\n接收到中断信号，正在停止所有会话...")
+    except Exception as e:
+        print(f"多机器人会话运行异常: {str(e)}")
+    finally:
+        manager.stop()
+        
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='智慧药房机器人上位机程序')
@@ -196,7 +382,16 @@ def main():
     parser.add_argument('--debug', '-d', action='store_true',
                        help='启用调试模式')
     parser.add_argument('--simulation', '-s', action='store_true',
-                       help='启用模拟模式')
+                       help='启用模拟模式（虚拟下位机+模拟摄像头，运行场景后退出）')
+    parser.add_argument('--scenario', default=None,
+                       help='模拟模式运行的场景名称或JSON场景文件')
+    parser.add_argument('--repeat', type=int, default=None,
+                       help='模拟场景重复次数')
+    parser.add_argument('--multi', '-m', action='store_true',
+                       help='按配置中的ROBOT_SESSIONS启动多机器人会话')
+    parser.add_argument('--asyncio', '-a', action='store_true',
+                       help='在单个asyncio事件循环中运行串口收发和指令处理'
+                            '（该模式不自动重连，串口断开后系统退出）')
     
     args = parser.parse_args()
     
@@ -205,12 +400,18 @@ def main():
         Config.DEBUG_MODE = True
     if args.simulation:
         Config.SIMULATION_MODE = True
+    if args.scenario:
+        Config.SIMULATION_SCENARIO = args.scenario
     
     # 显示配置信息
     if args.config:
         Config.print_config()
         return
     
+    if args.multi:
+        run_multi_session()
+        return
+    
     # 确定使用的串口
     port = args.port or Config.SERIAL_PORT
     print(f"使用串口: {port}")
@@ -221,14 +422,22 @@ def main():
         print(f"模拟模式: 已启用")
     
     # 创建系统实例
-    system = PharmacyRobotSystem(port=port)
+    system = PharmacyRobotSystem(port=port, use_asyncio=args.asyncio)
     
     try:
+        if args.asyncio:
+            # 事件循环模式
+            asyncio.run(system.run_async())
+            return
+            
         system.start()
         
         if args.interactive:
             # 交互模式
             system.run_interactive_mode()
+        elif Config.SIMULATION_MODE:
+            # 模拟模式：运行场景脚本后退出
+            system.run_simulation(repeat=args.repeat)
         else:
             # 正常运行模式
             print("系统正在运行，按 Ctrl+C 停止...")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步串口通信模块
+基于asyncio事件循环的串口传输，替代每个串口一个接收线程的方式：
+- 事件循环直接监听串口文件描述符，数据到达即处理
+- 提供StreamReader风格的按行读取接口（readline / async for）
+- 写入非阻塞，未写完的数据由事件循环在串口可写时继续发送
+仅支持POSIX系统（Linux/macOS）
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import serial
+
+from modules.serial_comm import LineFramer
+
+class AsyncSerialTransport:
+    """asyncio串口传输类"""
+    
+    def __init__(self, port='/dev/ttyUSB0', baudrate=115200):
+        self.port = port
+        self.baudrate = baudrate
+        self.serial_conn = None
+        self.connected = False
+        self.loop = None
+        
+        self.framer = LineFramer()
+        # 已切分的行：(行文本, 到达时间)
+        self.line_queue = asyncio.Queue()
+        self.last_receive_time = None
+        
+        # 未写完的发送数据，以及各条指令的结束位置与完成Future
+        self._write_buffer = bytearray()
+        self._pending_sends = deque()
+        self._bytes_queued = 0
+        self._bytes_written = 0
+        self._drained = None
+        
+    async def connect(self):
+        """连接串口并注册到当前事件循环"""
+        if os.name != 'posix':
+            print("异步串口仅支持POSIX系统")
+            return False
+            
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.serial_conn = serial.Serial(
+                port=self.port,
+                baudrate=self.baudrate,
+                timeout=0,
+                write_timeout=0,
+                bytesize=serial.EIGHTBITS,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE
+            )
+            self.serial_conn.nonblocking()
+            
+            self._drained = asyncio.Event()
+            self._drained.set()
+            self.loop.add_reader(self.serial_conn.fileno(), self._on_readable)
+            self.connected = True
+            
+            print(f"串口连接成功(asyncio): {self.port}")
+            return True
+            
+        except Exception as e:
+            print(f"串口连接异常: {str(e)}")
+            return False
+            
+    def disconnect(self):
+        """断开串口连接"""
+        if self.serial_conn and self.serial_conn.is_open:
+            fd = self.serial_conn.fileno()
+            self.loop.remove_reader(fd)
+            self.loop.remove_writer(fd)
+            self.serial_conn.close()
+            print("串口连接已断开")
+            
+        self.connected = False
+        while self._pending_sends:
+            _, future = self._pending_sends.popleft()
+            future.set_result(False)
+        self._write_buffer.clear()
+        # 唤醒正在等待写完或读取的协程
+        if self._drained is not None:
+            self._drained.set()
+        self.line_queue.put_nowait(None)
+        
+    def _on_readable(self):
+        """串口可读回调（在事件循环中执行）"""
+        try:
+            chunk = os.read(self.serial_conn.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except Exception as e:
+            print(f"接收数据异常: {str(e)}")
+            self.disconnect()
+            return
+            
+        if not chunk:
+            # 设备已断开
+            self.disconnect()
+            return
+            
+        for line, timestamp in self.framer.feed(chunk, time.monotonic()):
+            self.last_receive_time = timestamp
+            self.line_queue.put_nowait((line, timestamp))
+            
+    async def readline_with_timestamp(self):
+        """读取一行及其到达时间
+        
+        Returns:
+            tuple: (行文本, 到达时间)，连接断开时返回None
+        """
+        if not self.connected and self.line_queue.empty():
+            return None
+            
+        item = await self.line_queue.get()
+        if item is None:
+            return None
+        return item
+        
+    async def readline(self):
+        """读取一行（连接断开时返回None）"""
+        item = await self.readline_with_timestamp()
+        return item[0] if item else None
+        
+    def __aiter__(self):
+        return self
+        
+    async def __anext__(self):
+        item = await self.readline_with_timestamp()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+        
+    def send_command(self, command):
+        """发送指令（非阻塞，与SerialCommunication.send_command接口一致）"""
+        future = self.send_command_async(command)
+        return not (future.done() and not future.result())
+        
+    def send_command_async(self, command):
+        """发送指令并返回表示发送完成的Future（需在事件循环线程中调用）
+        
+        Returns:
+            Future: 数据全部写入串口后结果为True，失败为False
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        
+        if not self.connected:
+            future.set_result(False)
+            return future
+            
+        data = (command + '\n').encode('utf-8')
+        was_empty = not self._write_buffer
+        self._write_buffer.extend(data)
+        self._bytes_queued += len(data)
+        self._pending_sends.append((self._bytes_queued, future))
+        if was_empty:
+            # 没有等待中的数据，立即尝试写入
+            self._on_writable()
+        return future
+        
+    def _on_writable(self):
+        """串口可写回调：尽量写出缓冲数据，写不完则等待下次可写"""
+        fd = self.serial_conn.fileno()
+        try:
+            written = os.write(fd, self._write_buffer)
+            del self._write_buffer[:written]
+            self._bytes_written += written
+        except BlockingIOError:
+            pass
+        except Exception as e:
+            print(f"发送指令失败: {str(e)}")
+            self._write_buffer.clear()
+            self._bytes_written = self._bytes_queued
+            self._complete_sends(False)
+            self.disconnect()
+            return
+            
+        self._complete_sends(True)
+        
+        if self._write_buffer:
+            self._drained.clear()
+            self.loop.add_writer(fd, self._on_writable)
+        else:
+            self.loop.remove_writer(fd)
+            self._drained.set()
+            
+    def _complete_sends(self, success):
+        """完成已全部写出的指令的Future"""
+        while self._pending_sends and self._pending_sends[0][0] <= self._bytes_written:
+            _, future = self._pending_sends.popleft()
+            future.set_result(success)
+            
+    async def drain(self):
+        """等待所有已发送数据写入串口"""
+        if self._drained is not None:
+            await self._drained.wait()
+            
+    def is_connected(self):
+        """检查连接状态"""
+        return self.connected and self.serial_conn and self.serial_conn.is_open
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步任务控制器模块
+在asyncio事件循环中处理指令，阻塞的图像识别（二维码/OCR）交给线程池执行，
+事件循环在识别期间仍可继续收发其他串口数据
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.task_controller import TaskController
+
+class AsyncTaskController(TaskController):
+    """异步任务控制器类"""
+    
+    def __init__(self, logger, serial_comm, image_recognition, voice_player, executor=None,
+                 telemetry=None):
+        super().__init__(logger, serial_comm, image_recognition, voice_player, telemetry=telemetry)
+        
+        # 图像识别线程池（可由多个控制器共享）
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="vision")
+        self._owns_executor = executor is None
+        
+        # 需要在线程池中执行的指令（其余指令无阻塞操作，直接在事件循环中处理）
+        self.async_command_handlers = {
+            'check board 1': self._handle_check_board1_async,
+            'check board 2': self._handle_check_board2_async
+        }
+        
+    def stop(self):
+        """停止任务控制器"""
+        super().stop()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+            
+    async def handle_command_async(self, command, received_at=None):
+        """处理接收到的指令（协程版本）
+        
+        Args:
+            command: 接收到的指令字符串
+            received_at: 指令到达时间（time.monotonic()）
+        """
+        if not self.running:
+            return
+            
+        if received_at is None:
+            received_at = time.monotonic()
+        
+        # 记录接收到的指令
+        self.logger.log_uart_receive(command)
+        
+        command = command.strip()
+        async_handler = self.async_command_handlers.get(command)
+        
+        if async_handler:
+            try:
+                response = await async_handler()
+            except Exception as e:
+                error_msg = f"处理指令'{command}'时发生异常: {str(e)}"
+                self.logger.log_error(error_msg)
+                response = "error"
+        else:
+            # 其余指令（含批量查询、未知指令）与同步版本相同
+            response = self._execute_command(command)
+            
+        if response:
+            self._send_response(response, received_at, command=command)
+            
+    async def _run_in_executor(self, func, *args):
+        """在图像识别线程池中执行阻塞函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+        
+    async def _handle_check_board1_async(self):
+        """处理check board 1指令（识别在线程池中执行）"""
+        try:
+            results = await self._run_in_executor(self.image_recognition.recognize_qr_codes_board1)
+            return self._process_qr_results(results)
+            
+        except Exception as e:
+            self.logger.log_recognition_error("二维码", str(e))
+            return "error"
+            
+    async def _handle_check_board2_async(self):
+        """处理check board 2指令（识别在线程池中执行）"""
+        try:
+            results = await self._run_in_executor(self.image_recognition.recognize_ocr_board2)
+            return self._process_ocr_results(results)
+            
+        except Exception as e:
+            self.logger.log_recognition_error("OCR", str(e))
+            return "error"
+            
+    async def run(self, transport):
+        """从异步串口传输中逐行读取并处理指令，直到连接断开
+        
+        Args:
+            transport: AsyncSerialTransport对象
+        """
+        async for command, received_at in transport:
+            if command:
+                await self.handle_command_async(command, received_at)
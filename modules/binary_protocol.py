@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+二进制帧协议模块
+与ASCII文本协议并存，由下位机发送 "mode binary" 协商切换，"mode ascii" 切回。
+
+帧格式：
+    起始字节(0xA5) | 负载长度(2B, 大端) | 操作码(1B) | 负载 | CRC16(2B, 大端)
+    CRC16-CCITT(多项式0x1021，初值0xFFFF)，覆盖 长度+操作码+负载
+
+二维码结果、窗口状态等使用紧凑编码，其余响应以文本帧(OP_TEXT)传输。
+CRC校验失败的帧不会被当作未知指令处理，而是立即回复NAK请求重发。
+"""
+
+import struct
+
+# 帧起始字节（不是合法的UTF-8首字节，不会与ASCII指令混淆）
+FRAME_START = 0xA5
+
+# 帧头（起始字节+长度+操作码）和CRC长度
+FRAME_HEADER_SIZE = 4
+FRAME_CRC_SIZE = 2
+# 超过此长度的帧视为损坏（避免错误的长度字段使分帧器长时间等待）
+MAX_PAYLOAD_SIZE = 1024
+
+# ==================== 操作码 ====================
+# 通用
+OP_TEXT = 0x01              # 文本帧（ASCII回退），负载为UTF-8文本
+OP_NAK = 0x7F               # 收到损坏的帧，请求重发
+
+# 指令（下位机 -> 上位机）
+OP_START = 0x10
+OP_CHECK_BOARD1 = 0x11
+OP_CHECK_WINDOW = 0x12      # 负载: 窗口字母 b'A'/b'B'/b'C'
+OP_CHECK_BOARD2 = 0x13
+OP_CHECK_LAB = 0x14         # 负载: 窗口编号 1字节
+OP_OVER = 0x15
+
+# 响应（上位机 -> 下位机）
+OP_OK = 0x80
+OP_WAIT = 0x81
+OP_ERROR = 0x82
+OP_NO_QR_FOUND = 0x83
+OP_NO_SAMPLE = 0x84
+OP_QR_RESULTS = 0x90        # 负载: 4字节，见encode_qr_results
+OP_WINDOW_STATUS = 0x91     # 负载: 2字节，见encode_window_status
+
+# 无负载的指令
+_SIMPLE_COMMANDS = {
+    OP_START: 'start',
+    OP_CHECK_BOARD1: 'check board 1',
+    OP_CHECK_BOARD2: 'check board 2',
+    OP_OVER: 'over'
+}
+
+# 无负载的响应
+_SIMPLE_RESPONSES = {
+    'ok': OP_OK,
+    'wait': OP_WAIT,
+    'error': OP_ERROR,
+    'no_qr_found': OP_NO_QR_FOUND,
+    'no_sample': OP_NO_SAMPLE
+}
+
+# 二维码位置顺序（与ImageRecognition的分区一致）
+QR_POSITIONS = ('top_left', 'top_right', 'bottom_left', 'bottom_right')
+
+# 各操作码允许的最大负载长度：未知操作码或超长的帧视为损坏，
+# 使单个错误的起始字节不会让分帧器等待一个很长的"帧"
+_PAYLOAD_LIMITS = {
+    OP_TEXT: MAX_PAYLOAD_SIZE,
+    OP_NAK: 0,
+    OP_START: 0,
+    OP_CHECK_BOARD1: 0,
+    OP_CHECK_WINDOW: 1,
+    OP_CHECK_BOARD2: 0,
+    OP_CHECK_LAB: 1,
+    OP_OVER: 0,
+    OP_OK: 0,
+    OP_WAIT: 0,
+    OP_ERROR: 0,
+    OP_NO_QR_FOUND: 0,
+    OP_NO_SAMPLE: 0,
+    OP_QR_RESULTS: 4,
+    OP_WINDOW_STATUS: 2
+}
+
+# 窗口字母对应的位
+_WINDOW_BITS = {'A': 0x01, 'B': 0x02, 'C': 0x04}
+# 位置上识别到二维码的标志位
+_QR_DETECTED = 0x80
+
+def _make_crc16_table():
+    """生成CRC16-CCITT查找表"""
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+_CRC16_TABLE = _make_crc16_table()
+
+def crc16(data, crc=0xFFFF):
+    """计算CRC16-CCITT
+    
+    Args:
+        data: bytes/bytearray/memoryview
+        crc: 初值
+    """
+    table = _CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+def encode_frame(opcode, payload=b''):
+    """构建一帧
+    
+    Args:
+        opcode: 操作码
+        payload: 负载字节
+        
+    Returns:
+        bytes: 完整帧
+    """
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"负载过长: {len(payload)}")
+        
+    body = struct.pack('>HB', len(payload), opcode) + bytes(payload)
+    return bytes((FRAME_START,)) + body + struct.pack('>H', crc16(body))
+
+class BinaryFramer:
+    """二进制帧分帧器
+    
+    数据追加到持久的bytearray缓冲中，解析时通过memoryview直接在缓冲上
+    定位帧和计算CRC，不产生中间拷贝；只有最终的负载被复制出来。
+    遇到损坏的帧会跳过其起始字节并重新同步到下一个起始字节；帧头中的
+    操作码未知或长度超过该操作码的负载上限时立即判定为损坏，不等待帧的剩余部分。
+    """
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crc_errors = 0
+        
+    def feed(self, chunk):
+        """追加数据并解析完整帧
+        
+        Args:
+            chunk: 新读到的字节
+            
+        Returns:
+            tuple: (帧列表[(操作码, 负载bytes), ...], 本次检测到的损坏帧数量)
+        """
+        buffer = self.buffer
+        buffer.extend(chunk)
+        
+        frames = []
+        errors = 0
+        pos = 0
+        size = len(buffer)
+        
+        with memoryview(buffer) as view:
+            while True:
+                # 同步到起始字节
+                start = buffer.find(FRAME_START, pos)
+                if start < 0:
+                    pos = size
+                    break
+                if size - start < FRAME_HEADER_SIZE:
+                    pos = start
+                    break
+                    
+                length = (view[start + 1] << 8) | view[start + 2]
+                if length > _PAYLOAD_LIMITS.get(view[start + 3], -1):
+                    errors += 1
+                    pos = start + 1
+                    continue
+                    
+                frame_end = start + FRAME_HEADER_SIZE + length + FRAME_CRC_SIZE
+                if frame_end > size:
+                    # 帧不完整，等待更多数据
+                    pos = start
+                    break
+                    
+                crc_pos = frame_end - FRAME_CRC_SIZE
+                expected = (view[crc_pos] << 8) | view[crc_pos + 1]
+                if crc16(view[start + 1:crc_pos]) != expected:
+                    errors += 1
+                    pos = start + 1
+                    continue
+                    
+                opcode = view[start + 3]
+                frames.append((opcode, view[start + FRAME_HEADER_SIZE:crc_pos].tobytes()))
+                pos = frame_end
+                
+        if pos:
+            del buffer[:pos]
+            
+        self.crc_errors += errors
+        return frames, errors
+        
+    def reset(self):
+        """清空缓冲区"""
+        self.buffer.clear()
+
+def decode_command(opcode, payload):
+    """将指令帧转换为文本指令（交给TaskController的指令映射处理）
+    
+    Returns:
+        str: 文本指令，无法识别时返回描述操作码的文本（将按未知指令处理）
+    """
+    if opcode in _SIMPLE_COMMANDS:
+        return _SIMPLE_COMMANDS[opcode]
+    if opcode == OP_TEXT:
+        return payload.decode('utf-8', errors='replace').strip()
+    if opcode == OP_CHECK_WINDOW and len(payload) == 1:
+        return f"check {chr(payload[0])}"
+    if opcode == OP_CHECK_LAB and len(payload) == 1:
+        return f"check {payload[0]}"
+    return f"opcode 0x{opcode:02x}"
+
+def encode_command(command):
+    """将文本指令编码为指令帧（用于下位机模拟和测试）"""
+    for opcode, text in _SIMPLE_COMMANDS.items():
+        if command == text:
+            return encode_frame(opcode)
+    if command in ('check A', 'check B', 'check C'):
+        return encode_frame(OP_CHECK_WINDOW, command[-1].encode('ascii'))
+    if command in ('check 1', 'check 2', 'check 3', 'check 4'):
+        return encode_frame(OP_CHECK_LAB, bytes((int(command[-1]),)))
+    return encode_frame(OP_TEXT, command.encode('utf-8'))
+
+def encode_qr_results(results):
+    """紧凑编码二维码识别结果
+    
+    按QR_POSITIONS顺序每个位置1字节：最高位表示识别到二维码，
+    低3位分别表示内容中包含A/B/C窗口。
+    
+    Args:
+        results: {'top_left': 'AB', ...}
+    """
+    payload = bytearray(len(QR_POSITIONS))
+    for index, position in enumerate(QR_POSITIONS):
+        content = results.get(position)
+        if content is None:
+            continue
+        value = _QR_DETECTED
+        for char in content.upper():
+            value |= _WINDOW_BITS.get(char, 0)
+        payload[index] = value
+    return bytes(payload)
+
+def decode_qr_results(payload):
+    """解码紧凑二维码识别结果（encode_qr_results的逆过程）"""
+    results = {}
+    for index, value in enumerate(payload[:len(QR_POSITIONS)]):
+        if value & _QR_DETECTED:
+            results[QR_POSITIONS[index]] = ''.join(
+                window for window, bit in _WINDOW_BITS.items() if value & bit
+            )
+    return results
+
+def encode_window_status(window_status, wait):
+    """紧凑编码窗口状态
+    
+    负载2字节：第1字节低4位为1-4号窗口是否空闲，第2字节为结果（0=ok，1=wait）
+    
+    Args:
+        window_status: {窗口编号: {'available': bool, ...}}
+        wait: 是否需要等待
+    """
+    mask = 0
+    for window_num, status in window_status.items():
+        if status.get('available') and 1 <= window_num <= 8:
+            mask |= 1 << (window_num - 1)
+    return bytes((mask, 1 if wait else 0))
+
+def decode_window_status(payload):
+    """解码紧凑窗口状态
+    
+    Returns:
+        tuple: ({窗口编号: 是否空闲}, 是否需要等待)
+    """
+    mask, wait = payload[0], payload[1]
+    return {num: bool(mask & (1 << (num - 1))) for num in range(1, 5)}, bool(wait)
+
+def _is_compact_qr_content(content):
+    """内容能否无损地紧凑编码（按A/B/C顺序、不重复的非空窗口字母组合）"""
+    return bool(content) and content == ''.join(window for window in _WINDOW_BITS if window in content)
+
+def encode_response(response):
+    """将文本响应编码为响应帧
+    
+    固定响应使用无负载操作码，二维码识别结果使用紧凑编码，
+    其余响应以文本帧传输。紧凑编码只能表示A/B/C窗口组合，
+    其他二维码内容（如"top_left:HELLO-123"）以文本帧原样传输，与ASCII协议一致。
+    
+    Args:
+        response: TaskController生成的文本响应
+    """
+    opcode = _SIMPLE_RESPONSES.get(response)
+    if opcode is not None:
+        return encode_frame(opcode)
+        
+    # 二维码识别结果: "top_left:AB,top_right:BC"
+    parts = [part.split(':', 1) for part in response.split(',')]
+    if (all(len(part) == 2 and part[0] in QR_POSITIONS and _is_compact_qr_content(part[1])
+            for part in parts)
+            and len({part[0] for part in parts}) == len(parts)):
+        return encode_frame(OP_QR_RESULTS, encode_qr_results(dict(parts)))
+        
+    return encode_frame(OP_TEXT, response.encode('utf-8'))
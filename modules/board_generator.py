@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+板面图像生成模块
+生成带真实二维码的板1图像和带"空闲"/"无空闲"状态牌的板2图像，
+可施加透视、模糊、噪声、反光和缩放等变换模拟摄像头拍摄效果，
+并多进程批量生成带标注的数据集，用于测量识别算法的速度和准确率。
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from modules.binary_protocol import QR_POSITIONS
+
+# 常见中文字体路径（用于绘制窗口状态牌）
+CJK_FONT_PATHS = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/System/Library/Fonts/STHeiti Medium.ttc',
+    'C:/Windows/Fonts/simhei.ttf',
+    'C:/Windows/Fonts/msyh.ttc'
+]
+
+# 实际使用的二维码内容（窗口字母组合）
+QR_CONTENTS = ('A', 'B', 'C', 'AB', 'AC', 'BC', 'ABC')
+
+# 图像变换参数及默认值（0表示不施加该变换，缩放1.0表示原始大小）
+# 每个参数可以是数值，或(最小值, 最大值)表示每张图像在范围内随机取值
+AUGMENT_DEFAULTS = {
+    'perspective': 0.0,   # 四角最大偏移（占图像宽/高的比例）
+    'blur': 0.0,          # 高斯模糊sigma（像素）
+    'noise': 0.0,         # 高斯噪声标准差（0-255灰度）
+    'glare': 0.0,         # 反光光斑强度（0-1）
+    'scale': 1.0          # 板面缩放比例（<1表示摄像头更远）
+}
+
+# 变换后露出的背景颜色（桌面）
+BACKGROUND_COLOR = (170, 170, 170)
+
+_font_warning_shown = False
+
+# ==================== 板面绘制 ====================
+
+def render_qr_code(content, size):
+    """生成指定边长的二维码图像（灰度，白底黑码）"""
+    encoder = cv2.QRCodeEncoder.create()
+    code = encoder.encode(content)
+    return cv2.resize(code, (size, size), interpolation=cv2.INTER_NEAREST)
+
+def find_cjk_font():
+    """查找可用的中文字体，找不到返回None"""
+    for path in CJK_FONT_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def render_board1(contents, width=640, height=480):
+    """生成板1图像：四个区域中按位置绘制二维码
+    
+    Args:
+        contents: 二维码位置 -> 内容（如 {'top_left': 'AB'}）
+    
+    Returns:
+        numpy.ndarray: BGR图像
+    """
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    half_w, half_h = width // 2, height // 2
+    size = int(min(half_w, half_h) * 0.7)
+    
+    for index, position in enumerate(QR_POSITIONS):
+        content = contents.get(position)
+        if not content:
+            continue
+        code = render_qr_code(content, size)
+        x = (index % 2) * half_w + (half_w - size) // 2
+        y = (index // 2) * half_h + (half_h - size) // 2
+        image[y:y + size, x:x + size] = cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+    
+    return image
+
+def render_board2(window_status, width=640, height=480, font_path=None):
+    """生成板2图像：四个区域中分别绘制"空闲"/"无空闲"状态牌
+    
+    Args:
+        window_status: 窗口编号 -> 是否空闲
+        font_path: 中文字体路径（默认自动查找）
+    
+    Returns:
+        numpy.ndarray: BGR图像
+    """
+    global _font_warning_shown
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    half_w, half_h = width // 2, height // 2
+    
+    font_path = font_path or find_cjk_font()
+    if font_path:
+        font = ImageFont.truetype(font_path, int(half_h * 0.3))
+    else:
+        if not _font_warning_shown:
+            print("警告: 未找到中文字体，窗口状态牌文字无法被OCR识别")
+            _font_warning_shown = True
+        font = ImageFont.load_default()
+    
+    for num in range(1, 5):
+        if num not in window_status:
+            continue
+        text = '空闲' if window_status[num] else '无空闲'
+        x0 = ((num - 1) % 2) * half_w
+        y0 = ((num - 1) // 2) * half_h
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        x = x0 + (half_w - (right - left)) // 2 - left
+        y = y0 + (half_h - (bottom - top)) // 2 - top
+        draw.text((x, y), text, fill='black', font=font)
+    
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+def random_board1(rng, fill_probability=0.75):
+    """随机生成板1内容（每个位置以fill_probability的概率放置二维码）"""
+    return {position: QR_CONTENTS[rng.integers(len(QR_CONTENTS))]
+            for position in QR_POSITIONS if rng.random() < fill_probability}
+
+def random_board2(rng, available_probability=0.7):
+    """随机生成板2窗口状态"""
+    return {num: bool(rng.random() < available_probability) for num in range(1, 5)}
+
+# ==================== 拍摄效果变换 ====================
+
+def _sample(value, rng):
+    """取变换参数值：数值直接使用，(最小值, 最大值)在范围内随机取值"""
+    if isinstance(value, (tuple, list)):
+        return float(rng.uniform(value[0], value[1]))
+    return float(value)
+
+def augment_image(image, rng, **params):
+    """对板面图像施加拍摄效果变换
+    
+    Args:
+        image: BGR图像
+        rng: numpy随机数生成器（numpy.random.default_rng）
+        **params: 变换参数，见AUGMENT_DEFAULTS
+    
+    Returns:
+        tuple: (变换后的图像, 实际使用的参数)
+    """
+    unknown = set(params) - set(AUGMENT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知的变换参数: {', '.join(sorted(unknown))}")
+    
+    applied = {name: _sample(params.get(name, default), rng)
+               for name, default in AUGMENT_DEFAULTS.items()}
+    height, width = image.shape[:2]
+    result = image
+    
+    # 缩放和透视合并为一次变换
+    if applied['scale'] != 1.0 or applied['perspective'] > 0:
+        corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+        center = np.float32([width / 2, height / 2])
+        target = (corners - center) * applied['scale'] + center
+        if applied['perspective'] > 0:
+            offsets = rng.uniform(-1, 1, (4, 2)) * applied['perspective'] * np.float32([width, height])
+            target = target + offsets.astype(np.float32)
+        matrix = cv2.getPerspectiveTransform(corners, target.astype(np.float32))
+        result = cv2.warpPerspective(result, matrix, (width, height),
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=BACKGROUND_COLOR)
+    
+    if applied['glare'] > 0:
+        # 以随机位置为中心的高斯光斑，向白色混合
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        radius = rng.uniform(0.15, 0.4) * max(width, height)
+        yy, xx = np.ogrid[:height, :width]
+        mask = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2)) * min(applied['glare'], 1.0)
+        result = result + (255.0 - result) * mask[..., None]
+        result = result.astype(np.uint8)
+    
+    if applied['blur'] > 0:
+        result = cv2.GaussianBlur(result, (0, 0), applied['blur'])
+    
+    if applied['noise'] > 0:
+        noisy = result + rng.normal(0, applied['noise'], result.shape)
+        result = np.clip(noisy, 0, 255).astype(np.uint8)
+    
+    return result, applied
+
+# ==================== 数据集生成 ====================
+
+def generate_sample(board, index, seed=0, augment=None, width=640, height=480, font_path=None):
+    """生成一张带标注的板面图像（同一seed和index总是生成相同的图像）
+    
+    Args:
+        board: 板号（1或2）
+        index: 样本编号
+        seed: 随机种子
+        augment: 变换参数，见AUGMENT_DEFAULTS
+        font_path: 中文字体路径（板2）
+    
+    Returns:
+        tuple: (BGR图像, 标注)
+    """
+    rng = np.random.default_rng([seed, board, index])
+    
+    if board == 1:
+        contents = random_board1(rng)
+        image = render_board1(contents, width, height)
+    else:
+        contents = random_board2(rng)
+        image = render_board2(contents, width, height, font_path)
+    
+    image, applied = augment_image(image, rng, **(augment or {}))
+    label = {'board': board, 'index': index, 'augment': applied}
+    if board == 1:
+        label['board1'] = contents
+    else:
+        # JSON的键只能是字符串
+        label['board2'] = {str(num): available for num, available in contents.items()}
+    return image, label
+
+def _write_sample(task):
+    """进程池任务：生成并保存一张图像，返回标注"""
+    output_dir, board, index, seed, augment, width, height, font_path, image_format = task
+    image, label = generate_sample(board, index, seed, augment, width, height, font_path)
+    filename = f"board{board}_{index:06d}.{image_format}"
+    cv2.imwrite(os.path.join(output_dir, filename), image)
+    label['file'] = filename
+    return label
+
+def generate_dataset(output_dir, count, boards=(1, 2), seed=0, augment=None,
+                     width=640, height=480, workers=None, image_format='png'):
+    """多进程生成带标注的数据集
+    
+    图像保存在output_dir中，标注按文件名顺序写入output_dir/labels.jsonl。
+    
+    Args:
+        output_dir: 输出目录
+        count: 每块板生成的图像数
+        boards: 要生成的板号
+        seed: 随机种子（相同参数生成的数据集完全相同）
+        augment: 变换参数，见AUGMENT_DEFAULTS
+        workers: 进程数（默认CPU核数）
+        image_format: 图像格式（png无损，jpg更接近摄像头输出）
+    
+    Returns:
+        list: 标注列表
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    font_path = find_cjk_font()
+    
+    tasks = [(output_dir, board, index, seed, augment, width, height, font_path, image_format)
+             for board in boards for index in range(count)]
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        labels = list(executor.map(_write_sample, tasks, chunksize=max(1, len(tasks) // 64)))
+    
+    with open(os.path.join(output_dir, 'labels.jsonl'), 'w', encoding='utf-8') as f:
+        for label in labels:
+            f.write(json.dumps(label, ensure_ascii=False) + '\n')
+    
+    return labels
+
+def load_labels(path):
+    """读取数据集标注
+    
+    Args:
+        path: 数据集目录或标注文件路径
+    
+    Returns:
+        dict: 文件名 -> 标注（板2的窗口编号转换回整数）
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, 'labels.jsonl')
+    
+    labels = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            label = json.loads(line)
+            if 'board2' in label:
+                label['board2'] = {int(num): available for num, available in label['board2'].items()}
+            labels[label['file']] = label
+    return labels
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+飞行记录器模块
+在log()调用时把事件同步写入内存映射（mmap）的固定大小环形文件，保留最近N条记录。
+写入只是一次内存复制，不经过日志队列和写入线程：进程崩溃、被杀或卡死时，
+队列中尚未写入日志文件的事件仍保留在记录文件中（操作系统负责写回磁盘），
+可用flight_recorder_dump.py解码查看。
+与日志的延迟格式化一致，记录时不格式化消息：保存%格式字符串和各参数的repr，解码时再格式化。
+
+文件布局: [文件头(64B)] [槽位0] [槽位1] ...
+每个槽位: [序号(8B)] [时间戳(8B)] [单调时钟(8B)] [事件类型(1B)] [参数个数(1B)] [消息长度(2B)]
+          [消息] [CRC32(4B)]
+消息为格式字符串和各参数的repr，以\x1f分隔。
+序号从1开始递增，槽位 = 序号 % 槽位数；解码时按序号排序，CRC不符的槽位（写入中断）跳过。
+记录文件在打开期间加文件锁，另一个仍在运行的进程的记录文件不会被当作上次运行的记录。
+"""
+
+import ast
+import itertools
+import mmap
+import os
+import struct
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # 非POSIX系统：按文件头中的进程号判断记录文件是否仍在使用
+    fcntl = None
+
+from modules.structured_log import EVENT_TYPES
+
+MAGIC = b'PRFLTREC'
+VERSION = 2
+HEADER_SIZE = 64
+
+# 文件头: 标识, 版本, 槽位大小, 槽位数, 启动时间, 进程号, 状态
+_HEADER = struct.Struct('<8sHIIdIB')
+_SLOT_HEAD = struct.Struct('<QddBBH')
+_CRC = struct.Struct('<I')
+
+# 格式字符串与参数之间的分隔符
+_ARG_SEPARATOR = '\x1f'
+_MAX_ARGS = 255
+
+# 文件状态
+STATE_RUNNING = 1
+STATE_CLOSED = 2
+
+# 未登记的事件类型，消息前加"事件类型\t"
+_CUSTOM_CODE = 255
+_TYPE_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+class FlightRecorder:
+    """飞行记录器（mmap环形文件）
+    
+    record()可在任意线程调用，不加锁：序号由itertools.count分配（GIL下原子），
+    每条记录打包后一次切片赋值写入自己的槽位。
+    
+    另一个仍在运行的进程使用同一日志目录时，它的记录文件保持不动，
+    本进程改用flight_recorder.<进程号>.bin，正常退出时删除。
+    """
+    
+    def __init__(self, path, slot_count=4096, slot_size=256):
+        """初始化飞行记录器
+        
+        已有的记录文件（上次运行的记录）重命名为*.prev.bin保留；
+        仍在被其他进程使用的记录文件不重命名，本进程改用带进程号的文件名。
+        
+        Args:
+            path: 记录文件路径
+            slot_count: 槽位数（保留的记录条数）
+            slot_size: 每个槽位的字节数（超长的消息被截断）
+        """
+        min_size = _SLOT_HEAD.size + _CRC.size + 16
+        if slot_size < min_size:
+            raise ValueError(f"槽位大小至少为{min_size}字节")
+        
+        self.path = path
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.max_message = slot_size - _SLOT_HEAD.size - _CRC.size
+        self.previous_path = None
+        self.previous_crashed = False
+        self.shared = False
+        self._preserve_previous()
+        
+        size = HEADER_SIZE + slot_count * slot_size
+        # 锁随文件保持打开，直到close()
+        self._file = open(self.path, 'w+b')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # 另一个进程同时启动并先锁定了记录文件
+                self._file.close()
+                root, extension = os.path.splitext(self.path)
+                self.path = f"{root}.{os.getpid()}{extension}"
+                self.shared = True
+                self._file = open(self.path, 'w+b')
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        header = _HEADER.pack(MAGIC, VERSION, slot_size, slot_count, time.time(), os.getpid(), STATE_RUNNING)
+        self._mmap[:len(header)] = header
+        self._sequence = itertools.count(1)
+        
+    def _preserve_previous(self):
+        """保留上次运行的记录文件，并检查上次是否正常退出"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            header = read_header(self.path)
+        except (OSError, ValueError):
+            header = None
+        if is_recorder_in_use(self.path, header):
+            # 其他进程仍在写入：不动它的文件，也不是上次运行的记录
+            root, extension = os.path.splitext(self.path)
+            self.path = f"{root}.{os.getpid()}{extension}"
+            self.shared = True
+            return
+        if header is None:
+            return
+        self.previous_path = os.path.splitext(self.path)[0] + '.prev.bin'
+        os.replace(self.path, self.previous_path)
+        self.previous_crashed = header['state'] != STATE_CLOSED
+        
+    def record(self, event_type, message, args=(), wall_time=None, mono_time=None):
+        """写入一条记录
+        
+        Args:
+            event_type: 事件类型
+            message: 日志消息，有args时为%格式字符串（解码时格式化）
+            args: 消息参数（只保存repr）
+            wall_time: 时间戳（默认当前时间）
+            mono_time: 单调时钟时间（默认当前时间）
+        """
+        message = str(message)
+        args = args[:_MAX_ARGS]
+        if args:
+            message = _ARG_SEPARATOR.join([message] + [repr(arg) for arg in args])
+        code = _TYPE_CODES.get(event_type, _CUSTOM_CODE)
+        if code == _CUSTOM_CODE:
+            message = f"{event_type}\t{message}"
+        data = message.encode('utf-8')[:self.max_message]
+        
+        sequence = next(self._sequence)
+        body = _SLOT_HEAD.pack(sequence, wall_time or time.time(), mono_time or time.monotonic(),
+                               code, len(args), len(data)) + data
+        offset = HEADER_SIZE + (sequence % self.slot_count) * self.slot_size
+        try:
+            self._mmap[offset:offset + len(body) + _CRC.size] = body + _CRC.pack(zlib.crc32(body))
+        except ValueError:
+            # 已关闭
+            pass
+        
+    def close(self):
+        """标记为正常退出并关闭"""
+        if self._mmap.closed:
+            return
+        self._mmap[_HEADER.size - 1] = STATE_CLOSED
+        self._mmap.flush()
+        self._mmap.close()
+        if self.shared:
+            # 带进程号的记录文件只在异常退出时保留
+            os.remove(self.path)
+        self._file.close()
+
+def is_recorder_in_use(path, header=None):
+    """记录文件是否仍被其他运行中的进程打开
+    
+    有文件锁时以锁为准（进程退出后锁自动释放，不受进程号复用影响），
+    否则检查文件头中的进程是否存在。
+    """
+    if fcntl is not None:
+        try:
+            with open(path, 'rb') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except OSError:
+                    return True
+        except OSError:
+            return False
+        return False
+    if header is None or header['state'] == STATE_CLOSED or header['pid'] == os.getpid():
+        return False
+    try:
+        os.kill(header['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 无权限发送信号：进程存在
+        return True
+    return True
+
+def format_message(message, args):
+    """格式化记录的消息（参数为repr，能还原的字面量先还原）"""
+    values = []
+    for arg in args:
+        try:
+            values.append(ast.literal_eval(arg))
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            values.append(arg)
+    try:
+        return message % tuple(values)
+    except (TypeError, ValueError):
+        return ' '.join([message] + [str(value) for value in values])
+
+def read_header(path):
+    """读取记录文件头
+    
+    Returns:
+        dict: 版本、槽位大小、槽位数、启动时间、进程号、状态
+    """
+    with open(path, 'rb') as f:
+        data = f.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise ValueError("记录文件不完整")
+    magic, version, slot_size, slot_count, start_time, pid, state = _HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("不是飞行记录文件")
+    if version != VERSION:
+        raise ValueError(f"不支持的记录文件版本: {version}")
+    return {'version': version, 'slot_size': slot_size, 'slot_count': slot_count,
+            'start_time': start_time, 'pid': pid, 'state': state}
+
+def read_flight_recorder(path):
+    """解码记录文件（进程运行中或崩溃后都可读取）
+    
+    Returns:
+        tuple: (文件头, 按序号排列的记录列表)，记录为
+               {'seq', 'ts', 'mono', 'type', 'msg'}
+    """
+    header = read_header(path)
+    slot_size, slot_count = header['slot_size'], header['slot_count']
+    with open(path, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        data = f.read(slot_count * slot_size)
+    
+    records = []
+    for index in range(len(data) // slot_size):
+        offset = index * slot_size
+        sequence, wall_time, mono_time, code, arg_count, length = _SLOT_HEAD.unpack_from(data, offset)
+        end = offset + _SLOT_HEAD.size + length
+        if sequence == 0 or sequence % slot_count != index or end + _CRC.size > offset + slot_size:
+            continue
+        if zlib.crc32(data[offset:end]) != _CRC.unpack_from(data, end)[0]:
+            # 写入中断的槽位
+            continue
+        
+        message = data[end - length:end].decode('utf-8', errors='ignore')
+        if code == _CUSTOM_CODE:
+            event_type, _, message = message.partition('\t')
+        else:
+            event_type = EVENT_TYPES[code] if code < len(EVENT_TYPES) else str(code)
+        if arg_count:
+            parts = message.split(_ARG_SEPARATOR)
+            # 截断的记录参数不全，原样输出
+            message = format_message(parts[0], parts[1:]) if len(parts) == arg_count + 1 \
+                else ' '.join(parts)
+        records.append({'seq': sequence, 'ts': wall_time, 'mono': mono_time,
+                        'type': event_type, 'msg': message})
+    
+    records.sort(key=lambda record: record['seq'])
+    return header, records
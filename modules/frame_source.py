@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图像来源模块
+为图像识别提供统一的取帧接口，识别代码不关心图像来自哪里：
+- CameraFrameSource: 摄像头（Linux下使用V4L2），设备保持打开
+- VideoFileFrameSource: 录制的视频文件
+- ImageDirectoryFrameSource: 图像目录（按文件名顺序）
+- SharedMemoryFrameSource: 共享内存环形缓冲（由其他进程采集写入）
+每帧带有采集时间戳（time.monotonic()）和序号；可选后台预取，
+离线回放时解码与识别并行，按CPU能力全速处理。
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from queue import Queue, Empty, Full
+
+import cv2
+import numpy as np
+
+# 一帧图像：image为BGR数组，timestamp为采集时间（time.monotonic()），
+# index为该来源的帧序号，name为文件名等来源信息（可为None）
+Frame = namedtuple('Frame', ['image', 'timestamp', 'index', 'name'])
+
+# 支持的图像文件扩展名
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+class FrameSource:
+    """图像来源基类
+    
+    子类实现_grab()返回下一张图像；基类负责时间戳、序号和后台预取。
+    """
+    
+    def __init__(self, prefetch=0, drop_stale=False):
+        """初始化图像来源
+        
+        Args:
+            prefetch: 预取帧数（0表示调用read()时才取帧）
+            drop_stale: 预取队列满时丢弃最旧的帧（实时来源只关心最新画面）
+        """
+        self.prefetch = prefetch
+        self.drop_stale = drop_stale
+        self.frame_count = 0
+        self.is_open = False
+        
+        self._queue = None
+        self._prefetch_thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        
+    def open(self):
+        """打开图像来源并启动预取线程
+        
+        Returns:
+            bool: 是否成功
+        """
+        if self.is_open:
+            return True
+        if not self._open():
+            return False
+        self.is_open = True
+        
+        if self.prefetch > 0:
+            self._running = True
+            self._queue = Queue(maxsize=self.prefetch)
+            self._prefetch_thread = threading.Thread(target=self._prefetch_loop)
+            self._prefetch_thread.daemon = True
+            self._prefetch_thread.start()
+        return True
+        
+    def close(self):
+        """关闭图像来源"""
+        self._running = False
+        if self._prefetch_thread and self._prefetch_thread.is_alive():
+            self._prefetch_thread.join(timeout=1)
+        self._prefetch_thread = None
+        
+        if self.is_open:
+            self._close()
+            self.is_open = False
+        
+    def _open(self):
+        """打开底层设备/文件（子类实现）"""
+        return True
+        
+    def _close(self):
+        """关闭底层设备/文件（子类实现）"""
+        pass
+        
+    def _grab(self):
+        """读取下一张图像（子类实现）
+        
+        Returns:
+            tuple: (图像, 来源信息)，没有更多图像时返回None
+        """
+        raise NotImplementedError
+        
+    def _next_frame(self):
+        """读取下一帧并打上时间戳"""
+        with self._lock:
+            grabbed = self._grab()
+            if grabbed is None:
+                return None
+            image, name = grabbed
+            frame = Frame(image, time.monotonic(), self.frame_count, name)
+            self.frame_count += 1
+            return frame
+        
+    def _prefetch_loop(self):
+        """预取循环：提前读取帧放入队列，读完时放入None"""
+        while self._running:
+            frame = self._next_frame()
+            while self._running:
+                try:
+                    self._queue.put(frame, timeout=0.5)
+                    break
+                except Full:
+                    if self.drop_stale:
+                        try:
+                            self._queue.get_nowait()
+                        except Empty:
+                            pass
+            if frame is None:
+                break
+        
+    def read(self, timeout=None):
+        """读取一帧
+        
+        Args:
+            timeout: 预取模式下等待帧的最长时间（秒，None为一直等待）
+        
+        Returns:
+            Frame: 一帧图像，没有更多图像（或超时）时返回None
+        """
+        if not self.is_open and not self.open():
+            return None
+        
+        if self._queue is None:
+            return self._next_frame()
+        
+        try:
+            frame = self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+        if frame is None:
+            # 保留结束标记，后续读取同样返回None
+            self._queue.put(None)
+        return frame
+        
+    def read_frame(self, board=None):
+        """读取一帧图像（供ImageRecognition调用）
+        
+        Args:
+            board: 要识别的板号（1或2），普通来源忽略此参数
+        
+        Returns:
+            numpy.ndarray: BGR图像，失败返回None
+        """
+        frame = self.read()
+        return frame.image if frame else None
+        
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+        
+    def __enter__(self):
+        self.open()
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CameraFrameSource(FrameSource):
+    """摄像头图像来源
+    
+    设备在首次取帧时打开并保持打开，避免每次识别都重新打开摄像头；
+    驱动缓冲设为1帧，读到的是当前画面而不是缓冲中的旧帧。
+    """
+    
+    def __init__(self, device_id=0, width=None, height=None, prefetch=0, fallback_image=None,
+                 retry_interval=5.0):
+        """初始化摄像头来源
+        
+        Args:
+            device_id: 摄像头设备ID
+            width: 采集宽度（None为设备默认）
+            height: 采集高度（None为设备默认）
+            prefetch: 大于0时后台持续采集，只保留最新的帧
+            fallback_image: 摄像头不可用时返回的图像（None则返回None）
+            retry_interval: 摄像头不可用时重新打开的间隔（秒）
+        """
+        super().__init__(prefetch=prefetch, drop_stale=True)
+        self.device_id = device_id
+        self.width = width
+        self.height = height
+        self.fallback_image = fallback_image
+        self.retry_interval = retry_interval
+        self.capture = None
+        self._last_open_attempt = None
+        
+    def _open(self):
+        # 摄像头不可用但有备用图像时仍视为已打开，之后定期重试
+        return self._open_capture() or self.fallback_image is not None
+        
+    def _open_capture(self):
+        """打开摄像头（Linux下优先使用V4L2后端）"""
+        self._last_open_attempt = time.monotonic()
+        if sys.platform.startswith('linux'):
+            capture = cv2.VideoCapture(self.device_id, cv2.CAP_V4L2)
+        else:
+            capture = cv2.VideoCapture(self.device_id)
+            
+        if not capture.isOpened():
+            capture.release()
+            return False
+            
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if self.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.capture = capture
+        return True
+        
+    def _close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+            
+    def _grab(self):
+        if self.capture is None and time.monotonic() - self._last_open_attempt >= self.retry_interval:
+            self._open_capture()
+            
+        if self.capture is not None:
+            ret, image = self.capture.read()
+            if ret:
+                return image, f"camera{self.device_id}"
+            # 读取失败（如摄像头被拔出），释放后定期重新打开
+            self._close()
+            
+        if self.fallback_image is not None:
+            return self.fallback_image, 'fallback'
+        return None
+        
+class VideoFileFrameSource(FrameSource):
+    """视频文件图像来源"""
+    
+    def __init__(self, path, loop=False, prefetch=8):
+        """初始化视频文件来源
+        
+        Args:
+            path: 视频文件路径
+            loop: 播放到结尾后是否从头开始
+            prefetch: 预取帧数（解码与识别并行）
+        """
+        super().__init__(prefetch=prefetch)
+        self.path = path
+        self.loop = loop
+        self.capture = None
+        
+    def _open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            print(f"无法打开视频文件: {self.path}")
+            self.capture = None
+            return False
+        return True
+        
+    def _close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        
+    def _grab(self):
+        ret, image = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.capture.read()
+        if not ret:
+            return None
+        position = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+        return image, f"{os.path.basename(self.path)}#{position}"
+
+class ImageDirectoryFrameSource(FrameSource):
+    """图像目录来源：按文件名顺序逐张读取"""
+    
+    def __init__(self, directory, loop=False, prefetch=8):
+        """初始化图像目录来源
+        
+        Args:
+            directory: 图像目录
+            loop: 读完后是否从头开始
+            prefetch: 预取帧数（图像解码与识别并行）
+        """
+        super().__init__(prefetch=prefetch)
+        self.directory = directory
+        self.loop = loop
+        self.paths = []
+        self.position = 0
+        
+    def _open(self):
+        if not os.path.isdir(self.directory):
+            print(f"图像目录不存在: {self.directory}")
+            return False
+        self.paths = sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.position = 0
+        return True
+        
+    def _grab(self):
+        while True:
+            if self.position >= len(self.paths):
+                if not self.loop or not self.paths:
+                    return None
+                self.position = 0
+            path = self.paths[self.position]
+            self.position += 1
+            image = cv2.imread(path)
+            if image is not None:
+                return image, path
+            print(f"无法读取图像，已跳过: {path}")
+
+class SharedMemoryFrameSource(FrameSource):
+    """共享内存环形缓冲图像来源
+    
+    采集进程调用write()写入帧，识别进程读取最新的帧，图像数据不经过管道或套接字。
+    布局：头部[写入计数(8B)] + slots个槽位，每个槽位为
+    [序列号(8B)] [时间戳(8B, double)] [图像数据 height*width*channels]。
+    写入时序列号先置为奇数、写完置为偶数，读取时前后序列号一致且为偶数才有效。
+    """
+    
+    HEADER_SIZE = 8
+    SLOT_HEADER_SIZE = 16
+    
+    def __init__(self, name, width=640, height=480, channels=3, slots=4, create=False,
+                 timeout=1.0):
+        """初始化共享内存来源
+        
+        Args:
+            name: 共享内存名称
+            width: 图像宽度
+            height: 图像高度
+            channels: 通道数
+            slots: 环形缓冲槽位数
+            create: 是否创建共享内存（采集端创建，识别端连接）
+            timeout: 等待新帧的最长时间（秒）
+        """
+        super().__init__(prefetch=0)
+        self.name = name
+        self.shape = (height, width, channels)
+        self.slots = slots
+        self.create = create
+        self.timeout = timeout
+        self.image_size = height * width * channels
+        self.slot_size = self.SLOT_HEADER_SIZE + self.image_size
+        self.memory = None
+        self.last_count = 0
+        
+    def _open(self):
+        from multiprocessing import shared_memory
+        
+        size = self.HEADER_SIZE + self.slots * self.slot_size
+        try:
+            if self.create:
+                self.memory = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+                self.memory.buf[:self.HEADER_SIZE] = bytes(self.HEADER_SIZE)
+            else:
+                self.memory = shared_memory.SharedMemory(name=self.name)
+        except (FileNotFoundError, FileExistsError) as e:
+            print(f"共享内存打开失败: {self.name} ({str(e)})")
+            return False
+        self.last_count = 0 if self.create else self._write_count()
+        return True
+        
+    def _close(self):
+        if self.memory is not None:
+            self.memory.close()
+            if self.create:
+                self.memory.unlink()
+            self.memory = None
+        
+    def _write_count(self):
+        return struct.unpack_from('<Q', self.memory.buf, 0)[0]
+        
+    def _slot_offset(self, count):
+        return self.HEADER_SIZE + (count % self.slots) * self.slot_size
+        
+    def write(self, image, timestamp=None):
+        """写入一帧（采集端调用）
+        
+        Args:
+            image: BGR图像，尺寸必须与创建时一致
+            timestamp: 采集时间（默认当前time.monotonic()）
+        """
+        if not self.is_open and not self.open():
+            raise RuntimeError(f"共享内存不可用: {self.name}")
+        if image.shape != self.shape:
+            raise ValueError(f"图像尺寸不匹配: {image.shape}，应为{self.shape}")
+        
+        count = self._write_count()
+        offset = self._slot_offset(count)
+        buf = self.memory.buf
+        seq = struct.unpack_from('<Q', buf, offset)[0]
+        
+        struct.pack_into('<Q', buf, offset, seq + 1)
+        struct.pack_into('<d', buf, offset + 8, time.monotonic() if timestamp is None else timestamp)
+        start = offset + self.SLOT_HEADER_SIZE
+        buf[start:start + self.image_size] = np.ascontiguousarray(image).reshape(-1)
+        struct.pack_into('<Q', buf, offset, seq + 2)
+        struct.pack_into('<Q', buf, 0, count + 1)
+        
+    def read(self, timeout=None):
+        """读取最新的一帧，时间戳为采集端写入时的时间"""
+        if not self.is_open and not self.open():
+            return None
+        
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            count = self._write_count()
+            if count > self.last_count:
+                frame = self._read_slot(count - 1)
+                if frame is not None:
+                    self.last_count = count
+                    return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+        
+    def _read_slot(self, count):
+        """按序列号校验读取槽位，写入中的槽位返回None"""
+        offset = self._slot_offset(count)
+        buf = self.memory.buf
+        seq = struct.unpack_from('<Q', buf, offset)[0]
+        if seq % 2:
+            return None
+        
+        timestamp = struct.unpack_from('<d', buf, offset + 8)[0]
+        start = offset + self.SLOT_HEADER_SIZE
+        image = np.frombuffer(buf, dtype=np.uint8, count=self.image_size, offset=start)
+        image = image.reshape(self.shape).copy()
+        
+        if struct.unpack_from('<Q', buf, offset)[0] != seq:
+            return None
+        return Frame(image, timestamp, count, self.name)
+
+def open_frame_source(spec, prefetch=8, loop=False):
+    """按描述创建图像来源
+    
+    Args:
+        spec: 摄像头设备ID（整数或数字字符串）、视频文件、图像目录，
+            或 "shm:<名称>:<宽>x<高>" 形式的共享内存
+        prefetch: 文件来源的预取帧数
+        loop: 文件来源读完后是否从头开始
+    
+    Returns:
+        FrameSource: 图像来源
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraFrameSource(int(spec))
+    if str(spec).startswith('shm:'):
+        _, name, size = spec.split(':')
+        width, height = (int(value) for value in size.lower().split('x'))
+        return SharedMemoryFrameSource(name, width, height)
+    if os.path.isdir(spec):
+        return ImageDirectoryFrameSource(spec, loop=loop, prefetch=prefetch)
+    if os.path.isfile(spec):
+        return VideoFileFrameSource(spec, loop=loop, prefetch=prefetch)
+    raise ValueError(f"无法识别的图像来源: {spec}")
@@ -11,12 +11,31 @@ from pyzbar import pyzbar
 import pytesseract
 from PIL import Image
 import re
+import time
+
+from modules.frame_source import CameraFrameSource
+from modules.telemetry import image_brightness
 
 class ImageRecognition:
     """图像识别类"""
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, camera_device_id=0, frame_source=None, telemetry=None):
+        """初始化图像识别
+        
+        Args:
+            logger: 日志记录器
+            camera_device_id: 摄像头设备ID（未指定frame_source时使用）
+            frame_source: 图像来源（FrameSource，如视频文件、图像目录、模拟摄像头）
+            telemetry: 遥测数据记录（TelemetryStore或TelemetrySession，记录每次识别的结果和耗时）
+        """
         self.logger = logger
+        self.camera_device_id = camera_device_id
+        self.telemetry = telemetry
+        
+        # 图像来源，默认为摄像头（不可用时返回模拟图像）
+        if frame_source is None:
+            frame_source = CameraFrameSource(camera_device_id, fallback_image=self._create_mock_image())
+        self.frame_source = frame_source
         
         # 二维码位置映射
         self.qr_position_mapping = {
@@ -56,6 +75,27 @@ class ImageRecognition:
             self.logger.log_recognition("图像识别系统已启动")
         print("图像识别系统已启动")
         
+    def stop(self):
+        """停止图像识别系统（释放摄像头等图像来源）"""
+        self.frame_source.close()
+        
+    def _acquire_image(self, board, image_path=None, image_data=None):
+        """获取待识别的图像
+        
+        Args:
+            board: 板号（1或2），供模拟摄像头选择板面图像
+            image_path: 图像文件路径（优先）
+            image_data: 图像数据（numpy数组）
+            
+        Returns:
+            numpy.ndarray: BGR图像，失败返回None
+        """
+        if image_path:
+            return cv2.imread(image_path)
+        if image_data is not None:
+            return image_data
+        return self._capture_camera_image(board)
+        
     def recognize_qr_codes_board1(self, image_path=None, image_data=None):
         """识别板1的二维码
         
@@ -66,18 +106,13 @@ class ImageRecognition:
         Returns:
             dict: 识别结果 {'position': 'content', ...}
         """
+        started_at = time.perf_counter()
+        image = None
         try:
             # 加载图像
-            if image_path:
-                image = cv2.imread(image_path)
-            elif image_data is not None:
-                image = image_data
-            else:
-                # 模拟摄像头捕获
-                image = self._capture_camera_image()
-                
+            image = self._acquire_image(1, image_path, image_data)
             if image is None:
-                return {'error': '无法获取图像'}
+                return self._record_recognition('二维码', 1, started_at, image, {'error': '无法获取图像'})
                 
             # 将图像分为四个区域
             height, width = image.shape[:2]
@@ -96,10 +131,26 @@ class ImageRecognition:
                 if qr_content:
                     results[position] = qr_content
                     
-            return results
+            return self._record_recognition('二维码', 1, started_at, image, results)
             
         except Exception as e:
-            return {'error': f'二维码识别失败: {str(e)}'}
+            return self._record_recognition('二维码', 1, started_at, image,
+                                             {'error': f'二维码识别失败: {str(e)}'})
+            
+    def _record_recognition(self, kind, board, started_at, image, results):
+        """记录识别遥测数据（只放入队列），返回results"""
+        if self.telemetry is None:
+            return results
+        duration = time.perf_counter() - started_at
+        error = results.get('error')
+        if error is not None:
+            found = 0
+        elif kind == 'OCR':
+            found = sum(1 for status in results['window_status'].values() if status['text'])
+        else:
+            found = len(results)
+        self.telemetry.record_recognition(kind, board, found, 4, duration, image_brightness(image), error)
+        return results
             
     def _decode_qr_code(self, image_region):
         """解码二维码"""
@@ -130,18 +181,13 @@ class ImageRecognition:
         Returns:
             dict: 识别结果 {'window_status': {...}, 'available': bool}
         """
+        started_at = time.perf_counter()
+        image = None
         try:
             # 加载图像
-            if image_path:
-                image = cv2.imread(image_path)
-            elif image_data is not None:
-                image = image_data
-            else:
-                # 模拟摄像头捕获
-                image = self._capture_camera_image()
-                
+            image = self._acquire_image(2, image_path, image_data)
             if image is None:
-                return {'error': '无法获取图像'}
+                return self._record_recognition('OCR', 2, started_at, image, {'error': '无法获取图像'})
                 
             # 将图像分为四个区域
             height, width = image.shape[:2]
@@ -163,13 +209,13 @@ class ImageRecognition:
                     'available': status
                 }
                 
-            return {
+            return self._record_recognition('OCR', 2, started_at, image, {
                 'window_status': window_status,
                 'available': all(status['available'] for status in window_status.values())
-            }
+            })
             
         except Exception as e:
-            return {'error': f'OCR识别失败: {str(e)}'}
+            return self._record_recognition('OCR', 2, started_at, image, {'error': f'OCR识别失败: {str(e)}'})
             
     def _extract_text_ocr(self, image_region):
         """提取图像区域的文字"""
@@ -197,23 +243,18 @@ class ImageRecognition:
             # 默认返回空闲状态
             return True
             
-    def _capture_camera_image(self):
-        """捕获摄像头图像（模拟）"""
+    def _capture_camera_image(self, board=None):
+        """从图像来源读取一帧
+        
+        Args:
+            board: 要识别的板号（1或2），供模拟摄像头选择板面图像
+        """
         try:
-            # 尝试打开摄像头
-            cap = cv2.VideoCapture(0)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                cap.release()
-                if ret:
-                    return frame
-            
-            # 如果摄像头不可用，返回模拟图像
-            return self._create_mock_image()
+            return self.frame_source.read_frame(board)
             
         except Exception as e:
             print(f"摄像头捕获异常: {str(e)}")
-            return self._create_mock_image()
+            return None
             
     def _create_mock_image(self):
         """创建模拟图像用于测试"""
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+日志索引模块
+为文字日志（pharmacy_robot_*.log，含轮转压缩后的.log.gz）建立紧凑的分块索引，
+查询时按时间范围、事件类型和指令只读取可能匹配的块，不需要扫描全部日志。
+
+每个日志目录一个索引文件（log_index.jsonl），每行为一个日志文件的索引：
+    {"file": 文件名, "size": 已索引字节数, "closed": 是否已关闭,
+     "start": 最早时间, "end": 最晚时间, "types": {事件类型: 条数},
+     "blocks": [[偏移, 长度, 最早时间, 最晚时间, {事件类型: 条数}, [指令...]或null], ...],
+     "members": [[未压缩偏移, 压缩文件偏移], ...]}
+时间为日志行中的"YYYY-MM-DD HH:MM:SS"字符串（可直接按字符串比较）。
+索引只追加：日志文件增长后从上次的位置继续索引，同一文件以最后一行为准。
+
+偏移均为未压缩文件中的字节偏移。归档线程压缩已索引的日志时每块写为单独的gzip成员，
+并在members中记录各成员的位置，查询时直接从块所在的成员开始解压；
+没有members的.gz（未按块压缩）只能从文件头解压到块的位置。
+
+运行中的日志归档线程和log_query.py会同时读写索引文件：读取、整理和追加索引时
+持有log_index.jsonl.lock上的文件锁，整理时写入带进程号的临时文件后替换。
+"""
+
+import fnmatch
+import glob
+import gzip
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # 非POSIX系统：不加文件锁
+    fcntl = None
+
+INDEX_FILENAME = 'log_index.jsonl'
+
+# 日志文件名通配符（不含扩展名）
+LOG_FILE_PATTERN = 'pharmacy_robot_*'
+
+# 每块的大约字节数
+BLOCK_SIZE = 64 * 1024
+
+# 每块最多记录的不同指令数，超过时不记录（查询指令时需要读取该块）
+MAX_BLOCK_COMMANDS = 32
+
+# 重复日志汇总的消息后缀（见SystemLogger重复日志合并）
+REPEAT_MARKER = ' （又重复'
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_UART_RECEIVE = 'UART接收'.encode('utf-8')
+_UART_SEND = 'UART发送'.encode('utf-8')
+_REPEAT_MARKER = REPEAT_MARKER.encode('utf-8')
+
+def parse_log_line(line):
+    """解析日志行
+    
+    Args:
+        line: 日志行（bytes，可含换行符）
+    
+    Returns:
+        tuple: (时间, 事件类型, 消息)，均为bytes；不是日志条目的行（文件头、多行消息的后续行）返回None
+    """
+    if line[:1] != b'[' or line[20:23] != b'] [':
+        return None
+    end = line.find(b'] ', 23)
+    if end < 0:
+        return None
+    return line[1:20], line[23:end], line[end + 2:].rstrip(b'\r\n')
+
+def base_command(message):
+    """去掉重复日志汇总后缀，得到原消息（bytes）"""
+    index = message.find(_REPEAT_MARKER)
+    return message if index < 0 else message[:index]
+
+def normalize_time(text, end=False):
+    """把查询时间转换为日志时间字符串
+    
+    支持"YYYY-MM-DD"、"YYYY-MM-DD HH:MM"、"YYYY-MM-DD HH:MM:SS"；
+    end为True时只有日期的时间取当天最后一秒。
+    """
+    for time_format in (TIME_FORMAT, '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            value = datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        if end and time_format == '%Y-%m-%d':
+            value = value.replace(hour=23, minute=59, second=59)
+        return value.strftime(TIME_FORMAT)
+    raise ValueError(f"无法解析的时间: {text}")
+
+def _open_log(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+@contextmanager
+def _open_log_at(path, entry, offset):
+    """打开日志文件并定位到未压缩文件中的偏移
+    
+    按块压缩的.gz从偏移所在的gzip成员开始解压（之后的成员会继续解压，可以向后读取）。
+    """
+    members = dict(entry.get('members') or ()) if path.endswith('.gz') else {}
+    if offset not in members:
+        with _open_log(path) as f:
+            f.seek(offset)
+            yield f
+        return
+    
+    with open(path, 'rb') as raw:
+        raw.seek(members[offset])
+        with gzip.GzipFile(fileobj=raw, mode='rb') as f:
+            yield f
+
+def _log_name(path):
+    """索引中的文件名（压缩后的.gz与原文件使用同一条索引）"""
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith('.gz') else name
+
+def index_log_file(path, start_offset=0, block_size=BLOCK_SIZE):
+    """索引日志文件从start_offset开始的完整行
+    
+    Returns:
+        tuple: (块列表, 已索引到的偏移)
+    """
+    blocks = []
+    block = None
+    offset = start_offset
+    type_names = {}
+    
+    def finish(block):
+        if block['commands'] is not None:
+            block['commands'] = sorted(command.decode('utf-8', errors='replace')
+                                       for command in block['commands'])
+        blocks.append([block['offset'], offset - block['offset'],
+                       block['start'].decode(), block['end'].decode(),
+                       block['types'], block['commands']])
+    
+    with _open_log(path) as f:
+        if start_offset:
+            f.seek(start_offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                # 正在写入的不完整行，下次再索引
+                break
+            parsed = parse_log_line(line)
+            if parsed is not None:
+                timestamp, event_type, message = parsed
+                if block is None:
+                    block = {'offset': offset, 'start': timestamp, 'end': timestamp,
+                             'types': {}, 'commands': set()}
+                elif timestamp < block['start']:
+                    block['start'] = timestamp
+                elif timestamp > block['end']:
+                    block['end'] = timestamp
+                
+                name = type_names.get(event_type)
+                if name is None:
+                    name = type_names[event_type] = event_type.decode('utf-8', errors='replace')
+                block['types'][name] = block['types'].get(name, 0) + 1
+                
+                if name == 'UART接收' and block['commands'] is not None:
+                    block['commands'].add(base_command(message))
+                    if len(block['commands']) > MAX_BLOCK_COMMANDS:
+                        block['commands'] = None
+            offset += len(line)
+            
+            if block is not None and offset - block['offset'] >= block_size:
+                finish(block)
+                block = None
+    
+    if block is not None:
+        finish(block)
+    return blocks, offset
+
+class LogIndex:
+    """单个日志目录的索引"""
+    
+    def __init__(self, log_dir, file_pattern=LOG_FILE_PATTERN, block_size=BLOCK_SIZE):
+        """初始化日志索引
+        
+        Args:
+            log_dir: 日志目录
+            file_pattern: 日志文件名通配符（不含扩展名）
+            block_size: 每块的大约字节数
+        """
+        self.log_dir = log_dir
+        self.file_pattern = file_pattern
+        self.block_size = block_size
+        self.index_path = os.path.join(log_dir, INDEX_FILENAME)
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        
+    @contextmanager
+    def locked(self):
+        """持有索引文件锁（可重入；目录不可写时不加锁）"""
+        with self._lock:
+            if self._lock_depth == 0:
+                try:
+                    self._lock_file = open(self.index_path + '.lock', 'a')
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                except OSError:
+                    self._lock_file = None
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    self._lock_file.close()
+                    self._lock_file = None
+        
+    def load(self):
+        """读取索引
+        
+        Returns:
+            dict: 文件名 -> 索引（已删除的日志文件不包含在内）
+        """
+        with self.locked():
+            return self._load()
+            
+    def _load(self):
+        entries = {}
+        lines = 0
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 写入中断的不完整行
+                        continue
+                    entries[entry['file']] = entry
+        except FileNotFoundError:
+            return {}
+        
+        entries = {name: entry for name, entry in entries.items() if self.find_file(name)}
+        if lines > 2 * len(entries) + 16:
+            try:
+                self._compact(entries)
+            except OSError as e:
+                # 只读目录等：保留未整理的索引
+                print(f"整理日志索引失败: {str(e)}")
+        return entries
+        
+    def find_file(self, name):
+        """查找日志文件（原文件或压缩后的.gz），不存在返回None"""
+        for path in (os.path.join(self.log_dir, name), os.path.join(self.log_dir, name + '.gz')):
+            if os.path.exists(path):
+                return path
+        return None
+        
+    def _compact(self, entries):
+        """重写索引文件，去掉被覆盖的旧索引和已删除日志的索引"""
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(temp_path, self.index_path)
+        
+    def _append(self, entry):
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        
+    def update(self, path, closed=False, entries=None):
+        """增量索引一个日志文件（只读取上次索引之后的部分）
+        
+        Args:
+            path: 日志文件路径
+            closed: 文件是否已关闭（不会再增长）
+            entries: 已读取的索引（默认读取索引文件）
+        
+        Returns:
+            dict: 该文件的索引
+        """
+        with self.locked():
+            return self._update(path, closed, entries)
+            
+    def _update(self, path, closed, entries):
+        if entries is None:
+            entries = self.load()
+        name = _log_name(path)
+        entry = entries.get(name)
+        if entry is not None and entry['closed']:
+            return entry
+        if entry is None:
+            entry = {'file': name, 'size': 0, 'closed': False, 'start': None, 'end': None,
+                     'types': {}, 'blocks': []}
+        
+        closed = closed or path.endswith('.gz')
+        if not path.endswith('.gz') and os.path.getsize(path) == entry['size'] and not closed:
+            return entry
+        
+        blocks, size = index_log_file(path, entry['size'], self.block_size)
+        if not blocks and size == entry['size'] and closed == entry['closed']:
+            return entry
+        
+        entry['blocks'].extend(blocks)
+        entry['size'] = size
+        entry['closed'] = closed
+        for _, _, start, end, types, _ in blocks:
+            if entry['start'] is None or start < entry['start']:
+                entry['start'] = start
+            if entry['end'] is None or end > entry['end']:
+                entry['end'] = end
+            for event_type, count in types.items():
+                entry['types'][event_type] = entry['types'].get(event_type, 0) + count
+        
+        self._append(entry)
+        entries[name] = entry
+        return entry
+        
+    def set_members(self, path, members):
+        """记录按块压缩后的gzip成员位置（见LogArchiver）
+        
+        Args:
+            path: 压缩后的文件路径
+            members: [[未压缩偏移, 压缩文件偏移], ...]
+        """
+        with self.locked():
+            entries = self.load()
+            entry = entries.get(_log_name(path))
+            if entry is None:
+                return
+            entry['members'] = members
+            self._append(entry)
+        
+    def update_all(self):
+        """索引目录中新增或增长的日志文件
+        
+        Returns:
+            dict: 文件名 -> 索引
+        """
+        with self.locked():
+            entries = self.load()
+            for path in sorted(glob.glob(os.path.join(self.log_dir, self.file_pattern + '.log*'))):
+                if path.endswith('.log') or path.endswith('.log.gz'):
+                    self.update(path, entries=entries)
+            return entries
+
+def select_blocks(entry, since=None, until=None, event_types=None, command=None):
+    """选出可能包含匹配日志的块
+    
+    Returns:
+        list: 合并相邻块后的(偏移, 长度)列表
+    """
+    ranges = []
+    for offset, length, start, end, types, commands in entry['blocks']:
+        if (since and end < since) or (until and start > until):
+            continue
+        if event_types and not any(event_type in types for event_type in event_types):
+            continue
+        if command is not None and commands is not None and command not in commands:
+            continue
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+        else:
+            ranges.append((offset, length))
+    return ranges
+
+def _iter_entries(lines):
+    """把日志行组合为日志条目（多行消息的后续行归入前一条）
+    
+    Yields:
+        tuple: (解析结果, 原始行列表)
+    """
+    parsed, raw = None, []
+    for line in lines:
+        result = parse_log_line(line)
+        if result is None:
+            if parsed is not None:
+                raw.append(line)
+            continue
+        if parsed is not None:
+            yield parsed, raw
+        parsed, raw = result, [line]
+    if parsed is not None:
+        yield parsed, raw
+
+def query_logs(log_dirs, since=None, until=None, event_types=None, text=None,
+               command=None, reply=None, update=True, file_pattern=LOG_FILE_PATTERN):
+    """查询日志
+    
+    Args:
+        log_dirs: 日志目录列表（含子目录，如多机器人会话的日志目录）
+        since/until: 时间范围（日志时间字符串，见normalize_time）
+        event_types: 事件类型列表
+        text: 消息包含的文字
+        command: UART接收指令（输出该指令及其响应）
+        reply: 指令的响应（与command一起使用，只输出响应匹配的指令）
+        update: 查询前先增量索引新增或增长的日志
+        file_pattern: 日志文件名通配符（不含扩展名）
+    
+    Yields:
+        tuple: (日志文件路径, 日志条目文本)
+    """
+    text = text.encode('utf-8') if text else None
+    command_bytes = command.encode('utf-8') if command is not None else None
+    reply_bytes = reply.encode('utf-8') if reply is not None else None
+    wanted_types = [event_type.encode('utf-8') for event_type in event_types or ()]
+    if command is not None:
+        wanted_types = [_UART_RECEIVE, _UART_SEND]
+    since_bytes = since.encode() if since else None
+    until_bytes = until.encode() if until else None
+    
+    for index in find_log_indexes(log_dirs, file_pattern):
+        entries = index.update_all() if update else index.load()
+        for name in sorted(entries):
+            entry = entries[name]
+            if (since and entry['end'] and entry['end'] < since) or \
+                    (until and entry['start'] and entry['start'] > until):
+                continue
+            path = index.find_file(name)
+            ranges = select_blocks(entry, since, until, event_types if command is None else ['UART接收'], command)
+            if not ranges:
+                continue
+            
+            for offset, length in ranges:
+                with _open_log_at(path, entry, offset) as f:
+                    lines = f.read(length).splitlines(keepends=True)
+                    pending = None
+                    for (timestamp, event_type, message), raw in _iter_entries(lines):
+                        if (since_bytes and timestamp < since_bytes) or (until_bytes and timestamp > until_bytes):
+                            continue
+                        if wanted_types and event_type not in wanted_types:
+                            continue
+                        if text and text not in b''.join(raw):
+                            continue
+                        if command is None:
+                            yield path, b''.join(raw).decode('utf-8', errors='replace')
+                            continue
+                        
+                        # 指令与其后的第一条响应配对
+                        if event_type == _UART_RECEIVE:
+                            pending = raw if base_command(message) == command_bytes else None
+                        elif pending is not None:
+                            if reply_bytes is None or base_command(message) == reply_bytes:
+                                yield path, b''.join(pending + raw).decode('utf-8', errors='replace')
+                            pending = None
+                    
+                    if pending is not None:
+                        # 响应在块之后，继续向后读取
+                        for line in f:
+                            parsed = parse_log_line(line)
+                            if parsed is None or parsed[1] != _UART_SEND:
+                                continue
+                            if reply_bytes is None or base_command(parsed[2]) == reply_bytes:
+                                yield path, b''.join(pending + [line]).decode('utf-8', errors='replace')
+                            break
+
+def count_logs(log_dirs, since=None, until=None, update=True, file_pattern=LOG_FILE_PATTERN):
+    """按事件类型统计日志条数（只读取与时间范围部分重叠的块）
+    
+    Returns:
+        dict: 事件类型 -> 条数
+    """
+    counts = {}
+    since_bytes = since.encode() if since else None
+    until_bytes = until.encode() if until else None
+    for index in find_log_indexes(log_dirs, file_pattern):
+        entries = index.update_all() if update else index.load()
+        for name, entry in sorted(entries.items()):
+            partial = []
+            for offset, length, start, end, types, _ in entry['blocks']:
+                if (since and end < since) or (until and start > until):
+                    continue
+                if (since and start < since) or (until and end > until):
+                    partial.append((offset, length))
+                    continue
+                for event_type, count in types.items():
+                    counts[event_type] = counts.get(event_type, 0) + count
+            if not partial:
+                continue
+            path = index.find_file(name)
+            for offset, length in partial:
+                with _open_log_at(path, entry, offset) as f:
+                    for line in f.read(length).splitlines():
+                        parsed = parse_log_line(line)
+                        if parsed is None:
+                            continue
+                        timestamp, event_type, _ = parsed
+                        if (since_bytes and timestamp < since_bytes) or (until_bytes and timestamp > until_bytes):
+                            continue
+                        event_type = event_type.decode('utf-8', errors='replace')
+                        counts[event_type] = counts.get(event_type, 0) + 1
+    return counts
+
+def find_log_indexes(log_dirs, file_pattern=LOG_FILE_PATTERN):
+    """查找日志目录及其子目录中含日志文件的目录
+    
+    Returns:
+        list: LogIndex列表
+    """
+    directories = set()
+    for log_dir in log_dirs:
+        for root, _, files in os.walk(log_dir):
+            if fnmatch.filter(files, file_pattern + '.log*'):
+                directories.add(root)
+    return [LogIndex(directory, file_pattern) for directory in sorted(directories)]
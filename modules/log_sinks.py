@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+日志输出模块
+SystemLogger写入日志文件后，把格式化好的日志行分发给各个输出（sink）。
+每个输出有自己的有界队列和后台线程，队列满时按丢弃策略处理，
+慢速的输出（如串口控制台、SSH会话）不会阻塞日志写入线程。
+- ConsoleSink: 控制台输出，超过速率限制时省略并定期汇总省略条数
+- SyslogSink: 通过Unix套接字发送到syslog/journald
+- MemorySink: 保存在内存中（供界面显示或测试）
+- FileSink: 额外的纯文本日志文件（如写到另一块磁盘）
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from itertools import islice
+from queue import Queue, Empty, Full
+
+# 丢弃策略
+DROP_NEWEST = 'drop_newest'   # 队列满时丢弃新日志
+DROP_OLDEST = 'drop_oldest'   # 队列满时丢弃最旧的日志
+BLOCK = 'block'               # 队列满时等待（会阻塞日志写入线程）
+
+# 线程停止标记
+_STOP = object()
+
+class LogSink:
+    """日志输出基类
+    
+    子类实现emit(entries)，entries为[(事件类型, 日志行), ...]，在输出线程中调用。
+    """
+    
+    def __init__(self, name, max_queue=1000, drop_policy=DROP_NEWEST, idle_interval=1.0):
+        """初始化日志输出
+        
+        Args:
+            name: 输出名称
+            max_queue: 队列最大条数
+            drop_policy: 队列满时的丢弃策略（drop_newest/drop_oldest/block）
+            idle_interval: 空闲时调用on_idle()的间隔（秒）
+        """
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST, BLOCK):
+            raise ValueError(f"未知的丢弃策略: {drop_policy}")
+        
+        self.name = name
+        self.drop_policy = drop_policy
+        self.idle_interval = idle_interval
+        self.queue = Queue(maxsize=max_queue)
+        self.thread = None
+        self.dropped = 0
+        self.errors = 0
+        
+    def start(self):
+        """启动输出线程"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._sink_loop, name=f"log-sink-{self.name}")
+        self.thread.daemon = True
+        self.thread.start()
+        
+    def stop(self, timeout=1.0):
+        """输出队列中剩余的日志后停止"""
+        if not (self.thread and self.thread.is_alive()):
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except Full:
+            pass
+        self.thread.join(timeout=timeout)
+        
+    def submit(self, entries):
+        """提交日志（由日志写入线程调用，除block策略外不会阻塞）"""
+        for entry in entries:
+            if self.drop_policy == BLOCK:
+                self.queue.put(entry)
+                continue
+            try:
+                self.queue.put_nowait(entry)
+            except Full:
+                if self.drop_policy == DROP_OLDEST:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.put_nowait(entry)
+                    except (Empty, Full):
+                        pass
+                self.dropped += 1
+        
+    def _sink_loop(self):
+        """输出循环：每次取出所有待输出的日志"""
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_interval)
+            except Empty:
+                self._safe_call(self.on_idle)
+                continue
+            
+            entries, stop = [], False
+            while True:
+                if item is _STOP:
+                    stop = True
+                else:
+                    entries.append(item)
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+            
+            if entries:
+                self._safe_call(self.emit, entries)
+            if stop:
+                self._safe_call(self.close)
+                return
+        
+    def _safe_call(self, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1:
+                sys.stderr.write(f"日志输出{self.name}异常: {str(e)}\n")
+        
+    def emit(self, entries):
+        """输出日志（子类实现）"""
+        raise NotImplementedError
+        
+    def on_idle(self):
+        """队列空闲时调用"""
+        pass
+        
+    def close(self):
+        """停止时调用，释放资源"""
+        pass
+
+class ConsoleSink(LogSink):
+    """控制台输出（令牌桶限速）
+    
+    超过速率的日志不输出，之后输出一行"已省略N条日志"的汇总；
+    队列满被丢弃的日志也计入省略条数。
+    """
+    
+    def __init__(self, rate=50.0, burst=200, stream=None, max_queue=1000):
+        """初始化控制台输出
+        
+        Args:
+            rate: 每秒最多输出的行数（0表示不限速）
+            burst: 允许的突发行数
+            stream: 输出流（默认为当前的sys.stdout）
+            max_queue: 队列最大条数
+        """
+        super().__init__('console', max_queue=max_queue, drop_policy=DROP_NEWEST)
+        self.rate = rate
+        self.burst = burst
+        self.stream = stream
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.suppressed = 0
+        self._reported_drops = 0
+        
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        
+    def emit(self, entries):
+        lines = []
+        if self.rate:
+            self._refill()
+            for _, line in entries:
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    lines.append(line)
+                else:
+                    self.suppressed += 1
+        else:
+            lines = [line for _, line in entries]
+        
+        summary = self._summary()
+        if summary:
+            lines.insert(0, summary)
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+        
+    def on_idle(self):
+        if self.rate:
+            self._refill()
+        summary = self._summary()
+        if summary:
+            stream = self.stream or sys.stdout
+            stream.write(summary + '\n')
+            stream.flush()
+        
+    def _summary(self):
+        """有可用配额时汇总省略的条数"""
+        suppressed = self.suppressed + self.dropped - self._reported_drops
+        if not suppressed or (self.rate and self.tokens < 1):
+            return None
+        if self.rate:
+            self.tokens -= 1
+        self.suppressed = 0
+        self._reported_drops = self.dropped
+        return f"... 控制台输出已省略 {suppressed} 条日志（完整内容见日志文件）"
+
+class SyslogSink(LogSink):
+    """syslog/journald输出（Unix数据报套接字，如/dev/log）"""
+    
+    # 事件类型对应的syslog优先级
+    SEVERITIES = {'错误': 3, '调试': 7}
+    DEFAULT_SEVERITY = 6
+    
+    def __init__(self, address='/dev/log', ident='pharmacy_robot', facility=1, max_queue=1000):
+        """初始化syslog输出
+        
+        Args:
+            address: syslog套接字路径（journald兼容/dev/log）
+            ident: 程序标识
+            facility: syslog facility（1为user）
+            max_queue: 队列最大条数
+        """
+        super().__init__('syslog', max_queue=max_queue, drop_policy=DROP_OLDEST)
+        self.address = address
+        self.ident = ident
+        self.facility = facility
+        self.sock = None
+        
+    def _connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.connect(self.address)
+        
+    def emit(self, entries):
+        for event_type, line in entries:
+            priority = self.facility * 8 + self.SEVERITIES.get(event_type, self.DEFAULT_SEVERITY)
+            message = f"<{priority}>{self.ident}[{os.getpid()}]: {line}".encode('utf-8')
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.send(message)
+            except OSError:
+                # syslog未运行或重启，下次重新连接；本条丢弃
+                self.close()
+                self.dropped += 1
+        
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class MemorySink(LogSink):
+    """内存输出：保留最近的日志行"""
+    
+    def __init__(self, capacity=1000, max_queue=1000):
+        super().__init__('memory', max_queue=max_queue, drop_policy=DROP_OLDEST)
+        self.entries = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        
+    def emit(self, entries):
+        with self.lock:
+            self.entries.extend(entries)
+        
+    def get_lines(self, lines=50, event_type=None):
+        """获取最近的日志行（按时间顺序）"""
+        with self.lock:
+            matched = (line for entry_type, line in reversed(self.entries)
+                       if event_type is None or entry_type == event_type)
+            return list(islice(matched, lines))[::-1]
+
+class FileSink(LogSink):
+    """额外的纯文本日志文件"""
+    
+    def __init__(self, path, max_queue=10000, drop_policy=BLOCK):
+        super().__init__('file', max_queue=max_queue, drop_policy=drop_policy)
+        self.path = path
+        self.file = None
+        
+    def emit(self, entries):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write('\n'.join(line for _, line in entries) + '\n')
+        self.file.flush()
+        
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
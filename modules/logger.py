@@ -5,30 +5,414 @@
 实现系统日志记录功能
 """
 
+import glob
+import gzip
 import os
+import re
+import shutil
 import threading
+import time
+from collections import deque
 from datetime import datetime
-from queue import Queue
+from itertools import islice
+from queue import Queue, Empty
+
+from modules.flight_recorder import FlightRecorder
+from modules.log_index import LogIndex
+from modules.log_sinks import ConsoleSink, SyslogSink
+from modules.structured_log import (
+    BINARY_MAGIC, STRUCTURED_EXTENSIONS, encode_binary_record, encode_json_record
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 写入线程的停止标记
+_STOP = object()
+
+# 日志级别
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+# 各事件类型的默认级别（未列出的事件类型为INFO）
+DEFAULT_EVENT_LEVELS = {'调试': 'DEBUG', '错误': 'ERROR'}
+_INFO = LOG_LEVELS['INFO']
+
+def _level_value(level):
+    """级别名称转换为数值"""
+    if isinstance(level, int):
+        return level
+    try:
+        return LOG_LEVELS[level.upper()]
+    except KeyError:
+        raise ValueError(f"未知的日志级别: {level}（可用: {', '.join(LOG_LEVELS)}）")
+
+def lock_log_file(handle):
+    """对正在写入的日志文件加排他锁（进程退出时自动释放），归档线程据此跳过仍在使用的文件"""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    return handle
+
+def is_log_file_in_use(path):
+    """日志文件是否仍被运行中的日志记录使用
+    
+    写入进程在写入文件头之前加锁，因此空文件视为正在创建；
+    无法加锁检查的平台上一律视为使用中。
+    """
+    if fcntl is None:
+        return True
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return True
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    return False
+
+def tail_log_file(path, lines=50, event_type=None, block_size=64 * 1024):
+    """读取日志文件最后的若干行
+    
+    从文件末尾按块向前读取，读够行数即停止，耗时与文件大小无关。
+    压缩的日志（.gz）无法反向定位，顺序读取。
+    
+    Args:
+        path: 日志文件路径
+        lines: 返回的行数
+        event_type: 只返回该事件类型的日志（如"错误"、"UART接收"）
+        block_size: 每次读取的块大小
+    
+    Returns:
+        list: 日志行（按时间顺序，含换行符）
+    """
+    tag = f"] [{event_type}] ".encode('utf-8') if event_type else None
+    
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            matched = deque((line.rstrip(b'\n') for line in f if tag is None or tag in line), maxlen=lines)
+        return [line.decode('utf-8', errors='replace') + '\n' for line in matched]
+    
+    matched = []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0 and len(matched) < lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            parts = (f.read(read_size) + remainder).split(b'\n')
+            # 块的第一行可能不完整，与前一块拼接后再处理
+            remainder = parts.pop(0)
+            for line in reversed(parts):
+                if line and (tag is None or tag in line):
+                    matched.append(line)
+                    if len(matched) >= lines:
+                        break
+        if position == 0 and remainder and len(matched) < lines and (tag is None or tag in remainder):
+            matched.append(remainder)
+    
+    return [line.decode('utf-8', errors='replace') + '\n' for line in reversed(matched)]
+
+class LogArchiver:
+    """日志归档线程：索引、压缩轮转后的日志文件，清理超过保留天数的日志
+    
+    以最低调度优先级运行，只处理写入线程轮转后提交的文件，写入线程提交后不等待。
+    启动时还会处理之前运行留下的未压缩日志，但跳过其他日志记录仍在写入的文件。
+    """
+    
+    def __init__(self, log_dir, file_pattern, retention_days=30, compress=True, index=None):
+        """初始化归档线程
+        
+        Args:
+            log_dir: 日志目录
+            file_pattern: 日志文件名通配符（含扩展名，如 pharmacy_robot_*_*.*）
+            retention_days: 日志保留天数（0表示不清理）
+            compress: 是否gzip压缩轮转后的文件
+            index: 日志索引（log_index.LogIndex，压缩前为文字日志建立索引；None表示不索引）
+        """
+        self.log_dir = log_dir
+        self.file_pattern = file_pattern
+        self.retention_days = retention_days
+        self.compress = compress
+        self.index = index
+        self.queue = Queue()
+        self.thread = None
+        
+    def start(self):
+        """启动归档线程"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._archive_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        
+    def stop(self, timeout=2.0):
+        """停止归档线程（未完成的压缩在下次启动时继续）"""
+        if self.thread and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout=timeout)
+        
+    def submit(self, paths):
+        """提交已关闭的日志文件进行压缩，并触发过期清理"""
+        self.queue.put([path for path in paths if path])
+        
+    def find_unarchived(self, exclude=()):
+        """查找未压缩的历史日志（之前运行留下的日志文件，不含仍在写入的文件）"""
+        paths = []
+        for path in glob.glob(os.path.join(self.log_dir, self.file_pattern)):
+            if path.endswith('.gz.tmp'):
+                # 上次压缩中断留下的临时文件
+                self._remove(path)
+            elif not path.endswith('.gz') and path not in exclude and not is_log_file_in_use(path):
+                paths.append(path)
+        return sorted(paths)
+        
+    def _archive_loop(self):
+        """归档循环"""
+        self._lower_priority()
+        while True:
+            paths = self.queue.get()
+            if paths is _STOP:
+                break
+            self._enforce_retention()
+            for path in paths:
+                boundaries = None
+                if self.index is not None and path.endswith('.log'):
+                    boundaries = self._index(path)
+                if self.compress:
+                    members = self._compress(path, boundaries)
+                    if members:
+                        self._record_members(path, members)
+        
+    def _lower_priority(self):
+        """降低当前线程的调度优先级（Linux下nice值作用于单个线程）"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        
+    def _index(self, path):
+        """为已关闭的文字日志建立索引
+        
+        Returns:
+            list: 各索引块的起始偏移（失败时为None）
+        """
+        try:
+            entry = self.index.update(path, closed=True)
+            return [block[0] for block in entry['blocks']]
+        except Exception as e:
+            print(f"索引日志文件失败: {path}, {str(e)}")
+            return None
+            
+    def _record_members(self, path, members):
+        """在索引中记录压缩文件各gzip成员的位置"""
+        try:
+            self.index.set_members(path + '.gz', members)
+        except Exception as e:
+            print(f"索引日志文件失败: {path}, {str(e)}")
+        
+    def _compress(self, path, boundaries=None):
+        """gzip压缩日志文件，成功后删除原文件
+        
+        指定boundaries（未压缩文件中的偏移，如索引块的起始位置）时，每段压缩为单独的
+        gzip成员，查询时可以直接从块所在的成员开始解压，不需要从文件头解压。
+        
+        Returns:
+            list: [[未压缩偏移, 压缩文件偏移], ...]，未指定boundaries或压缩失败时为None
+        """
+        if not os.path.exists(path):
+            return None
+        temp_path = path + '.gz.tmp'
+        members = None
+        try:
+            if boundaries:
+                members = self._compress_members(path, temp_path, boundaries)
+            else:
+                with open(path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+            # 保留原文件的修改时间，保留天数按日志本身的时间计算
+            shutil.copystat(path, temp_path)
+            os.replace(temp_path, path + '.gz')
+            os.remove(path)
+            return members
+        except Exception as e:
+            print(f"压缩日志文件失败: {path}, {str(e)}")
+            self._remove(temp_path)
+            return None
+            
+    def _compress_members(self, path, temp_path, boundaries):
+        """按偏移分段，每段写为一个gzip成员（多成员文件仍是合法的gzip文件）"""
+        size = os.path.getsize(path)
+        starts = sorted({0} | {offset for offset in boundaries if 0 < offset < size})
+        members = []
+        with open(path, 'rb') as source, open(temp_path, 'wb') as target:
+            for start, end in zip(starts, starts[1:] + [size]):
+                members.append([start, target.tell()])
+                with gzip.GzipFile(fileobj=target, mode='wb') as member:
+                    member.write(source.read(end - start))
+        return members
+        
+    def _enforce_retention(self):
+        """删除超过保留天数的日志文件（跳过仍在写入的文件）"""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 24 * 3600
+        for path in glob.glob(os.path.join(self.log_dir, self.file_pattern)):
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if not path.endswith('.gz') and is_log_file_in_use(path):
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+        
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
 class SystemLogger:
-    """系统日志记录类"""
+    """系统日志记录类
+    
+    日志条目由后台写入线程批量写入：线程阻塞等待队列，一次取出所有待写条目，
+    合并为一次write写入常开的文件句柄；按fsync_interval定期fsync落盘，
+    记录错误、flush_logs()和停止时立即落盘。
+    
+    除文字日志外，同一写入线程还输出结构化记录流（见structured_log模块），
+    包含事件类型、单调时钟时间戳及指令、耗时、窗口、样本等字段。
+    
+    日志文件超过max_bytes或rotate_interval时由写入线程轮转到新文件，
+    旧文件交给LogArchiver在后台索引（index_logs，见log_index模块）和压缩，
+    并按retention_days清理过期日志。
+    
+    最近写入的recent_size条日志（总体和按事件类型）保存在内存环形缓冲中，
+    get_recent_logs()不需要读取日志文件。
+    
+    每种事件类型有各自的级别，低于level的日志在log()入口直接丢弃；
+    消息参数的格式化（message % args）和时间戳格式化都在写入线程中进行。
     
-    def __init__(self, log_dir="logs"):
+    连续相同的日志（或连续相同的指令-响应对）在repeat_window秒内只写入第一条（对），
+    出现不同的日志、窗口结束或flush_logs()、停止时写入汇总，记录重复次数、首末次时间
+    和响应耗时统计。
+    
+    启用飞行记录器（flight_recorder_slots > 0）时，log()同时把事件同步写入
+    日志目录下的flight_recorder.bin（mmap环形文件），进程崩溃或卡死时
+    队列中未写入的日志仍可用flight_recorder_dump.py查看。
+    
+    写入文件后，日志行分发给各个输出（见log_sinks模块：控制台、syslog、内存等），
+    每个输出有自己的有界队列和线程，慢速的控制台不会拖慢日志落盘。
+    """
+    
+    def __init__(self, log_dir="logs", fsync_interval=1.0, structured_format='jsonl',
+                 filename_format='pharmacy_robot_%Y%m%d_%H%M%S.log', max_bytes=0,
+                 rotate_interval=0, retention_days=30, compress_rotated=True, recent_size=1000,
+                 level='INFO', event_levels=None, console_rate=50, syslog_address=None, sinks=None,
+                 repeat_window=0, flight_recorder_slots=0, index_logs=False):
+        """初始化日志记录
+        
+        Args:
+            log_dir: 日志目录
+            fsync_interval: 定期fsync的间隔（秒，0表示每批都fsync）
+            structured_format: 结构化日志编码（'jsonl'、'binary'，None表示不输出）
+            filename_format: 日志文件名格式（strftime格式）
+            max_bytes: 单个日志文件最大字节数，超过后轮转（0表示不按大小轮转）
+            rotate_interval: 单个日志文件最长时间（秒），超过后轮转（0表示不按时间轮转）
+            retention_days: 日志保留天数（0表示不清理）
+            compress_rotated: 是否gzip压缩轮转后的日志
+            recent_size: 内存中保留的最近日志条数（总体和每种事件类型各自保留）
+            level: 日志级别（DEBUG/INFO/WARNING/ERROR），低于此级别的日志不记录
+            event_levels: 事件类型 -> 级别，覆盖DEFAULT_EVENT_LEVELS
+            console_rate: 控制台输出速率限制（行/秒，0表示不限速，None表示不输出到控制台）
+            syslog_address: syslog/journald套接字路径（None表示不发送）
+            sinks: 其他日志输出（log_sinks.LogSink实例列表）
+            repeat_window: 重复日志合并窗口（秒，0表示不合并）
+            flight_recorder_slots: 飞行记录器保留的记录条数（0表示不启用）
+            index_logs: 是否为轮转后的日志建立索引（供log_query.py查询）
+        """
+        if structured_format not in (None, 'jsonl', 'binary'):
+            raise ValueError(f"不支持的结构化日志格式: {structured_format}")
+        
         self.log_dir = log_dir
+        self.filename_format = filename_format
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
         self.log_file = None
+        self.structured_file = None
+        self.structured_format = structured_format
         self.log_queue = Queue()
         self.log_thread = None
         self.running = False
+        self.fsync_interval = fsync_interval
+        
+        # 常开的日志文件句柄（仅写入线程使用）
+        self._file = None
+        self._structured = None
+        self._last_fsync = 0.0
+        self._dirty = False
+        self._opened_at = 0.0
+        
+        # 持有当前日志文件锁的句柄（文件轮转或停止后释放）
+        self._locks = []
+        
+        # 最近日志的环形缓冲（写入线程追加，其他线程读取）
+        self.recent_size = recent_size
+        self._recent = deque(maxlen=recent_size)
+        self._recent_by_type = {}
+        self._recent_lock = threading.Lock()
+        
+        # 日志级别
+        self.level = _level_value(level)
+        self._event_levels = {}
+        for event_type, event_level in dict(DEFAULT_EVENT_LEVELS, **(event_levels or {})).items():
+            self._event_levels[event_type] = _level_value(event_level)
+        
+        # 时间戳格式化缓存（写入线程使用，同一秒内复用）
+        self._cached_second = None
+        self._cached_timestamp = ''
+        
+        # 重复日志合并状态（写入线程使用）：当前检测的重复、暂存的指令、上一条写入的条目
+        self.repeat_window = repeat_window
+        self._run = None
+        self._held = None
+        self._previous = None
+        
+        # 日志输出（写入线程提交，各自的线程输出）
+        self.sinks = []
+        if console_rate is not None:
+            self.sinks.append(ConsoleSink(rate=console_rate))
+        if syslog_address:
+            self.sinks.append(SyslogSink(syslog_address))
+        self.sinks.extend(sinks or [])
         
         # 创建日志目录
         self._create_log_dir()
         
+        # 飞行记录器（保留上次运行的记录文件）
+        self.flight_recorder = None
+        if flight_recorder_slots:
+            self.flight_recorder = FlightRecorder(os.path.join(log_dir, 'flight_recorder.bin'),
+                                                  flight_recorder_slots)
+        
         # 创建日志文件
         self._create_log_file()
         
+        # 日志归档（文件名中的时间格式替换为通配符）
+        file_pattern = os.path.splitext(re.sub(r'%[a-zA-Z]', '*', filename_format))[0]
+        index = LogIndex(log_dir, file_pattern) if index_logs else None
+        self.archiver = LogArchiver(log_dir, file_pattern + '.*', retention_days, compress_rotated, index)
+        self.archiver.submit(self.archiver.find_unarchived(exclude=(self.log_file, self.structured_file)))
+        
         # 启动日志写入线程
         self.start_logging_thread()
         
+        if self.flight_recorder and self.flight_recorder.previous_crashed:
+            self.log("错误", "上次运行未正常退出，飞行记录已保存到: %s", self.flight_recorder.previous_path)
+        if self.flight_recorder and self.flight_recorder.shared:
+            self.log("系统", "飞行记录文件正被其他进程使用，改为写入: %s", self.flight_recorder.path)
+        
     def _create_log_dir(self):
         """创建日志目录"""
         if not os.path.exists(self.log_dir):
@@ -36,17 +420,39 @@ class SystemLogger:
             
     def _create_log_file(self):
         """创建日志文件"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = os.path.join(self.log_dir, f"pharmacy_robot_{timestamp}.log")
-        
-        # 写入日志文件头
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write(f"智慧药房机器人系统日志\n")
-            f.write(f"启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"{'='*50}\n")
+        base, extension = os.path.splitext(datetime.now().strftime(self.filename_format))
+        
+        # 同一秒内轮转时文件名加序号（已压缩的同名文件也要避开）
+        name, index = base, 1
+        while glob.glob(os.path.join(glob.escape(self.log_dir), glob.escape(name) + '.*')):
+            name = f"{base}_{index}"
+            index += 1
+        self.log_file = os.path.join(self.log_dir, name + extension)
+        
+        # 先加锁再写入文件头（其他进程的归档线程不会处理加锁的文件和空文件）
+        self._release_locks()
+        f = lock_log_file(open(self.log_file, 'w', encoding='utf-8'))
+        self._locks.append(f)
+        f.write(f"智慧药房机器人系统日志\n")
+        f.write(f"启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"{'='*50}\n")
+        f.flush()
+        
+        if self.structured_format:
+            self.structured_file = os.path.splitext(self.log_file)[0] + STRUCTURED_EXTENSIONS[self.structured_format]
+            self._locks.append(lock_log_file(open(self.structured_file, 'ab')))
+            
+    def _release_locks(self):
+        """释放日志文件锁"""
+        for handle in self._locks:
+            handle.close()
+        self._locks = []
             
     def start_logging_thread(self):
         """启动日志写入线程"""
+        self.archiver.start()
+        for sink in self.sinks:
+            sink.start()
         self.running = True
         self.log_thread = threading.Thread(target=self._logging_loop)
         self.log_thread.daemon = True
@@ -57,46 +463,348 @@ class SystemLogger:
         if not self.running:
             self.start_logging_thread()
         
+    def _open_file(self):
+        """打开（或重新打开）日志文件句柄"""
+        self._close_file()
+        self._file = open(self.log_file, 'a', encoding='utf-8', buffering=64 * 1024)
+        
+        if self.structured_format == 'jsonl':
+            self._structured = open(self.structured_file, 'a', encoding='utf-8', buffering=64 * 1024)
+        elif self.structured_format == 'binary':
+            self._structured = open(self.structured_file, 'ab', buffering=64 * 1024)
+            if self._structured.tell() == 0:
+                self._structured.write(BINARY_MAGIC)
+        self._opened_at = time.monotonic()
+        
+    def _should_rotate(self):
+        """当前日志文件是否需要轮转"""
+        if self.rotate_interval and time.monotonic() - self._opened_at >= self.rotate_interval:
+            return True
+        return bool(self.max_bytes) and os.fstat(self._file.fileno()).st_size >= self.max_bytes
+        
+    def _rotate(self):
+        """轮转到新的日志文件，旧文件交给归档线程压缩"""
+        rotated = (self.log_file, self.structured_file)
+        self._close_file()
+        self._release_locks()
+        self._create_log_file()
+        self._open_file()
+        self.archiver.submit(rotated)
+        
+    def _close_file(self):
+        """落盘并关闭日志文件句柄"""
+        if self._file is None:
+            return
+        try:
+            self._sync()
+        except Exception as e:
+            print(f"关闭日志文件失败: {str(e)}")
+        finally:
+            for handle in (self._file, self._structured):
+                if handle is not None:
+                    handle.close()
+            self._file = None
+            self._structured = None
+        
+    def _sync(self):
+        """将已写入的日志fsync到磁盘"""
+        for handle in (self._file, self._structured):
+            if handle is not None:
+                handle.flush()
+                os.fsync(handle.fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        
+    def _drain_queue(self, first):
+        """取出队列中所有待写的条目
+        
+        Returns:
+            tuple: (日志条目列表, 刷新完成事件列表, 是否收到停止标记)
+        """
+        entries, waiters, stop = [], [], False
+        item = first
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                entries.append(item)
+            try:
+                item = self.log_queue.get_nowait()
+            except Empty:
+                return entries, waiters, stop
+        
     def _logging_loop(self):
-        """日志写入循环"""
-        while self.running:
+        """日志写入循环：阻塞等待日志，每次批量写入所有待写条目"""
+        try:
+            self._open_file()
+        except Exception as e:
+            print(f"打开日志文件失败: {str(e)}")
+        
+        while True:
+            try:
+                first = self.log_queue.get(timeout=self._next_timeout())
+            except Empty:
+                # 定期fsync或重复日志窗口到期
+                self._write_batch([], flush=False)
+                continue
+            
+            entries, waiters, stop = self._drain_queue(first)
+            self._write_batch(entries, flush=bool(waiters or stop))
+            
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                break
+        
+        self._close_file()
+        
+    def _next_timeout(self):
+        """队列等待超时：下一次定期fsync或重复日志窗口到期的时间"""
+        deadlines = []
+        if self._dirty:
+            deadlines.append(self._last_fsync + self.fsync_interval)
+        if self._run is not None:
+            deadlines.append(self._run['start'] + self.repeat_window)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+        
+    def _write_batch(self, entries, flush):
+        """合并重复日志后写入，需要时落盘
+        
+        Args:
+            entries: 日志条目列表
+            flush: 是否写入所有重复日志汇总并立即落盘（flush_logs()和停止时）
+        """
+        try:
+            entries = self._collapse_repeats(entries, flush)
+            if entries:
+                self._write_log_entries(entries)
+            if self._file is not None and (flush or (self._dirty and self._should_sync(entries))):
+                self._sync()
+        except Exception as e:
+            print(f"日志写入异常: {str(e)}")
+            # 不立即重试落盘；文件句柄可能已失效，重新打开后继续
+            self._dirty = False
             try:
-                if not self.log_queue.empty():
-                    log_entry = self.log_queue.get()
-                    self._write_log_entry(log_entry)
-                    
-                # 避免CPU占用过高
-                import time
-                time.sleep(0.01)
-                
+                self._open_file()
             except Exception as e:
-                print(f"日志写入异常: {str(e)}")
-                
-    def _write_log_entry(self, log_entry):
-        """写入日志条目"""
+                print(f"重新打开日志文件失败: {str(e)}")
+        
+    def _collapse_repeats(self, entries, flush=False):
+        """合并连续重复的日志
+        
+        连续相同的日志（同一事件类型和消息）、连续相同的指令-响应对（UART接收后紧跟
+        UART发送）只写入第一条（对）；之后的重复在出现不同的日志、窗口到期或flush时
+        写入汇总，汇总写在下一条不同的日志之前。UART接收/UART发送不单独合并，
+        文字日志仍是完整的指令-响应记录。
+        
+        Returns:
+            list: 需要写入的条目（含汇总，消息已格式化）
+        """
+        if not self.repeat_window:
+            return entries
+        
+        output = []
+        if self._run is not None and time.monotonic() - self._run['start'] >= self.repeat_window:
+            output.extend(self._end_run())
+        for entry in entries:
+            entry = (entry[0], entry[1], entry[2], self._render_message(entry), (), entry[5])
+            if self._run is not None:
+                if entry[1] - self._run['start'] < self.repeat_window and self._continue_run(entry):
+                    continue
+                output.extend(self._end_run())
+            output.append(entry)
+            self._start_run(entry)
+        
+        if flush:
+            output.extend(self._end_run())
+        return output
+        
+    def _start_run(self, entry):
+        """已写入的条目开始新的重复检测（UART发送与其前的UART接收组成指令-响应对）"""
+        previous, self._previous = self._previous, entry
+        if entry[2] == 'UART发送':
+            if previous is None or previous[2] != 'UART接收':
+                return
+            run_entries = [previous, entry]
+        elif entry[2] == 'UART接收':
+            # 等待响应，与响应一起组成指令-响应对
+            return
+        else:
+            run_entries = [entry]
+        self._run = {'entries': run_entries, 'last': run_entries, 'start': run_entries[0][1],
+                     'count': 0, 'latencies': []}
+        
+    def _continue_run(self, entry):
+        """条目是否为当前重复的延续（指令-响应对的指令先暂存，收到相同的响应后才计为重复）"""
+        run = self._run
+        first = run['entries']
+        if len(first) == 1 or self._held is None:
+            if (entry[2], entry[3]) != (first[0][2], first[0][3]):
+                return False
+            if len(first) == 2:
+                self._held = entry
+                return True
+            run['last'] = [entry]
+        else:
+            if (entry[2], entry[3]) != (first[1][2], first[1][3]):
+                return False
+            run['last'] = [self._held, entry]
+            self._held = None
+            if entry[5].get('latency') is not None:
+                run['latencies'].append(entry[5]['latency'])
+        run['count'] += 1
+        return True
+        
+    def _end_run(self):
+        """结束当前的重复检测，返回汇总条目和暂存的指令"""
+        run, held = self._run, self._held
+        self._run = self._held = None
+        output = []
+        if run is not None and run['count']:
+            output = [self._repeat_summary(first, last, run) for first, last in zip(run['entries'], run['last'])]
+        if held is not None:
+            # 暂存的指令之后的响应不同，照常写入
+            output.append(held)
+            self._previous = held
+        return output
+        
+    def _repeat_summary(self, first, last, run):
+        """生成重复日志汇总条目
+        
+        时间戳为末次重复的时间；结构化记录保留原条目的字段，msg为原消息，
+        指令-响应对的响应汇总中latency为重复的响应的平均耗时，并记录最小、最大耗时。
+        """
+        count = run['count']
+        first_time = datetime.fromtimestamp(first[0]).strftime('%H:%M:%S.%f')[:-3]
+        last_time = datetime.fromtimestamp(last[0]).strftime('%H:%M:%S.%f')[:-3]
+        summary = f"{first[3]} （又重复{count}次，{first_time} ~ {last_time}）"
+        fields = dict(first[5], msg=first[3], repeat=count, first_ts=first[0], last_ts=last[0])
+        latencies = run['latencies']
+        if first[2] == 'UART发送' and latencies:
+            fields.update(latency=sum(latencies) / len(latencies),
+                          latency_min=min(latencies), latency_max=max(latencies))
+        return (last[0], last[1], first[2], summary, (), fields)
+        
+    def _should_sync(self, entries):
+        """是否需要fsync：到达间隔，或本批包含错误日志"""
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            return True
+        return any(entry[2] == '错误' for entry in entries)
+        
+    def _format_timestamp(self, wall_time):
+        """格式化时间戳（按秒缓存）"""
+        second = int(wall_time)
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_timestamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self._cached_timestamp
+        
+    def _render_message(self, entry):
+        """格式化日志消息（message % args）"""
+        message, args = entry[3], entry[4]
+        if not args:
+            return str(message)
         try:
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(log_entry + '\n')
-                f.flush()
-                
-            # 同时输出到控制台
-            print(log_entry)
-            
+            return message % args
+        except (TypeError, ValueError):
+            return ' '.join([str(message)] + [str(arg) for arg in args])
+        
+    def _write_log_entries(self, entries):
+        """批量写入日志条目（文字日志和结构化日志各一次write）"""
+        if self._file is None:
+            self._open_file()
+        elif self._should_rotate():
+            self._rotate()
+        
+        messages = [self._render_message(entry) for entry in entries]
+        formatted = [f"[{self._format_timestamp(entry[0])}] [{entry[2]}] {message}"
+                     for entry, message in zip(entries, messages)]
+        # 先编码结构化记录，编码失败不会让已写入文字日志的一批日志丢失其余输出
+        records = None
+        if self._structured is not None:
+            records = [self._encode_structured({'ts': entry[0], 'mono': entry[1], 'type': entry[2],
+                                                'msg': message, **entry[5]})
+                       for entry, message in zip(entries, messages)]
+        
+        lines = '\n'.join(formatted)
+        self._file.write(lines + '\n')
+        self._file.flush()
+        
+        if records is not None:
+            self._structured.write(''.join(records) if self.structured_format == 'jsonl' else b''.join(records))
+            self._structured.flush()
+        self._dirty = True
+        
+        with self._recent_lock:
+            for entry, line in zip(entries, formatted):
+                self._recent.append(line)
+                by_type = self._recent_by_type.get(entry[2])
+                if by_type is None:
+                    by_type = self._recent_by_type[entry[2]] = deque(maxlen=self.recent_size)
+                by_type.append(line)
+        
+        # 分发给各个输出（控制台等）
+        if self.sinks:
+            sink_entries = [(entry[2], line) for entry, line in zip(entries, formatted)]
+            for sink in self.sinks:
+                sink.submit(sink_entries)
+        
+    def _encode_structured(self, record):
+        """编码一条结构化记录；附加字段无法编码时只保留基本字段"""
+        encode = encode_json_record if self.structured_format == 'jsonl' else encode_binary_record
+        try:
+            return encode(record)
         except Exception as e:
-            print(f"写入日志文件失败: {str(e)}")
-            
-    def log(self, event_type, message):
+            print(f"结构化日志编码失败: {str(e)}")
+            return encode({'ts': record['ts'], 'mono': record['mono'], 'type': str(record['type']),
+                           'msg': str(record['msg'])})
+        
+    def add_sink(self, sink):
+        """运行时添加日志输出（如界面使用的MemorySink）"""
+        if self.running:
+            sink.start()
+        self.sinks.append(sink)
+        
+    def is_enabled(self, event_type):
+        """该事件类型的日志是否会被记录（可用于跳过准备日志数据的开销）"""
+        return self._event_levels.get(event_type, _INFO) >= self.level
+        
+    def set_level(self, level, event_type=None):
+        """运行时调整日志级别
+        
+        Args:
+            level: 级别名称
+            event_type: 指定时调整该事件类型的级别，否则调整总级别
+        """
+        if event_type is None:
+            self.level = _level_value(level)
+        else:
+            self._event_levels[event_type] = _level_value(level)
+        
+    def log(self, event_type, message, *args, **fields):
         """记录日志
         
         Args:
             event_type: 事件类型（如"系统", "UART接收", "UART发送", "识别", "语音", "错误"等）
-            message: 日志消息
+            message: 日志消息，有args时为%格式字符串（在写入线程中格式化）
+            *args: 消息参数
+            **fields: 结构化日志的附加字段（如command、latency、window、sample）
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{event_type}] {message}"
-        
-        # 添加到日志队列
-        self.log_queue.put(log_entry)
+        if self._event_levels.get(event_type, _INFO) < self.level:
+            return
+        wall_time, mono_time = time.time(), time.monotonic()
+        if self.flight_recorder is not None:
+            self.flight_recorder.record(event_type, message, args, wall_time, mono_time)
+        self.log_queue.put((wall_time, mono_time, event_type, message, args, fields))
+        
+    def log_debug(self, message, *args, **fields):
+        """记录调试日志（默认级别为DEBUG，未启用时几乎没有开销）"""
+        if self._event_levels.get("调试", _INFO) >= self.level:
+            self.log("调试", message, *args, **fields)
         
     def log_system(self, message):
         """记录系统日志"""
@@ -104,11 +812,16 @@ class SystemLogger:
         
     def log_uart_receive(self, command):
         """记录UART接收日志"""
-        self.log("UART接收", command)
+        self.log("UART接收", command, command=command)
+        
+    def log_uart_send(self, response, latency=None):
+        """记录UART发送日志
         
-    def log_uart_send(self, response):
-        """记录UART发送日志"""
-        self.log("UART发送", response)
+        Args:
+            response: 响应内容
+            latency: 从收到指令到响应发出的耗时（秒）
+        """
+        self.log("UART发送", response, response=response, latency=latency)
         
     def log_recognition(self, result):
         """记录识别结果日志"""
@@ -116,7 +829,7 @@ class SystemLogger:
         
     def log_voice(self, text):
         """记录语音播报日志"""
-        self.log("语音", text)
+        self.log("语音", text, text=text)
         
     def log_error(self, error_message):
         """记录错误日志"""
@@ -129,8 +842,7 @@ class SystemLogger:
             position: 位置（如"左上区域"）
             content: 二维码内容
         """
-        message = f"{position}: {content}"
-        self.log("识别", message)
+        self.log("识别", "%s: %s", position, content, position=position, content=content)
         
     def log_ocr_recognition(self, window_num, text, status):
         """记录OCR识别日志
@@ -141,8 +853,8 @@ class SystemLogger:
             status: 窗口状态
         """
         status_text = "空闲" if status else "无空闲"
-        message = f"窗口{window_num}: {text} -> {status_text}"
-        self.log("识别", message)
+        self.log("识别", "窗口%s: %s -> %s", window_num, text, status_text,
+                 window=window_num, text=text, available=bool(status))
         
     def log_sample_collection(self, window, sample_type, count):
         """记录样本采集日志
@@ -152,8 +864,8 @@ class SystemLogger:
             sample_type: 样本类型
             count: 样本数量
         """
-        message = f"{window}窗口采集{sample_type}，数量: {count}"
-        self.log("采样", message)
+        self.log("采样", "%s窗口采集%s，数量: %s", window, sample_type, count,
+                 window=window, sample=sample_type, count=count)
         
     def log_delivery(self, window_num, window_name, action):
         """记录配送日志
@@ -163,8 +875,8 @@ class SystemLogger:
             window_name: 窗口名称
             action: 动作（停留/通过）
         """
-        message = f"{window_num}号{window_name}: {action}"
-        self.log("配送", message)
+        self.log("配送", "%s号%s: %s", window_num, window_name, action,
+                 window=window_num, window_name=window_name, action=action)
         
     def log_task_start(self):
         """记录任务开始日志"""
@@ -181,8 +893,7 @@ class SystemLogger:
             error_type: 错误类型
             details: 错误详情
         """
-        message = f"通信错误 - {error_type}: {details}"
-        self.log_error(message)
+        self.log("错误", "通信错误 - %s: %s", error_type, details, error_type=error_type)
         
     def log_recognition_error(self, recognition_type, details):
         """记录识别错误日志
@@ -191,28 +902,39 @@ class SystemLogger:
             recognition_type: 识别类型（二维码/OCR）
             details: 错误详情
         """
-        message = f"{recognition_type}识别失败: {details}"
-        self.log_error(message)
+        self.log("错误", "%s识别失败: %s", recognition_type, details, recognition_type=recognition_type)
+        
+    def flush_logs(self, timeout=5.0):
+        """强制刷新日志：等待此前记录的日志全部写入并落盘
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            bool: 是否在超时前完成
+        """
+        if not (self.log_thread and self.log_thread.is_alive()):
+            return False
+        done = threading.Event()
+        self.log_queue.put(done)
+        return done.wait(timeout)
         
-    def flush_logs(self):
-        """强制刷新日志"""
-        # 等待队列中的日志写入完成
-        import time
-        while not self.log_queue.empty():
-            time.sleep(0.01)
-            
     def stop(self):
         """停止日志记录"""
         # 记录系统停止日志
         self.log_system("系统停止")
         
-        # 等待日志写入完成
-        self.flush_logs()
-        
-        # 停止日志线程
+        # 停止日志线程（写入线程写完队列中的日志、落盘后退出）
         self.running = False
         if self.log_thread and self.log_thread.is_alive():
-            self.log_thread.join(timeout=1)
+            self.log_queue.put(_STOP)
+            self.log_thread.join(timeout=5)
+        self._release_locks()
+        self.archiver.stop()
+        for sink in self.sinks:
+            sink.stop()
+        if self.flight_recorder is not None:
+            self.flight_recorder.close()
             
         print(f"日志已保存到: {self.log_file}")
         
@@ -220,20 +942,29 @@ class SystemLogger:
         """获取日志文件路径"""
         return self.log_file
         
-    def get_recent_logs(self, lines=50):
+    def get_recent_logs(self, lines=50, event_type=None):
         """获取最近的日志
         
+        优先从内存环形缓冲返回；缓冲中的条数不够（已被覆盖）时从日志文件末尾反向读取。
+        
         Args:
             lines: 返回的行数
+            event_type: 只返回该事件类型的日志（如"错误"、"UART接收"）
             
         Returns:
-            list: 最近的日志行
+            list: 最近的日志行（按时间顺序，含换行符）
         """
+        with self._recent_lock:
+            source = self._recent if event_type is None else self._recent_by_type.get(event_type, ())
+            recent = list(islice(reversed(source), lines))
+            evicted = len(source) >= self.recent_size
+        
+        if len(recent) >= lines or not evicted:
+            return [line + '\n' for line in reversed(recent)]
+        
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                return all_lines[-lines:] if len(all_lines) > lines else all_lines
-                
+            return tail_log_file(self.log_file, lines, event_type)
+        
         except Exception as e:
             print(f"读取日志文件失败: {str(e)}")
-            return []
\ No newline at end of file
+            return [line + '\n' for line in reversed(recent)]
\ No newline at end of file
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+带序列号的串口协议扩展（指令流水线）
+指令和响应前加序列号，下位机可以不等响应连续发送多条指令：
+    下位机: #17 check board 2
+    上位机: #17 ok
+响应可以乱序返回，由序列号对应到指令。
+- 重复帧（下位机未收到响应而重发）：直接重发缓存的响应，不重复执行指令
+- 丢失帧（序列号跳跃）：向下位机发送 "#<序号> resend" 请求重传
+- 序列号重新开始：清空跟踪状态。以下情况视为重新开始：
+  串口重连、不带序列号的start、新的（非重发的）带序列号start、
+  远早于期望值（超出缓存范围）的序列号、缓存中已有但指令内容不同的序列号
+  下位机重启后若以与缓存中完全相同的序列号和指令开始，无法与重发区分，
+  会收到缓存的响应；因此重启后应先发送start（不带序列号，或使用缓存中没有的序列号）
+不带序列号的指令仍按原来的一问一答方式处理
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+# 序列号格式：#<数字><空白><内容>
+SEQUENCE_PATTERN = re.compile(r'^#(\d+)\s+(.*)$')
+
+# 序列号取值范围（超过后回绕到0）
+SEQUENCE_MODULUS = 65536
+
+# 请求重传的响应内容
+RESEND_REQUEST = 'resend'
+
+def parse_sequenced(line):
+    """解析带序列号的帧
+    
+    Args:
+        line: 接收到的一行文本
+        
+    Returns:
+        tuple: (序列号, 内容)，不带序列号时序列号为None
+    """
+    match = SEQUENCE_PATTERN.match(line.strip())
+    if not match:
+        return None, line.strip()
+    return int(match.group(1)) % SEQUENCE_MODULUS, match.group(2).strip()
+
+def format_sequenced(seq, body):
+    """构建带序列号的帧
+    
+    Args:
+        seq: 序列号
+        body: 内容
+    """
+    return f"#{seq} {body}"
+
+class SequenceTracker:
+    """序列号跟踪器
+    
+    记录已收到的序列号和最近的响应，用于检测丢失/重复帧和重传响应。
+    """
+    
+    # register()的返回状态
+    NEW = 'new'
+    DUPLICATE_PENDING = 'duplicate_pending'
+    DUPLICATE_ANSWERED = 'duplicate_answered'
+    
+    def __init__(self, cache_size=64, max_resend_requests=8):
+        """初始化跟踪器
+        
+        Args:
+            cache_size: 缓存的最近响应数量（即可重传的范围）
+            max_resend_requests: 一次序列号跳跃最多请求重传的帧数
+        """
+        self.cache_size = cache_size
+        self.max_resend_requests = max_resend_requests
+        
+        self._lock = threading.Lock()
+        self._expected = None
+        # 序列号 -> [指令, 响应]（响应为None表示正在处理）
+        self._replies = OrderedDict()
+        
+        # 统计信息
+        self.lost_count = 0
+        self.duplicate_count = 0
+        
+    def register(self, seq, command=None):
+        """登记收到的序列号
+        
+        Args:
+            seq: 序列号
+            command: 指令内容（用于区分重发帧和重新开始的序列号，为None时不比较）
+            
+        Returns:
+            tuple: (状态, 缺失的序列号列表)
+        """
+        with self._lock:
+            if seq in self._replies:
+                cached_command, reply = self._replies[seq]
+                if command is None or cached_command is None or cached_command == command:
+                    self.duplicate_count += 1
+                    if reply is None:
+                        return self.DUPLICATE_PENDING, []
+                    return self.DUPLICATE_ANSWERED, []
+                # 同一序列号、不同指令：不是重发，下位机的序列号已重新开始
+                self._replies.clear()
+                self._expected = None
+                
+            missing = []
+            if self._expected is not None:
+                gap = (seq - self._expected) % SEQUENCE_MODULUS
+                if gap >= SEQUENCE_MODULUS // 2:
+                    if SEQUENCE_MODULUS - gap <= self.cache_size:
+                        # 比期望值稍早的序列号：迟到的重传帧，按新指令处理但不移动期望值
+                        self._remember(seq, command)
+                        return self.NEW, []
+                    # 远早于期望值（超出可重传范围）：下位机的序列号已重新开始
+                    self._replies.clear()
+                    gap = 0
+                for offset in range(min(gap, self.max_resend_requests)):
+                    missing.append((self._expected + offset) % SEQUENCE_MODULUS)
+                self.lost_count += gap
+                
+            self._expected = (seq + 1) % SEQUENCE_MODULUS
+            self._remember(seq, command)
+            return self.NEW, missing
+            
+    def restart(self, seq, command=None):
+        """从seq重新开始跟踪（新任务的start），之前的序列号和缓存的响应作废"""
+        with self._lock:
+            self._replies.clear()
+            self._expected = (seq + 1) % SEQUENCE_MODULUS
+            self._remember(seq, command)
+            
+    def _remember(self, seq, command=None):
+        """记录正在处理的序列号（调用方持有锁）"""
+        self._replies[seq] = [command, None]
+        while len(self._replies) > self.cache_size:
+            self._replies.popitem(last=False)
+            
+    def record_reply(self, seq, reply):
+        """记录序列号对应的响应，用于之后重传"""
+        with self._lock:
+            if seq in self._replies:
+                self._replies[seq][1] = reply
+                
+    def cached_reply(self, seq):
+        """获取缓存的响应（不存在或仍在处理时返回None）"""
+        with self._lock:
+            entry = self._replies.get(seq)
+            return entry[1] if entry else None
+            
+    def reset(self):
+        """重置跟踪状态（如下位机重启）"""
+        with self._lock:
+            self._expected = None
+            self._replies.clear()
@@ -4,24 +4,222 @@
 串口通信模块
 实现UART串口通信功能
 波特率：115200
-数据格式：ASCII文本
+数据格式：ASCII文本（可协商切换为带CRC的二进制帧，见binary_protocol）
 """
 
+import glob
+import os
+import select
 import serial
+import sys
 import time
 import threading
-from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue, Empty, Full
 
+from modules.binary_protocol import (
+    BinaryFramer, decode_command, encode_frame, encode_response, OP_NAK
+)
+
+class LineFramer:
+    """行分帧器
+    
+    将串口读到的字节追加到持久的bytearray缓冲中，切分出其中所有完整的行。
+    一次读取中的半行会保留到下次数据到达，一次读取中的多行会全部切出；
+    每行记录其到达（即行结束符被读到）时的单调时钟时间戳。
+    """
+    
+    def __init__(self, max_line_length=4096):
+        self.buffer = bytearray()
+        self.max_line_length = max_line_length
+        
+    def feed(self, chunk, timestamp=None):
+        """追加数据并切分完整行
+        
+        Args:
+            chunk: 新读到的字节
+            timestamp: 到达时间（time.monotonic()，默认取当前时间）
+            
+        Returns:
+            list: [(行文本, 到达时间), ...]，已去除空行和首尾空白
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+            
+        buffer = self.buffer
+        buffer.extend(chunk)
+        
+        lines = []
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end].decode('utf-8', errors='replace').strip()
+            if line:
+                lines.append((line, timestamp))
+            start = end + 1
+            
+        # 一次性移除已切分的数据，避免逐行搬移缓冲区
+        if start:
+            del buffer[:start]
+            
+        # 丢弃超长且无行结束符的数据（线路噪声等）
+        if len(buffer) > self.max_line_length:
+            buffer.clear()
+            
+        return lines
+        
+    def reset(self):
+        """清空缓冲区"""
+        self.buffer.clear()
+        
+# serial_struct.flags中的ASYNC_LOW_LATENCY标志
+ASYNC_LOW_LATENCY = 0x2000
+
+def read_low_latency_flag(serial_conn):
+    """读取串口当前的ASYNC_LOW_LATENCY标志
+    
+    Returns:
+        bool: 是否已设置（不支持的设备或非Linux系统返回None）
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import array
+        import fcntl
+        import termios
+        buf = array.array('i', [0] * 32)
+        fcntl.ioctl(serial_conn.fileno(), termios.TIOCGSERIAL, buf)
+        return bool(buf[4] & ASYNC_LOW_LATENCY)
+    except Exception:
+        return None
+        
+def configure_low_latency(serial_conn, enable=True):
+    """为串口启用（或关闭）Linux低延迟模式
+    
+    USB转串口芯片（如FTDI）默认最多缓冲16ms才上报数据，每条指令的响应时间
+    都会因此增加。这里通过TIOCSSERIAL设置ASYNC_LOW_LATENCY标志（FTDI驱动会将
+    latency_timer降为1ms），并将termios设为VMIN=1、VTIME=0，使读取在
+    收到任意字节后立即返回，不等待字节间定时器。
+    
+    该标志保存在设备上，关闭串口后仍然有效；返回值中记录设置前的原始值，
+    关闭串口前用restore_low_latency恢复。
+    不支持的设备（如伪终端、非Linux系统）会跳过对应设置，不影响正常通信。
+    
+    Args:
+        serial_conn: 已打开的serial.Serial对象
+        enable: False时清除低延迟标志（用于测量驱动默认设置下的延迟）
+        
+    Returns:
+        dict: {'async_low_latency': 是否已设置低延迟标志,
+               'termios': 是否已调整VMIN/VTIME,
+               'latency_timer': 驱动的latency_timer（毫秒，无法读取时为None）,
+               'original': 设置前的低延迟标志（无法读取时为None）}
+    """
+    result = {'async_low_latency': False, 'termios': False, 'latency_timer': None, 'original': None}
+    if not sys.platform.startswith('linux'):
+        return result
+        
+    result['original'] = read_low_latency_flag(serial_conn)
+    try:
+        serial_conn.set_low_latency_mode(enable)
+        result['async_low_latency'] = enable
+    except (AttributeError, ValueError, OSError):
+        pass
+    if not enable:
+        return result
+        
+    try:
+        import termios
+        fd = serial_conn.fileno()
+        attrs = termios.tcgetattr(fd)
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        result['termios'] = True
+    except Exception:
+        pass
+        
+    # USB转串口驱动在sysfs中公开实际的缓冲延迟
+    device = os.path.basename(os.path.realpath(serial_conn.port))
+    try:
+        with open(f"/sys/bus/usb-serial/devices/{device}/latency_timer") as f:
+            result['latency_timer'] = int(f.read().strip())
+    except (OSError, ValueError):
+        pass
+        
+    return result
+    
+def restore_low_latency(serial_conn, status):
+    """恢复configure_low_latency之前的低延迟标志（关闭串口前调用）
+    
+    Args:
+        serial_conn: 已打开的serial.Serial对象
+        status: configure_low_latency的返回值
+    """
+    if not status or status.get('original') is None or not serial_conn.is_open:
+        return
+    if status['original'] == status['async_low_latency']:
+        return
+    try:
+        serial_conn.set_low_latency_mode(status['original'])
+    except (AttributeError, ValueError, OSError):
+        pass
+        
+def read_serial_chunk(serial_conn, timeout=0.5):
+    """阻塞等待串口数据到达，并读取当前可读的全部字节
+    
+    POSIX系统上通过select等待串口文件描述符可读，无数据时线程完全休眠；
+    其他平台退化为带超时的阻塞read。
+    
+    Args:
+        serial_conn: serial.Serial对象
+        timeout: 最长等待时间（秒），用于让调用方定期检查退出标志
+        
+    Returns:
+        bytes: 读到的数据（超时返回空字节串）
+    """
+    if os.name == 'posix' and hasattr(serial_conn, 'fileno'):
+        readable, _, _ = select.select([serial_conn.fileno()], [], [], timeout)
+        if not readable:
+            return b''
+        return serial_conn.read(serial_conn.in_waiting or 1)
+        
+    first = serial_conn.read(1)
+    if not first:
+        return b''
+    return first + serial_conn.read(serial_conn.in_waiting)
+    
 class SerialCommunication:
     """串口通信类"""
     
-    def __init__(self, port='/dev/ttyUSB0', baudrate=115200, timeout=1):
+    def __init__(self, port='/dev/ttyUSB0', baudrate=115200, timeout=1,
+                 send_queue_size=64, coalesce_writes=True,
+                 auto_reconnect=True, reconnect_max_delay=10.0, low_latency=False):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
         self.serial_conn = None
         self.connected = False
         
+        # Linux低延迟模式（打开和重连串口时设置，见configure_low_latency）
+        self.low_latency = low_latency
+        self.low_latency_status = None
+        
+        # 断线重连：由监督线程按指数退避重新打开串口，发送队列中的数据保留到重连后发送
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_initial_delay = 0.5
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_count = 0
+        self.supervisor_thread = None
+        self._connected_event = threading.Event()
+        self._lost_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._state_lock = threading.Lock()
+        # 连接状态变化回调，接收一个参数（是否已连接）
+        self.connection_callback = None
+        
         # 接收数据队列
         self.receive_queue = Queue()
         self.receive_thread = None
@@ -30,11 +228,77 @@ class SerialCommunication:
         # 重试机制
         self.max_retries = 3
         
+        # 发送队列：(数据, Future)，由独立的写线程发送，调用方不会被慢速串口阻塞
+        self.send_queue = Queue(maxsize=send_queue_size)
+        self.send_thread = None
+        # 是否将排队中的多条数据合并为一次write（行协议下各行可直接拼接）
+        self.coalesce_writes = coalesce_writes
+        self.max_write_size = 4096
+        
         # 数据回调函数
         self.data_callback = None
+        self.callback_with_timestamp = False
+        
+        # 接收分帧器与最近一行的到达时间（time.monotonic()）
+        self.framer = LineFramer()
+        self.last_receive_time = None
+        
+        # 协议模式：'ascii'（文本行）或 'binary'（二进制帧）
+        self.protocol_mode = 'ascii'
+        self.binary_framer = BinaryFramer()
+        self.crc_error_count = 0
+        # 分帧器和协议模式的锁：协议切换可能来自其他线程（如流水线工作线程），
+        # 不能在接收线程分帧的同时清空缓冲区
+        self._framer_lock = threading.Lock()
+        
+    def connect(self, start_receiver=True, wait_for_port=False):
+        """连接串口
         
-    def connect(self):
-        """连接串口"""
+        Args:
+            start_receiver: 是否启动内置接收线程。由外部I/O线程（如会话管理器）
+                统一收取数据时设为False，并调用read_available()
+            wait_for_port: 串口暂时无法打开时仍启动收发线程，由重连监督线程继续尝试
+                （需启用auto_reconnect），打开后调用连接状态回调
+                
+        Returns:
+            bool: 串口是否已打开
+        """
+        opened = self._open_port()
+        if not opened and not (wait_for_port and self.auto_reconnect):
+            return False
+            
+        self.running = True
+        self._stop_event.clear()
+        
+        # 启动发送线程
+        self.send_thread = threading.Thread(target=self._send_loop)
+        self.send_thread.daemon = True
+        self.send_thread.start()
+        
+        # 启动接收线程
+        if start_receiver:
+            self.receive_thread = threading.Thread(target=self._receive_loop)
+            self.receive_thread.daemon = True
+            self.receive_thread.start()
+            
+        # 启动重连监督线程
+        if self.auto_reconnect:
+            self.supervisor_thread = threading.Thread(target=self._supervise_loop)
+            self.supervisor_thread.daemon = True
+            self.supervisor_thread.start()
+            
+        if not opened:
+            # 首次打开失败，与断线后相同，由监督线程按指数退避重试
+            print(f"串口暂时无法打开，等待重连: {self.port}")
+            self._lost_event.set()
+        return opened
+        
+    def _open_port(self, verbose=True):
+        """打开串口
+        
+        Args:
+            verbose: 是否打印失败信息（重连时由监督线程统一提示）
+        """
         try:
             self.serial_conn = serial.Serial(
                 port=self.port,
@@ -46,66 +310,317 @@ class SerialCommunication:
             )
             
             if self.serial_conn.is_open:
+                if self.low_latency:
+                    self._apply_low_latency()
+                with self._framer_lock:
+                    self.framer.reset()
+                    self.binary_framer.reset()
                 self.connected = True
-                self.running = True
-                
-                # 启动接收线程
-                self.receive_thread = threading.Thread(target=self._receive_loop)
-                self.receive_thread.daemon = True
-                self.receive_thread.start()
-                
+                self._connected_event.set()
                 print(f"串口连接成功: {self.port}")
                 return True
             else:
-                print(f"串口连接失败: {self.port}")
+                if verbose:
+                    print(f"串口连接失败: {self.port}")
                 return False
                 
         except Exception as e:
-            print(f"串口连接异常: {str(e)}")
+            if verbose:
+                print(f"串口连接异常: {str(e)}")
             return False
             
     def disconnect(self):
         """断开串口连接"""
         self.running = False
         self.connected = False
+        self._stop_event.set()
+        self._connected_event.clear()
         
-        if self.receive_thread and self.receive_thread.is_alive():
-            self.receive_thread.join(timeout=1)
+        for thread in (self.receive_thread, self.send_thread, self.supervisor_thread):
+            if thread and thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=1)
+        self._fail_pending_sends()
             
         if self.serial_conn and self.serial_conn.is_open:
+            restore_low_latency(self.serial_conn, self.low_latency_status)
             self.serial_conn.close()
             print("串口连接已断开")
             
-    def _receive_loop(self):
-        """接收数据循环"""
-        while self.running and self.connected:
+    def _apply_low_latency(self):
+        """设置低延迟模式并打印结果"""
+        previous = self.low_latency_status
+        self.low_latency_status = configure_low_latency(self.serial_conn)
+        if previous is not None and previous['original'] is not None:
+            # 重连时设备上可能仍是本进程设置的标志，保留首次打开前的原始值
+            self.low_latency_status['original'] = previous['original']
+        if self.low_latency_status['async_low_latency']:
+            timer = self.low_latency_status['latency_timer']
+            detail = f"，latency_timer={timer}ms" if timer is not None else ""
+            print(f"串口低延迟模式已启用: {self.port}{detail}")
+        else:
+            print(f"串口不支持低延迟标志，使用默认设置: {self.port}")
+            
+    def handle_connection_lost(self, error):
+        """标记串口连接已断开（如USB转串口适配器复位或被拔出）
+        
+        启用自动重连时由监督线程负责重连，否则停止收发。
+        重复调用是安全的。
+        
+        Args:
+            error: 断开原因
+        """
+        with self._state_lock:
+            if not self.connected:
+                return
+            self.connected = False
+            self._connected_event.clear()
+            
+        print(f"串口连接断开: {self.port} ({error})")
+        try:
+            self.serial_conn.close()
+        except Exception:
+            pass
+            
+        if self.connection_callback:
             try:
-                if self.serial_conn.in_waiting > 0:
-                    data = self.serial_conn.readline().decode('utf-8').strip()
-                    if data:
-                        self.receive_queue.put(data)
-                        # 如果设置了回调函数，调用它
-                        if self.data_callback:
-                            try:
-                                self.data_callback(data)
-                            except Exception as e:
-                                print(f"数据回调异常: {str(e)}")
-                        
-                time.sleep(0.01)  # 避免CPU占用过高
+                self.connection_callback(False)
+            except Exception as e:
+                print(f"连接状态回调异常: {str(e)}")
+                
+        if self.auto_reconnect and self.running:
+            self._lost_event.set()
+        else:
+            self.running = False
+            
+    def _supervise_loop(self):
+        """重连监督循环：连接断开后按指数退避重新打开串口"""
+        while self.running:
+            if not self._lost_event.wait(timeout=0.5):
+                continue
                 
+            delay = self.reconnect_initial_delay
+            attempt = 0
+            while self.running and not self.connected:
+                attempt += 1
+                if self._open_port(verbose=False):
+                    self.reconnect_count += 1
+                    print(f"串口重连成功: {self.port}（第{attempt}次尝试）")
+                    if self.connection_callback:
+                        try:
+                            self.connection_callback(True)
+                        except Exception as e:
+                            print(f"连接状态回调异常: {str(e)}")
+                    break
+                    
+                print(f"串口重连失败，{delay:.1f}秒后重试: {self.port}")
+                if self._stop_event.wait(delay):
+                    break
+                delay = min(delay * 2, self.reconnect_max_delay)
+                
+            self._lost_event.clear()
+            
+    def _receive_loop(self):
+        """接收数据循环（等待数据到达时休眠，不轮询）"""
+        while self.running:
+            if not self.connected:
+                # 等待监督线程重连
+                self._connected_event.wait(timeout=0.5)
+                continue
+                
+            try:
+                chunk = read_serial_chunk(self.serial_conn, timeout=0.5)
+                if chunk:
+                    self._feed(chunk)
+                    
             except Exception as e:
+                if not self.running:
+                    break
                 print(f"接收数据异常: {str(e)}")
-                break
+                self.handle_connection_lost(e)
+                
+    def fileno(self):
+        """获取串口文件描述符（用于selectors等I/O多路复用）"""
+        return self.serial_conn.fileno()
+        
+    def read_available(self):
+        """读取当前可读的数据并分发其中的完整行
+        
+        供外部I/O线程在串口可读时调用，不会阻塞等待行结束；
+        不完整的行保留在缓冲区中，等待下次数据到达。
+        
+        Returns:
+            int: 本次分发的行数
+        """
+        chunk = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+        if not chunk:
+            return 0
+            
+        return self._feed(chunk)
+        
+    def _feed(self, chunk):
+        """分帧并分发接收到的数据
+        
+        Returns:
+            int: 分发的行数
+        """
+        # 分帧在锁内进行，分发（回调中可能切换协议）在锁外进行
+        with self._framer_lock:
+            if self.protocol_mode == 'binary':
+                lines = self._feed_binary(chunk)
+            else:
+                lines = self.framer.feed(chunk)
+                
+        for data, timestamp in lines:
+            self._dispatch_line(data, timestamp)
+        return len(lines)
+        
+    def _feed_binary(self, chunk):
+        """二进制模式下分帧，指令帧转换为文本指令
+        
+        Returns:
+            list: [(文本指令, 到达时间), ...]
+        """
+        timestamp = time.monotonic()
+        frames, errors = self.binary_framer.feed(chunk)
+        
+        if errors:
+            # 损坏的帧直接请求重发，不交给上层按未知指令处理
+            self.crc_error_count += errors
+            print(f"二进制帧校验失败 {errors} 次，请求重发")
+            self._enqueue_send(encode_frame(OP_NAK))
+            
+        return [(decode_command(opcode, payload), timestamp) for opcode, payload in frames]
+        
+    def set_protocol_mode(self, mode):
+        """切换协议模式
+        
+        切换前已排队的数据仍按原模式编码发送。
+        
+        Args:
+            mode: 'ascii' 或 'binary'
+        """
+        if mode not in ('ascii', 'binary'):
+            raise ValueError(f"未知协议模式: {mode}")
+            
+        with self._framer_lock:
+            self.framer.reset()
+            self.binary_framer.reset()
+            self.protocol_mode = mode
+        
+    def _dispatch_line(self, data, timestamp=None):
+        """将一行接收数据放入队列并调用回调"""
+        if not data:
+            return
+            
+        self.last_receive_time = timestamp
+        self.receive_queue.put(data)
+        # 如果设置了回调函数，调用它
+        if self.data_callback:
+            try:
+                if self.callback_with_timestamp:
+                    self.data_callback(data, timestamp)
+                else:
+                    self.data_callback(data)
+            except Exception as e:
+                print(f"数据回调异常: {str(e)}")
                 
     def send_command(self, command):
-        """发送指令"""
-        if not self.connected or not self.serial_conn:
-            return False
+        """发送指令（非阻塞）
+        
+        指令放入发送队列后立即返回，由发送线程写入串口。
+        
+        Returns:
+            bool: 是否成功加入发送队列
+        """
+        future = self.send_command_async(command)
+        return not (future.done() and not future.result())
+        
+    def send_command_async(self, command):
+        """发送指令并返回表示发送完成的Future
+        
+        Args:
+            command: 指令字符串（ASCII模式下自动添加换行符，二进制模式下编码为响应帧）
             
+        Returns:
+            Future: 写入串口后结果为True，失败（未连接、队列已满、重试耗尽）为False
+        """
+        if self.protocol_mode == 'binary':
+            data = encode_response(command)
+        else:
+            data = (command + '\n').encode('utf-8')
+        return self._enqueue_send(data, command)
+        
+    def send_frame_async(self, opcode, payload=b''):
+        """发送二进制帧（用于紧凑编码的响应）
+        
+        Returns:
+            Future: 同send_command_async
+        """
+        return self._enqueue_send(encode_frame(opcode, payload), f"frame 0x{opcode:02x}")
+        
+    def _enqueue_send(self, data, description=None):
+        """将待发送数据放入发送队列
+        
+        Args:
+            data: 已编码的字节
+            description: 队列满时用于提示的描述
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        
+        # 重连期间仍接受数据，连接恢复后发送
+        if not self.running or not self.serial_conn:
+            future.set_result(False)
+            return future
+            
+        try:
+            self.send_queue.put_nowait((data, future))
+        except Full:
+            print(f"发送队列已满，丢弃指令: {description or data!r}")
+            future.set_result(False)
+            
+        return future
+        
+    def _send_loop(self):
+        """发送循环：取出排队数据，合并后一次写入"""
+        while self.running:
+            if not self.connected:
+                # 断线期间数据保留在队列中
+                self._connected_event.wait(timeout=0.5)
+                continue
+                
+            try:
+                item = self.send_queue.get(timeout=0.5)
+            except Empty:
+                continue
+                
+            batch = [item]
+            size = len(item[0])
+            if self.coalesce_writes:
+                while size < self.max_write_size:
+                    try:
+                        item = self.send_queue.get_nowait()
+                    except Empty:
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+                    
+            data = b''.join(data for data, _ in batch)
+            success = self._write_with_retry(data)
+            while not success and self.auto_reconnect and self.running:
+                # 写入失败视为断线，重连后重发同一批数据
+                self.handle_connection_lost("写入失败")
+                if self._connected_event.wait(timeout=0.5):
+                    success = self._write_with_retry(data)
+                    
+            for _, future in batch:
+                future.set_result(success)
+                
+    def _write_with_retry(self, data):
+        """写入串口（失败时重试，仅在发送线程中调用）"""
         for retry in range(self.max_retries):
             try:
-                # 发送指令（添加换行符）
-                self.serial_conn.write((command + '\n').encode('utf-8'))
+                self.serial_conn.write(data)
                 self.serial_conn.flush()
                 return True
                 
@@ -116,6 +631,15 @@ class SerialCommunication:
                     
         return False
         
+    def _fail_pending_sends(self):
+        """将尚未发送的数据标记为失败"""
+        while True:
+            try:
+                _, future = self.send_queue.get_nowait()
+            except Empty:
+                break
+            future.set_result(False)
+            
     def read_command(self):
         """读取接收到的指令"""
         if not self.receive_queue.empty():
@@ -130,6 +654,9 @@ class SerialCommunication:
         """清空接收缓冲区"""
         while not self.receive_queue.empty():
             self.receive_queue.get()
+        with self._framer_lock:
+            self.framer.reset()
+            self.binary_framer.reset()
             
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.reset_input_buffer()
@@ -139,10 +666,84 @@ class SerialCommunication:
         """检查连接状态"""
         return self.connected and self.serial_conn and self.serial_conn.is_open
         
-    def set_data_callback(self, callback):
+    def set_data_callback(self, callback, with_timestamp=False):
         """设置数据回调函数
         
         Args:
             callback: 回调函数，接收一个参数（接收到的数据）
+            with_timestamp: 为True时回调额外接收该行的到达时间（time.monotonic()）
         """
-        self.data_callback = callback
\ No newline at end of file
+        self.data_callback = callback
+        self.callback_with_timestamp = with_timestamp
+        
+    def set_connection_callback(self, callback):
+        """设置连接状态变化回调函数
+        
+        Args:
+            callback: 回调函数，接收一个参数（True为已重连，False为已断开）
+        """
+        self.connection_callback = callback
+        
+def probe_port(port, baudrate=115200, request='ping', expected='pong', timeout=1.0):
+    """打开串口并握手，确认对端是机器人下位机
+    
+    Args:
+        port: 串口设备路径
+        baudrate: 波特率
+        request: 握手请求
+        expected: 期望的应答
+        timeout: 等待应答的时间（秒）
+        
+    Returns:
+        float: 握手往返时间（秒），失败返回None
+    """
+    try:
+        with serial.Serial(port=port, baudrate=baudrate, timeout=0) as conn:
+            conn.reset_input_buffer()
+            start_time = time.monotonic()
+            conn.write((request + '\n').encode('utf-8'))
+            conn.flush()
+            
+            framer = LineFramer()
+            while True:
+                remaining = timeout - (time.monotonic() - start_time)
+                if remaining <= 0:
+                    return None
+                chunk = read_serial_chunk(conn, timeout=remaining)
+                for line, arrival in framer.feed(chunk) if chunk else []:
+                    if line == expected:
+                        return arrival - start_time
+                        
+    except Exception:
+        return None
+        
+def discover_ports(candidates=None, patterns=('/dev/ttyUSB*', '/dev/ttyACM*'),
+                   baudrate=115200, request='ping', expected='pong', timeout=1.0):
+    """并行探测候选串口，找出握手成功的机器人串口
+    
+    所有候选串口同时握手，总耗时约为一次握手超时，而不是逐个尝试。
+    
+    Args:
+        candidates: 候选串口列表（为None时按patterns匹配设备文件）
+        patterns: 候选设备文件的glob模式
+        baudrate: 波特率
+        request: 握手请求
+        expected: 期望的应答
+        timeout: 单个串口的握手超时（秒）
+        
+    Returns:
+        list: 握手成功的串口，按响应速度排序
+    """
+    if candidates is None:
+        candidates = sorted(path for pattern in patterns for path in glob.glob(pattern))
+    if not candidates:
+        return []
+        
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        rtts = list(executor.map(
+            lambda port: probe_port(port, baudrate, request, expected, timeout),
+            candidates
+        ))
+        
+    found = [(rtt, port) for port, rtt in zip(candidates, rtts) if rtt is not None]
+    return [port for _, port in sorted(found)]
\ No newline at end of file
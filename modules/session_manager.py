@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多机器人会话管理模块
+在一个上位机进程中同时服务多个串口/任务控制器对：
+- 每个会话拥有独立的串口、日志和任务状态（qr_results/window_status互不影响）
+- 所有会话共享一个图像识别工作池，按会话轮询公平调度
+- 所有串口由单个基于selectors的I/O线程统一收取数据
+"""
+
+import os
+import selectors
+import threading
+import time
+from collections import deque
+
+from modules.serial_comm import SerialCommunication
+from modules.image_recognition import ImageRecognition
+from modules.voice_player import VoicePlayer
+from modules.logger import SystemLogger
+from modules.task_controller import TaskController
+
+class VisionWorkerPool:
+    """共享图像识别工作池
+    
+    每个会话有自己的任务队列，同一会话的任务严格按顺序逐个执行
+    （串口协议为一问一答，任务状态也不是线程安全的），
+    不同会话之间按轮询方式分配工作线程，避免某个机器人的
+    二维码/OCR识别长时间占满所有线程。
+    """
+    
+    def __init__(self, worker_count=2):
+        self.worker_count = max(1, worker_count)
+        self.workers = []
+        self.running = False
+        
+        self._condition = threading.Condition()
+        self._session_queues = {}
+        # 有待处理任务且当前没有任务在执行的会话（轮询顺序）
+        self._ready_sessions = deque()
+        self._busy_sessions = set()
+        
+    def start(self):
+        """启动工作线程"""
+        if self.running:
+            return
+            
+        self.running = True
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"vision-worker-{i}")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+            
+    def stop(self):
+        """停止工作线程（未执行的任务将被丢弃）"""
+        with self._condition:
+            self.running = False
+            self._session_queues.clear()
+            self._ready_sessions.clear()
+            self._condition.notify_all()
+            
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.join(timeout=1)
+        self.workers = []
+        
+    def submit(self, session_name, func, *args):
+        """提交会话任务
+        
+        Args:
+            session_name: 会话名称
+            func: 要执行的函数
+            *args: 函数参数
+        """
+        with self._condition:
+            if not self.running:
+                return
+                
+            session_queue = self._session_queues.setdefault(session_name, deque())
+            session_queue.append((func, args))
+            
+            if session_name not in self._busy_sessions and session_name not in self._ready_sessions:
+                self._ready_sessions.append(session_name)
+                self._condition.notify()
+                
+    def pending_count(self, session_name=None):
+        """获取待处理任务数量
+        
+        Args:
+            session_name: 会话名称（None表示所有会话）
+        """
+        with self._condition:
+            if session_name is not None:
+                return len(self._session_queues.get(session_name, ()))
+            return sum(len(q) for q in self._session_queues.values())
+            
+    def _next_task(self):
+        """按轮询顺序取出下一个任务（无任务时阻塞）"""
+        with self._condition:
+            while self.running and not self._ready_sessions:
+                self._condition.wait()
+                
+            if not self.running:
+                return None
+                
+            session_name = self._ready_sessions.popleft()
+            func, args = self._session_queues[session_name].popleft()
+            self._busy_sessions.add(session_name)
+            return session_name, func, args
+            
+    def _task_done(self, session_name):
+        """任务完成后，将仍有任务的会话放回轮询队尾"""
+        with self._condition:
+            self._busy_sessions.discard(session_name)
+            if self._session_queues.get(session_name):
+                self._ready_sessions.append(session_name)
+                self._condition.notify()
+                
+    def _worker_loop(self):
+        """工作线程循环"""
+        while self.running:
+            task = self._next_task()
+            if task is None:
+                break
+                
+            session_name, func, args = task
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"会话{session_name}任务执行异常: {str(e)}")
+            finally:
+                self._task_done(session_name)
+
+class RobotSession:
+    """单个机器人会话：一个串口和一个任务控制器"""
+    
+    def __init__(self, name, port, voice_player, baudrate=115200, timeout=1,
+                 camera_device_id=0, log_dir="logs", low_latency=False, log_options=None,
+                 telemetry=None):
+        """初始化会话
+        
+        Args:
+            name: 会话名称（用于日志目录和状态显示）
+            port: 串口设备路径
+            voice_player: 共享的语音播报器
+            baudrate: 波特率
+            timeout: 串口超时时间（秒）
+            camera_device_id: 该机器人使用的摄像头设备ID
+            log_dir: 日志根目录（会话日志写入其下的同名子目录）
+            low_latency: 是否启用串口低延迟模式
+            log_options: SystemLogger的其他参数，见Config.get_logger_options()
+            telemetry: 共享的遥测数据存储（TelemetryStore，记录时附带会话名称）
+        """
+        self.name = name
+        self.port = port
+        
+        self.logger = SystemLogger(log_dir=os.path.join(log_dir, name), **(log_options or {}))
+        self.serial_comm = SerialCommunication(port=port, baudrate=baudrate, timeout=timeout,
+                                               low_latency=low_latency)
+        session_telemetry = telemetry.session(name) if telemetry else None
+        self.image_recognition = ImageRecognition(self.logger, camera_device_id=camera_device_id,
+                                                  telemetry=session_telemetry)
+        self.task_controller = TaskController(
+            self.logger,
+            self.serial_comm,
+            self.image_recognition,
+            voice_player,
+            telemetry=session_telemetry
+        )
+        
+    def start(self):
+        """连接串口并启动任务控制器（由会话管理器统一收取数据）
+        
+        串口暂时无法打开时会话仍然启动，由串口的重连监督线程继续尝试，
+        打开后通过连接状态回调加入I/O监听。
+        
+        Returns:
+            bool: 串口是否已打开
+        """
+        self.logger.start()
+        self.logger.log_system(f"会话{self.name}启动，串口: {self.port}")
+        
+        connected = self.serial_comm.connect(start_receiver=False, wait_for_port=True)
+        if not connected:
+            self.logger.log_error(f"会话{self.name}串口连接失败，等待重连: {self.port}")
+            
+        self.task_controller.start()
+        return connected
+        
+    def stop(self):
+        """停止会话"""
+        self.task_controller.stop()
+        self.serial_comm.disconnect()
+        self.image_recognition.stop()
+        self.logger.log_system(f"会话{self.name}停止")
+        self.logger.stop()
+        
+    def get_status(self):
+        """获取会话状态"""
+        return {
+            'name': self.name,
+            'port': self.port,
+            'serial_connected': bool(self.serial_comm.is_connected()),
+            'task_status': self.task_controller.get_current_status(),
+            'log_file': self.logger.get_log_file_path()
+        }
+
+class SessionManager:
+    """多机器人会话管理器"""
+    
+    def __init__(self, session_configs, vision_workers=2, log_dir="logs", log_options=None,
+                 telemetry=None):
+        """初始化会话管理器
+        
+        Args:
+            session_configs: 会话配置列表，见Config.get_session_configs()
+            vision_workers: 共享图像识别工作线程数
+            log_dir: 日志根目录
+            log_options: SystemLogger的其他参数，见Config.get_logger_options()
+            telemetry: 遥测数据存储（TelemetryStore，所有会话共用，None表示不记录）
+        """
+        self.running = False
+        self.telemetry = telemetry
+        
+        # 系统级日志（语音播报等共享资源的日志）
+        self.logger = SystemLogger(log_dir=log_dir, **(log_options or {}))
+        
+        # 共享资源
+        self.voice_player = VoicePlayer(self.logger)
+        self.worker_pool = VisionWorkerPool(vision_workers)
+        
+        self.sessions = {}
+        for session_config in session_configs:
+            session = RobotSession(
+                name=session_config['name'],
+                port=session_config['port'],
+                voice_player=self.voice_player,
+                baudrate=session_config['baudrate'],
+                timeout=session_config['timeout'],
+                camera_device_id=session_config['camera_device_id'],
+                log_dir=log_dir,
+                log_options=log_options,
+                telemetry=telemetry,
+                low_latency=session_config.get('low_latency', False)
+            )
+            if session.name in self.sessions:
+                raise ValueError(f"会话名称重复: {session.name}")
+            self.sessions[session.name] = session
+            
+        self.selector = None
+        self.selector_lock = threading.Lock()
+        self.io_thread = None
+        
+    def start(self):
+        """启动所有会话和共享I/O线程"""
+        self.running = True
+        self.logger.start()
+        self.logger.log_system(f"会话管理器启动，会话数: {len(self.sessions)}")
+        
+        self.voice_player.start()
+        self.worker_pool.start()
+        if self.telemetry:
+            self.telemetry.start()
+        self.selector = selectors.DefaultSelector()
+        
+        for session in self.sessions.values():
+            # 先设置回调：首次连接失败的会话由重连监督线程打开后通过回调加入监听
+            session.serial_comm.set_data_callback(self._make_dispatcher(session), with_timestamp=True)
+            session.serial_comm.set_connection_callback(self._make_connection_handler(session))
+            if session.start():
+                self._watch_session(session)
+            
+        self.io_thread = threading.Thread(target=self._io_loop, name="session-io")
+        self.io_thread.daemon = True
+        self.io_thread.start()
+        
+        print(f"会话管理器启动成功，在线会话: {self.get_connected_count()}/{len(self.sessions)}")
+        
+    def stop(self):
+        """停止所有会话"""
+        self.running = False
+        
+        if self.io_thread and self.io_thread.is_alive():
+            self.io_thread.join(timeout=1)
+            
+        self.worker_pool.stop()
+        
+        for session in self.sessions.values():
+            session.stop()
+            
+        with self.selector_lock:
+            if self.selector:
+                self.selector.close()
+                self.selector = None
+            
+        self.voice_player.stop()
+        if self.telemetry:
+            self.telemetry.stop()
+        self.logger.log_system("会话管理器停止")
+        self.logger.stop()
+        
+    def _make_dispatcher(self, session):
+        """创建会话的数据回调：将指令交给共享工作池处理"""
+        def dispatch(data, received_at):
+            command = data.strip()
+            if command and self.running:
+                self.worker_pool.submit(session.name, session.task_controller.handle_command,
+                                        command, received_at)
+        return dispatch
+        
+    def _make_connection_handler(self, session):
+        """创建会话的连接状态回调：断开时停止监听，重连后重新监听新的串口"""
+        def on_connection_changed(connected):
+            session.task_controller.handle_connection_change(connected)
+            if connected:
+                session.logger.log_system(f"会话{session.name}串口已重连: {session.port}")
+                self._watch_session(session)
+            else:
+                session.logger.log_error(f"会话{session.name}串口断开，等待重连: {session.port}")
+                self._unwatch_session(session)
+        return on_connection_changed
+        
+    def _watch_session(self, session):
+        """将会话串口加入I/O监听（已在监听时改为监听当前的串口）"""
+        with self.selector_lock:
+            if not self.selector:
+                return
+            for key in list(self.selector.get_map().values()):
+                if key.data is session:
+                    self.selector.unregister(key.fd)
+            try:
+                self.selector.register(session.serial_comm.fileno(), selectors.EVENT_READ, session)
+            except (ValueError, OSError, KeyError) as e:
+                session.logger.log_error(f"会话{session.name}串口无法加入I/O监听: {str(e)}")
+                
+    def _unwatch_session(self, session):
+        """将会话串口移出I/O监听"""
+        with self.selector_lock:
+            if not self.selector:
+                return
+            for key in list(self.selector.get_map().values()):
+                if key.data is session:
+                    self.selector.unregister(key.fd)
+                    
+    def _repair_selector(self):
+        """I/O等待异常后修复监听：移除失效的文件描述符，已连接但未监听的会话重新加入"""
+        with self.selector_lock:
+            if not self.selector:
+                return
+            watched = []
+            for key in list(self.selector.get_map().values()):
+                session = key.data
+                try:
+                    os.fstat(key.fd)
+                    valid = session.serial_comm.is_connected() and session.serial_comm.fileno() == key.fd
+                except Exception:
+                    valid = False
+                if valid:
+                    watched.append(session)
+                else:
+                    self.selector.unregister(key.fd)
+                    
+        for session in self.sessions.values():
+            if not any(session is other for other in watched) and session.serial_comm.is_connected():
+                self._watch_session(session)
+                
+    def _io_loop(self):
+        """共享I/O循环：等待任一串口可读后读取并分发
+        
+        只在管理器停止时退出；等待出错时修复监听后继续，不影响其他会话。
+        """
+        while self.running:
+            try:
+                if not self.selector.get_map():
+                    # 所有会话都已断开，等待重连
+                    time.sleep(0.5)
+                    continue
+                events = self.selector.select(timeout=0.5)
+            except Exception as e:
+                if not self.running:
+                    break
+                error_msg = f"会话I/O等待异常: {str(e)}"
+                print(error_msg)
+                self.logger.log_error(error_msg)
+                try:
+                    self._repair_selector()
+                except Exception as e:
+                    print(f"修复会话I/O监听失败: {str(e)}")
+                time.sleep(0.1)
+                continue
+                
+            for key, _ in events:
+                session = key.data
+                try:
+                    session.serial_comm.read_available()
+                except Exception as e:
+                    # 串口异常（如设备被拔出），停止监听该会话并交给重连监督线程
+                    error_msg = f"会话{session.name}接收数据异常: {str(e)}"
+                    print(error_msg)
+                    session.logger.log_error(error_msg)
+                    self._unwatch_session(session)
+                    session.serial_comm.handle_connection_lost(e)
+                    
+    def get_connected_count(self):
+        """获取已连接的会话数量"""
+        return sum(1 for session in self.sessions.values() if session.serial_comm.is_connected())
+        
+    def get_system_status(self):
+        """获取所有会话状态
+        
+        Returns:
+            dict: 会话名称 -> 会话状态
+        """
+        return {
+            'running': self.running,
+            'pending_tasks': self.worker_pool.pending_count(),
+            'sessions': {name: session.get_status() for name, session in self.sessions.items()}
+        }
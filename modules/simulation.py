@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+硬件模拟模块
+在没有机器人实物的Linux/macOS机器上运行完整系统：
+- VirtualMCU: 基于伪终端(pty)的虚拟下位机，通过真实串口协议发送指令并接收响应
+- SimulatedCamera: 代替摄像头提供生成的（或录制的）板1二维码图像和板2窗口状态图像
+- NullVoicePlayer: 不发声的语音播报器，可选按播报时长模拟耗时
+- 场景脚本: 预定义的指令序列，按板面内容推算期望响应并统计往返延迟
+"""
+
+import json
+import os
+import pty
+import select
+import threading
+import time
+import tty
+from queue import Queue, Empty
+
+import cv2
+
+from modules.binary_protocol import QR_POSITIONS
+from modules.board_generator import render_board1, render_board2
+from modules.frame_source import FrameSource
+from modules.serial_comm import LineFramer
+from modules.voice_player import VoicePlayer
+
+# 各二维码位置对应的样本类型（位置顺序即窗口编号1-4，与ImageRecognition一致）
+POSITION_SAMPLES = ('静脉血样本', '唾液样本', '组织样本', '血浆样本')
+
+# ==================== 预定义场景 ====================
+# board1: 二维码位置 -> 内容；board2: 窗口编号 -> 是否空闲
+# commands: 依次发送的指令，期望响应按板面内容推算（见expected_reply）
+STANDARD_COMMANDS = [
+    'start', 'check board 1', 'check A', 'check B', 'check C',
+    'check board 2', 'check 1', 'check 2', 'check 3', 'check 4', 'over'
+]
+
+SCENARIOS = {
+    'standard': {
+        'description': '完整任务流程，所有窗口空闲',
+        'board1': {'top_left': 'AB', 'top_right': 'BC', 'bottom_left': 'C'},
+        'board2': {1: True, 2: True, 3: True, 4: True},
+        'commands': STANDARD_COMMANDS
+    },
+    'window_busy': {
+        'description': '需要前往的2号窗口无空闲，check board 2应返回wait',
+        'board1': {'top_left': 'A', 'top_right': 'ABC', 'bottom_right': 'B'},
+        'board2': {1: True, 2: False, 3: True, 4: True},
+        'commands': STANDARD_COMMANDS
+    },
+    'no_qr': {
+        'description': '板1上没有二维码',
+        'board1': {},
+        'board2': {1: True, 2: True, 3: True, 4: True},
+        'commands': STANDARD_COMMANDS
+    },
+    'ping': {
+        'description': '链路往返延迟测量（不涉及图像识别）',
+        'board1': {},
+        'board2': {},
+        'commands': ['ping'],
+        'repeat': 100
+    }
+}
+
+def load_scenario(name):
+    """加载场景
+    
+    Args:
+        name: 预定义场景名称，或JSON场景文件路径
+    
+    Returns:
+        dict: 场景定义
+    """
+    if name in SCENARIOS:
+        return dict(SCENARIOS[name], name=name)
+    
+    if not os.path.exists(name):
+        raise ValueError(f"未知场景: {name}（可用: {', '.join(SCENARIOS)}）")
+    
+    with open(name, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    
+    # JSON的键只能是字符串，窗口编号转换回整数
+    scenario['board2'] = {int(num): bool(available)
+                          for num, available in scenario.get('board2', {}).items()}
+    scenario.setdefault('board1', {})
+    scenario.setdefault('name', os.path.splitext(os.path.basename(name))[0])
+    return scenario
+
+def expected_reply(command, board1, board2):
+    """按板面内容推算指令的期望响应（与TaskController的处理逻辑一致）
+    
+    Args:
+        command: 指令
+        board1: 二维码位置 -> 内容
+        board2: 窗口编号 -> 是否空闲
+    
+    Returns:
+        str: 期望响应，无法推算的指令（如批量指令）返回None
+    """
+    if command in ('start', 'over'):
+        return 'ok'
+    if command == 'ping':
+        return 'pong'
+    
+    if command == 'check board 1':
+        parts = [f"{position}:{board1[position]}" for position in QR_POSITIONS if position in board1]
+        return ','.join(parts) if parts else 'no_qr_found'
+    
+    if command in ('check A', 'check B', 'check C'):
+        window = command[-1]
+        samples = [POSITION_SAMPLES[index] for index, position in enumerate(QR_POSITIONS)
+                   if window in board1.get(position, '').upper()]
+        return f"collected:{','.join(samples)}" if samples else 'no_sample'
+    
+    if command == 'check board 2':
+        needed = [index + 1 for index, position in enumerate(QR_POSITIONS) if position in board1]
+        busy = [num for num in needed if not board2.get(num, True)]
+        return 'wait' if busy else 'ok'
+    
+    if command in ('check 1', 'check 2', 'check 3', 'check 4'):
+        content = board1.get(QR_POSITIONS[int(command[-1]) - 1], '')
+        sample_count = sum(1 for char in content.upper() if char in 'ABC')
+        return 'wait' if sample_count else 'ok'
+    
+    return None
+
+class SimulatedCamera(FrameSource):
+    """模拟摄像头：按识别的板号提供板面图像"""
+    
+    def __init__(self, board1=None, board2=None, board1_image=None, board2_image=None,
+                 width=640, height=480):
+        """初始化模拟摄像头
+        
+        Args:
+            board1: 板1二维码内容（位置 -> 内容）
+            board2: 板2窗口状态（窗口编号 -> 是否空闲）
+            board1_image: 录制的板1图像路径（优先于生成的图像）
+            board2_image: 录制的板2图像路径（优先于生成的图像）
+            width: 生成图像的宽度
+            height: 生成图像的高度
+        """
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.recorded = {1: board1_image, 2: board2_image}
+        self.frames = {}
+        self.current_board = 1
+        self.set_boards(board1 or {}, board2 or {})
+        
+    def set_boards(self, board1, board2):
+        """更换板面内容（图像在此处生成一次，读取时直接返回）"""
+        self.board1 = board1
+        self.board2 = board2
+        self.frames = {}
+        
+        for board, path in self.recorded.items():
+            if path:
+                self.frames[board] = cv2.imread(path)
+                if self.frames[board] is None:
+                    raise ValueError(f"无法读取板{board}图像: {path}")
+        
+        if 1 not in self.frames:
+            self.frames[1] = render_board1(board1, self.width, self.height)
+        if 2 not in self.frames:
+            self.frames[2] = render_board2(board2, self.width, self.height)
+        
+    def _grab(self):
+        return self.frames[self.current_board], f"board{self.current_board}"
+        
+    def read_frame(self, board=None):
+        """读取一帧
+        
+        Args:
+            board: 要识别的板号（1或2），未指定时返回板1
+        
+        Returns:
+            numpy.ndarray: BGR图像
+        """
+        self.current_board = board if board in self.frames else 1
+        return super().read_frame(board)
+
+class NullVoicePlayer(VoicePlayer):
+    """模拟语音播报器：不调用TTS，只记录播报内容"""
+    
+    def __init__(self, logger=None, simulate_timing=False, chars_per_second=4.0):
+        """初始化模拟语音播报器
+        
+        Args:
+            logger: 日志记录器
+            simulate_timing: 是否按文字长度模拟播报耗时（用于测试播报队列积压）
+            chars_per_second: 模拟的播报语速（字/秒）
+        """
+        self.simulate_timing = simulate_timing
+        self.chars_per_second = chars_per_second
+        self.spoken = []
+        super().__init__(logger)
+        
+    def _init_tts_engine(self):
+        """不初始化TTS引擎"""
+        self.tts_engine = None
+        print("语音播报使用模拟模式（不发声）")
+        
+    def _speak_text(self, text):
+        """模拟播报文字"""
+        if self.simulate_timing:
+            time.sleep(len(text) / self.chars_per_second)
+        
+        self.spoken.append(text)
+        print(f"语音播报(模拟): {text}")
+        
+        if self.logger:
+            self.logger.log_voice(text)
+
+class VirtualMCU:
+    """虚拟下位机
+    
+    创建一对伪终端，系统连接从端（port），虚拟下位机在主端收发数据，
+    与真实串口走完全相同的代码路径。
+    """
+    
+    def __init__(self):
+        self.master_fd, self.slave_fd = pty.openpty()
+        # 从端设为原始模式，避免系统打开串口前回显或转换换行符
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        
+        self.framer = LineFramer()
+        # 收到的响应：(行文本, 到达时间)
+        self.replies = Queue()
+        self.running = False
+        self.reader_thread = None
+        
+    def start(self):
+        """启动响应接收线程"""
+        self.running = True
+        self.reader_thread = threading.Thread(target=self._read_loop)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+        print(f"虚拟下位机已启动: {self.port}")
+        
+    def close(self):
+        """关闭虚拟下位机"""
+        self.running = False
+        if self.reader_thread and self.reader_thread.is_alive():
+            self.reader_thread.join(timeout=1)
+        
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        
+    def _read_loop(self):
+        """接收系统发出的响应"""
+        while self.running:
+            readable, _, _ = select.select([self.master_fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self.master_fd, 4096)
+            except OSError:
+                break
+            for line, timestamp in self.framer.feed(chunk):
+                self.replies.put((line, timestamp))
+        
+    def send(self, command):
+        """发送一条指令
+        
+        Returns:
+            float: 发送时间（time.monotonic()）
+        """
+        sent_at = time.monotonic()
+        os.write(self.master_fd, (command + '\n').encode('utf-8'))
+        return sent_at
+        
+    def request(self, command, timeout=10.0):
+        """发送指令并等待响应
+        
+        Returns:
+            tuple: (响应, 往返时间秒)，超时返回(None, None)
+        """
+        # 丢弃之前未取走的响应
+        while not self.replies.empty():
+            self.replies.get_nowait()
+        
+        sent_at = self.send(command)
+        try:
+            reply, received_at = self.replies.get(timeout=timeout)
+        except Empty:
+            return None, None
+        return reply, received_at - sent_at
+        
+    def run_scenario(self, scenario, camera=None, repeat=None, timeout=10.0):
+        """运行场景脚本
+        
+        Args:
+            scenario: 场景定义（见SCENARIOS/load_scenario）
+            camera: SimulatedCamera对象（运行前切换为场景的板面内容）
+            repeat: 重复次数（默认取场景中的repeat，缺省为1）
+            timeout: 单条指令等待响应的超时（秒）
+        
+        Returns:
+            dict: 运行报告
+        """
+        board1 = scenario.get('board1', {})
+        board2 = scenario.get('board2', {})
+        if camera is not None:
+            camera.set_boards(board1, board2)
+        
+        repeat = repeat or scenario.get('repeat', 1)
+        delay = scenario.get('delay', 0)
+        steps = []
+        start_time = time.monotonic()
+        
+        for _ in range(repeat):
+            for command in scenario['commands']:
+                expected = expected_reply(command, board1, board2)
+                reply, rtt = self.request(command, timeout)
+                steps.append({
+                    'command': command,
+                    'reply': reply,
+                    'expected': expected,
+                    'rtt': rtt,
+                    'passed': reply is not None and (expected is None or reply == expected)
+                })
+                if delay:
+                    time.sleep(delay)
+        
+        elapsed = time.monotonic() - start_time
+        rtts = sorted(step['rtt'] for step in steps if step['rtt'] is not None)
+        
+        report = {
+            'scenario': scenario.get('name', ''),
+            'total': len(steps),
+            'passed': sum(1 for step in steps if step['passed']),
+            'timeouts': sum(1 for step in steps if step['reply'] is None),
+            'elapsed': elapsed,
+            'throughput': len(steps) / elapsed if elapsed > 0 else 0,
+            'steps': steps
+        }
+        if rtts:
+            report['latency'] = {
+                'avg': sum(rtts) / len(rtts),
+                'p50': rtts[len(rtts) // 2],
+                'p95': rtts[min(len(rtts) - 1, int(len(rtts) * 0.95))],
+                'max': rtts[-1]
+            }
+        return report
+
+def print_scenario_report(report, verbose=True):
+    """打印场景运行报告"""
+    print(f"\n=== 场景运行报告: {report['scenario']} ===")
+    
+    if verbose:
+        for step in report['steps']:
+            mark = '✓' if step['passed'] else '✗'
+            rtt = f"{step['rtt'] * 1000:.1f}ms" if step['rtt'] is not None else '超时'
+            line = f"{mark} {step['command']:<16} -> {step['reply']} ({rtt})"
+            if not step['passed'] and step['expected'] is not None:
+                line += f"  期望: {step['expected']}"
+            print(line)
+    
+    print(f"通过: {report['passed']}/{report['total']}，超时: {report['timeouts']}")
+    print(f"总耗时: {report['elapsed']:.3f}s，吞吐量: {report['throughput']:.1f}条/秒")
+    if 'latency' in report:
+        latency = report['latency']
+        print(f"往返延迟: 平均{latency['avg'] * 1000:.1f}ms，P50 {latency['p50'] * 1000:.1f}ms，"
+              f"P95 {latency['p95'] * 1000:.1f}ms，最大{latency['max'] * 1000:.1f}ms")
+    print("=" * 30)
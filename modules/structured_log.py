@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+结构化日志模块
+SystemLogger在文字日志之外写入的结构化记录流，每条记录包含：
+ts（时间戳，秒）、mono（单调时钟，秒）、type（事件类型）、msg（日志消息），
+以及指令、响应耗时、窗口、样本等字段。支持两种编码：
+- jsonl: 每行一个JSON对象，便于用通用工具处理
+- binary: 长度前缀的紧凑二进制记录，事件类型和常用字段名编码为1字节
+"""
+
+import gzip
+import json
+import struct
+
+import numpy as np
+
+# 二进制文件头
+BINARY_MAGIC = b'PRLOG1\n'
+
+# 事件类型和常用字段名的编码（只能在末尾追加，不能修改已有顺序）
+EVENT_TYPES = ('系统', 'UART接收', 'UART发送', '识别', '语音', '错误', '采样', '配送', '调试')
+FIELD_NAMES = ('msg', 'command', 'response', 'latency', 'window', 'window_name', 'sample',
+               'count', 'position', 'content', 'text', 'available', 'action',
+               'error_type', 'recognition_type', 'repeat', 'first_ts', 'last_ts',
+               'latency_min', 'latency_max')
+
+# 未登记的事件类型/字段名的编码，其后跟随名称字符串
+_CUSTOM_CODE = 255
+
+_RECORD_HEADER = struct.Struct('<ddB')
+_LENGTH = struct.Struct('<I')
+
+# 二进制编码中名称和字符串值的最大字节数（超出的部分截断）
+MAX_NAME_BYTES = 255
+MAX_STRING_BYTES = 65535
+_INT64_RANGE = (-2 ** 63, 2 ** 63)
+
+# 数值列（读取时转换为浮点数组，缺失值为NaN；含非数值的列保留为object数组）
+NUMERIC_COLUMNS = ('ts', 'mono', 'latency', 'window', 'count', 'repeat', 'first_ts', 'last_ts',
+                   'latency_min', 'latency_max')
+
+STRUCTURED_EXTENSIONS = {'jsonl': '.jsonl', 'binary': '.bin'}
+
+def encode_json_record(record):
+    """编码为一行JSON（含换行符，JSON不支持的值按str()编码）"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+
+def _encode_text(text, limit):
+    """UTF-8编码，超过limit字节时在字符边界截断"""
+    encoded = str(text).encode('utf-8')
+    if len(encoded) > limit:
+        encoded = encoded[:limit].decode('utf-8', errors='ignore').encode('utf-8')
+    return encoded
+
+def _encode_name(code_table, name):
+    if name in code_table:
+        return bytes((code_table.index(name),))
+    encoded = _encode_text(name, MAX_NAME_BYTES)
+    return bytes((_CUSTOM_CODE, len(encoded))) + encoded
+
+def _encode_value(value):
+    if value is None:
+        return b'n'
+    if isinstance(value, bool):
+        return b'b' + bytes((int(value),))
+    if isinstance(value, int) and _INT64_RANGE[0] <= value < _INT64_RANGE[1]:
+        return b'i' + struct.pack('<q', value)
+    if isinstance(value, float):
+        return b'f' + struct.pack('<d', value)
+    # 其他值（含超出int64的整数）按str()编码
+    encoded = _encode_text(value, MAX_STRING_BYTES)
+    return b's' + struct.pack('<H', len(encoded)) + encoded
+
+def encode_binary_record(record):
+    """编码为一条二进制记录
+    
+    布局: [长度(4B)] [ts(8B)] [mono(8B)] [事件类型(1B)] 然后每个字段为
+    [字段名(1B)] [值类型(1B: n/b/i/f/s)] [值]；未登记的事件类型/字段名
+    编码为 [255] [名称长度(1B)] [名称]。字符串值为 [长度(2B)] [UTF-8]，
+    超过MAX_STRING_BYTES（名称超过MAX_NAME_BYTES）的部分截断。
+    """
+    event_type = _encode_name(EVENT_TYPES, record['type'])
+    parts = [_RECORD_HEADER.pack(record['ts'], record['mono'], event_type[0]), event_type[1:]]
+    for name, value in record.items():
+        if name in ('ts', 'mono', 'type'):
+            continue
+        parts.append(_encode_name(FIELD_NAMES, name))
+        parts.append(_encode_value(value))
+    payload = b''.join(parts)
+    return _LENGTH.pack(len(payload)) + payload
+
+def _decode_name(code_table, payload, offset):
+    code = payload[offset]
+    if code != _CUSTOM_CODE:
+        return code_table[code], offset + 1
+    length = payload[offset + 1]
+    return payload[offset + 2:offset + 2 + length].decode('utf-8'), offset + 2 + length
+
+def _decode_value(payload, offset):
+    kind = payload[offset:offset + 1]
+    offset += 1
+    if kind == b'n':
+        return None, offset
+    if kind == b'b':
+        return bool(payload[offset]), offset + 1
+    if kind == b'i':
+        return struct.unpack_from('<q', payload, offset)[0], offset + 8
+    if kind == b'f':
+        return struct.unpack_from('<d', payload, offset)[0], offset + 8
+    length = struct.unpack_from('<H', payload, offset)[0]
+    offset += 2
+    return payload[offset:offset + length].decode('utf-8'), offset + length
+
+def decode_binary_records(data):
+    """解码二进制记录流（可包含文件头）
+    
+    Yields:
+        dict: 结构化记录
+    """
+    offset = len(BINARY_MAGIC) if data.startswith(BINARY_MAGIC) else 0
+    while offset + _LENGTH.size <= len(data):
+        length = _LENGTH.unpack_from(data, offset)[0]
+        start = offset + _LENGTH.size
+        payload = data[start:start + length]
+        if len(payload) < length:
+            # 写入中断的不完整记录
+            return
+        offset = start + length
+        
+        ts, mono, type_code = _RECORD_HEADER.unpack_from(payload, 0)
+        position = _RECORD_HEADER.size
+        if type_code == _CUSTOM_CODE:
+            event_type, position = _decode_name(EVENT_TYPES, payload, position - 1)
+        else:
+            event_type = EVENT_TYPES[type_code]
+        
+        record = {'ts': ts, 'mono': mono, 'type': event_type}
+        while position < len(payload):
+            name, position = _decode_name(FIELD_NAMES, payload, position)
+            record[name], position = _decode_value(payload, position)
+        yield record
+
+def read_structured_log(path):
+    """读取结构化日志文件（按扩展名识别编码，轮转压缩后的.gz按去掉.gz后的扩展名识别）
+    
+    Yields:
+        dict: 结构化记录
+    """
+    compressed = path.endswith('.gz')
+    opener = gzip.open if compressed else open
+    if (path[:-3] if compressed else path).endswith(STRUCTURED_EXTENSIONS['binary']):
+        with opener(path, 'rb') as f:
+            yield from decode_binary_records(f.read())
+        return
+    
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 写入中断的不完整行
+                continue
+
+def load_structured_logs(paths, event_types=None):
+    """加载结构化日志为列数据
+    
+    数值列（ts、mono、latency等）为float64数组，缺失值为NaN；
+    其他列为object数组，缺失值为None。可直接做向量化筛选和统计，例如：
+    columns['latency'][columns['type'] == 'UART发送']
+    
+    Args:
+        paths: 结构化日志文件列表（可含轮转压缩后的.jsonl.gz、.bin.gz）
+        event_types: 只加载这些事件类型（默认全部）
+    
+    Returns:
+        dict: 列名 -> numpy数组
+    """
+    records = []
+    for path in paths:
+        for record in read_structured_log(path):
+            if event_types is None or record.get('type') in event_types:
+                records.append(record)
+    
+    names = {}
+    for record in records:
+        names.update(dict.fromkeys(record))
+    
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        if name in NUMERIC_COLUMNS:
+            try:
+                columns[name] = np.array([np.nan if value is None else value for value in values],
+                                         dtype=np.float64)
+                continue
+            except (TypeError, ValueError):
+                # 如采样记录的窗口为字母
+                pass
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        columns[name] = column
+    return columns
@@ -7,16 +7,37 @@
 
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from modules.sequenced_protocol import (
+    SequenceTracker, parse_sequenced, format_sequenced, RESEND_REQUEST
+)
+from modules.binary_protocol import OP_WINDOW_STATUS, encode_window_status
+
+# 切换串口协议的指令 -> 协议模式
+PROTOCOL_MODE_COMMANDS = {'mode binary': 'binary', 'mode ascii': 'ascii'}
+
 class TaskController:
     """任务控制器类"""
     
-    def __init__(self, logger, serial_comm, image_recognition, voice_player):
+    def __init__(self, logger, serial_comm, image_recognition, voice_player,
+                 pipelining=False, pipeline_workers=4, telemetry=None):
+        """初始化任务控制器
+        
+        Args:
+            pipelining: 是否启用带序列号的指令流水线（"#17 check board 2" -> "#17 ok"）
+            pipeline_workers: 流水线模式下并发处理指令的线程数
+            telemetry: 遥测数据记录（TelemetryStore或TelemetrySession，记录指令耗时和任务耗时）
+        """
         self.logger = logger
         self.serial_comm = serial_comm
         self.image_recognition = image_recognition
         self.voice_player = voice_player
+        self.telemetry = telemetry
+        
+        # 当前任务的开始时间（time.time()，start指令时记录）
+        self.task_started_at = None
         
         # 任务状态
         self.running = False
@@ -28,6 +49,21 @@ class TaskController:
         # 窗口状态存储
         self.window_status = {}
         
+        # 最近一次响应写入串口的耗时（秒）
+        self.last_response_latency = None
+        
+        # 任务状态锁（流水线模式下多条指令并发处理）
+        self._state_lock = threading.RLock()
+        
+        # 指令流水线
+        self.pipelining = pipelining
+        self.sequence_tracker = SequenceTracker()
+        self.pipeline_executor = None
+        if pipelining:
+            self.pipeline_executor = ThreadPoolExecutor(
+                max_workers=pipeline_workers, thread_name_prefix="pipeline"
+            )
+        
         # 指令处理映射
         self.command_handlers = {
             'start': self._handle_start,
@@ -40,7 +76,11 @@ class TaskController:
             'check 2': self._handle_check_lab_2,
             'check 3': self._handle_check_lab_3,
             'check 4': self._handle_check_lab_4,
-            'over': self._handle_over
+            'over': self._handle_over,
+            'plan': self._handle_plan,
+            'mode binary': self._handle_mode_binary,
+            'mode ascii': self._handle_mode_ascii,
+            'ping': self._handle_ping
         }
         
     def start(self):
@@ -51,55 +91,172 @@ class TaskController:
     def stop(self):
         """停止任务控制器"""
         self.running = False
+        if self.pipeline_executor:
+            self.pipeline_executor.shutdown(wait=False)
         self.logger.log_system("任务控制器停止")
         
-    def handle_command(self, command):
+    def handle_command(self, command, received_at=None):
         """处理接收到的指令
         
         Args:
             command: 接收到的指令字符串
+            received_at: 指令到达时间（time.monotonic()，用于统计响应耗时）
         """
         if not self.running:
             return
             
+        if received_at is None:
+            received_at = time.monotonic()
+        
         # 记录接收到的指令
         self.logger.log_uart_receive(command)
         
-        # 查找对应的处理函数
+        # 带序列号的指令交给流水线并发处理
+        if self.pipelining:
+            seq, body = parse_sequenced(command)
+            if seq is None and body == 'start':
+                # 新任务开始（可能是下位机重启后），序列号重新开始
+                self.sequence_tracker.reset()
+            if seq is not None:
+                self._handle_sequenced_command(seq, body, received_at)
+                return
+                
+        response = self._execute_command(command)
+        if response:
+            self._send_response(response, received_at, command=command.strip())
+            
+    def _execute_command(self, command):
+        """查找并执行指令处理函数
+        
+        Args:
+            command: 指令字符串（不含序列号）
+            
+        Returns:
+            str: 响应内容
+        """
         handler = self.command_handlers.get(command.strip())
         
-        if handler:
-            try:
-                response = handler()
-                if response:
-                    self._send_response(response)
-            except Exception as e:
-                error_msg = f"处理指令'{command}'时发生异常: {str(e)}"
-                self.logger.log_error(error_msg)
-                self._send_response("error")
-        else:
+        if not handler:
+            # 批量查询指令，如 "check A,B,C"、"check 1-4"
+            targets = self._expand_batch_command(command.strip())
+            if targets:
+                handler = lambda: self._handle_batch(targets)
+                
+        if not handler:
             self.logger.log_error(f"未知指令: {command}")
-            self._send_response("error")
+            return "error"
+            
+        try:
+            return handler()
+        except Exception as e:
+            error_msg = f"处理指令'{command}'时发生异常: {str(e)}"
+            self.logger.log_error(error_msg)
+            return "error"
             
-    def _send_response(self, response):
+    def _handle_sequenced_command(self, seq, body, received_at):
+        """处理带序列号的指令
+        
+        检测丢帧（请求重传）和重复帧（重发缓存的响应），
+        新指令提交到流水线线程池，完成后按序列号返回响应。
+        
+        Args:
+            seq: 序列号
+            body: 指令内容
+            received_at: 指令到达时间
+        """
+        status, missing = self.sequence_tracker.register(seq, body)
+        
+        if status == SequenceTracker.NEW and body == 'start':
+            # 新任务开始（可能是下位机重启后），之前的序列号作废，不请求重传
+            # （重发的start按重复帧处理，不会再次执行）
+            self.sequence_tracker.restart(seq, body)
+            missing = []
+            
+        for lost_seq in missing:
+            self.logger.log_communication_error("丢帧", f"序列号#{lost_seq}未收到，请求重传")
+            self._send_response(RESEND_REQUEST, received_at, lost_seq)
+            
+        if status == SequenceTracker.DUPLICATE_ANSWERED:
+            reply = self.sequence_tracker.cached_reply(seq)
+            self.logger.log_communication_error("重复帧", f"序列号#{seq}已处理，重发响应: {reply}")
+            self._send_response(reply, received_at, seq)
+            return
+            
+        if status == SequenceTracker.DUPLICATE_PENDING:
+            self.logger.log_communication_error("重复帧", f"序列号#{seq}正在处理，忽略")
+            return
+            
+        self.pipeline_executor.submit(self._run_sequenced_command, seq, body, received_at)
+        
+    def _run_sequenced_command(self, seq, body, received_at):
+        """在流水线线程中执行指令并返回带序列号的响应"""
+        response = self._execute_command(body)
+        if response:
+            self._send_response(response, received_at, seq, command=body.strip())
+        
+    def _send_response(self, response, received_at=None, seq=None, command=None):
         """发送响应
         
         Args:
             response: 响应内容
+            received_at: 对应指令的到达时间（为None时不统计响应耗时）
+            seq: 序列号（流水线模式），响应会被缓存以便重传
+            command: 对应的指令（二进制模式下用于选择紧凑编码，切换协议，并记录遥测数据）
         """
-        if self.serial_comm.send_command(response):
-            self.logger.log_uart_send(response)
+        frame = response
+        if seq is not None:
+            self.sequence_tracker.record_reply(seq, response)
+            frame = format_sequenced(seq, response)
+            
+        if (command == 'check board 2' and response in ('ok', 'wait') and seq is None
+                and getattr(self.serial_comm, 'protocol_mode', 'ascii') == 'binary'):
+            # 二进制模式下连同各窗口空闲状态一起返回
+            with self._state_lock:
+                payload = encode_window_status(self.window_status, response == 'wait')
+            future = self.serial_comm.send_frame_async(OP_WINDOW_STATUS, payload)
+        else:
+            future = self.serial_comm.send_command_async(frame)
+        future.add_done_callback(
+            lambda f: self._on_response_sent(frame, received_at, f.result(), command, response)
+        )
+        
+        mode = PROTOCOL_MODE_COMMANDS.get(command)
+        if mode is not None and response == 'ok':
+            # 响应在入队时按当前模式编码，因此ok仍使用切换前的协议，之后的收发使用新协议
+            self.serial_comm.set_protocol_mode(mode)
+            self.logger.log_system(f"串口协议切换为: {mode}")
+        
+    def _on_response_sent(self, frame, received_at, success, command=None, response=None):
+        """响应发送完成回调（在发送线程中执行）
+        
+        Args:
+            frame: 发送的响应帧
+            received_at: 对应指令的到达时间
+            success: 是否发送成功
+            command: 对应的指令
+            response: 响应内容（不含序列号）
+        """
+        latency = None
+        if success:
+            if received_at is not None:
+                latency = time.monotonic() - received_at
+                self.last_response_latency = latency
+            self.logger.log_uart_send(frame, latency=latency)
         else:
-            self.logger.log_error(f"发送响应失败: {response}")
+            self.logger.log_error(f"发送响应失败: {frame}")
+        if self.telemetry is not None:
+            self.telemetry.record_command(command, response or frame, latency, success)
             
     def _handle_start(self):
         """处理start指令"""
         self.logger.log_task_start()
         
         # 清除之前的任务数据
-        self.current_task_data.clear()
-        self.qr_results.clear()
-        self.window_status.clear()
+        with self._state_lock:
+            self.task_started_at = time.time()
+            self.current_task_data.clear()
+            self.qr_results.clear()
+            self.window_status.clear()
         
         # 语音播报
         self.voice_player.speak_system_start()
@@ -111,13 +268,26 @@ class TaskController:
         try:
             # 进行二维码识别
             results = self.image_recognition.recognize_qr_codes_board1()
+            return self._process_qr_results(results)
             
+        except Exception as e:
+            self.logger.log_recognition_error("二维码", str(e))
+            return "error"
+            
+    def _process_qr_results(self, results):
+        """处理二维码识别结果并构建响应
+        
+        Args:
+            results: recognize_qr_codes_board1()的返回值
+        """
+        try:
             if 'error' in results:
                 self.logger.log_recognition_error("二维码", results['error'])
                 return "error"
                 
             # 存储识别结果
-            self.qr_results = results
+            with self._state_lock:
+                self.qr_results = results
             
             # 记录识别结果
             position_names = {
@@ -211,7 +381,7 @@ class TaskController:
         sample_types = []
         
         # 遍历二维码识别结果
-        for position, content in self.qr_results.items():
+        for position, content in self._qr_items():
             # 解析二维码内容，检查是否包含当前窗口
             windows = self.image_recognition.parse_qr_content(content)
             if window in windows:
@@ -227,13 +397,26 @@ class TaskController:
         try:
             # 进行OCR识别
             results = self.image_recognition.recognize_ocr_board2()
+            return self._process_ocr_results(results)
             
+        except Exception as e:
+            self.logger.log_recognition_error("OCR", str(e))
+            return "error"
+            
+    def _process_ocr_results(self, results):
+        """处理OCR识别结果并构建响应
+        
+        Args:
+            results: recognize_ocr_board2()的返回值
+        """
+        try:
             if 'error' in results:
                 self.logger.log_recognition_error("OCR", results['error'])
                 return "error"
                 
             # 存储窗口状态
-            self.window_status = results['window_status']
+            with self._state_lock:
+                self.window_status = results['window_status']
             
             # 记录OCR识别结果
             for window_num, status_info in results['window_status'].items():
@@ -247,9 +430,10 @@ class TaskController:
             needed_windows = self._get_needed_windows()
             unavailable_windows = []
             
+            window_status = results['window_status']
             for window_num in needed_windows:
-                if window_num in self.window_status:
-                    if not self.window_status[window_num]['available']:
+                if window_num in window_status:
+                    if not window_status[window_num]['available']:
                         window_name = self.image_recognition.window_names.get(window_num, f"{window_num}号窗口")
                         unavailable_windows.append(window_name)
                         
@@ -275,13 +459,18 @@ class TaskController:
         needed_windows = set()
         
         # 根据二维码识别结果确定需要的窗口
-        for position, content in self.qr_results.items():
+        for position, content in self._qr_items():
             sample_info = self.image_recognition.get_sample_info(position, content)
             if sample_info:
                 needed_windows.add(sample_info['window_number'])
                 
         return list(needed_windows)
         
+    def _qr_items(self):
+        """获取二维码识别结果的快照（流水线模式下可能被其他线程同时修改）"""
+        with self._state_lock:
+            return list(self.qr_results.items())
+            
     def _handle_check_lab_1(self):
         """处理check 1指令"""
         return self._handle_check_lab_window(1)
@@ -336,7 +525,7 @@ class TaskController:
         sample_count = 0
         
         # 检查二维码识别结果中是否有对应此窗口的样本
-        for position, content in self.qr_results.items():
+        for position, content in self._qr_items():
             sample_info = self.image_recognition.get_sample_info(position, content)
             if sample_info and sample_info['window_number'] == window_num:
                 sample_count += sample_info['sample_count']
@@ -349,15 +538,123 @@ class TaskController:
         self.voice_player.speak_system_end()
         
         # 清除任务数据
-        self.current_task_data.clear()
-        self.qr_results.clear()
-        self.window_status.clear()
+        with self._state_lock:
+            self.current_task_data.clear()
+            self.qr_results.clear()
+            self.window_status.clear()
+            task_started_at, self.task_started_at = self.task_started_at, None
         
         # 记录任务结束
         self.logger.log_task_end()
+        if self.telemetry is not None and task_started_at is not None:
+            self.telemetry.record_task(task_started_at, time.time())
         
         return "ok"
         
+    def _handle_ping(self):
+        """处理ping指令（链路握手/保活检测）"""
+        return "pong"
+        
+    def _expand_batch_command(self, command):
+        """展开批量查询指令
+        
+        支持逗号列表和范围，如 "check A,B,C"、"check A-C"、"check 1-4"、"check 1,3"，
+        每一项必须对应一个单独的check指令（不含check board）。
+        
+        Args:
+            command: 指令字符串
+            
+        Returns:
+            list: 查询目标列表（如['A', 'B', 'C']），不是批量指令时返回None
+        """
+        if not command.startswith('check ') or not (',' in command or '-' in command):
+            return None
+            
+        targets = []
+        for part in command[len('check '):].split(','):
+            part = part.strip()
+            if '-' in part:
+                first, last = (item.strip() for item in part.split('-', 1))
+                if first.isdigit() and last.isdigit():
+                    if int(last) - int(first) >= len(self.command_handlers):
+                        return None
+                    items = [str(num) for num in range(int(first), int(last) + 1)]
+                elif len(first) == 1 and len(last) == 1 and first.isalpha() and last.isalpha():
+                    items = [chr(code) for code in range(ord(first.upper()), ord(last.upper()) + 1)]
+                else:
+                    return None
+                targets.extend(items)
+            else:
+                targets.append(part)
+                
+            if len(targets) > len(self.command_handlers):
+                return None
+                
+        for target in targets:
+            if target.startswith('board') or f'check {target}' not in self.command_handlers:
+                return None
+                
+        return targets or None
+        
+    def _handle_batch(self, targets):
+        """处理批量查询：依次执行各check指令，合并为一行响应
+        
+        响应格式: "A=collected:静脉血样本;B=no_sample;C=no_sample"
+        
+        Args:
+            targets: 查询目标列表
+        """
+        parts = []
+        for target in targets:
+            try:
+                response = self.command_handlers[f'check {target}']() or "error"
+            except Exception as e:
+                self.logger.log_error(f"处理批量指令check {target}时发生异常: {str(e)}")
+                response = "error"
+            parts.append(f"{target}={response}")
+            
+        return ";".join(parts)
+        
+    def _handle_plan(self):
+        """处理plan指令：一次返回根据二维码结果预先计算的完整路线
+        
+        不播报语音、不记录采样/配送，只返回各窗口的动作：
+        体检区 collect（有样本需采集）/ skip，化验区 stop:样本数 / pass。
+        响应格式: "A=collect;B=skip;C=collect;1=stop:2;2=pass;3=pass;4=stop:1"
+        """
+        if not self._qr_items():
+            return "no_qr_found"
+            
+        parts = []
+        for window in ('A', 'B', 'C'):
+            action = "collect" if self._get_sample_types_for_window(window) else "skip"
+            parts.append(f"{window}={action}")
+            
+        for window_num in sorted(self.image_recognition.window_names):
+            should_stop, sample_count = self._should_stop_at_window(window_num)
+            parts.append(f"{window_num}={'stop:' + str(sample_count) if should_stop else 'pass'}")
+            
+        plan = ";".join(parts)
+        self.logger.log_system(f"路线规划: {plan}")
+        return plan
+        
+    def _handle_mode_binary(self):
+        """处理mode binary指令：协商切换到二进制帧协议
+        
+        先以ASCII回复ok，之后的收发均使用二进制帧（发送ok后由_send_response切换）
+        """
+        return self._check_protocol_switch()
+        
+    def _handle_mode_ascii(self):
+        """处理mode ascii指令：切换回ASCII文本协议"""
+        return self._check_protocol_switch()
+        
+    def _check_protocol_switch(self):
+        """串口是否支持切换协议模式（支持时回复ok，发送ok后切换）"""
+        if not hasattr(self.serial_comm, 'set_protocol_mode'):
+            return "error"
+        return "ok"
+        
     def get_current_status(self):
         """获取当前状态
         
@@ -368,12 +665,24 @@ class TaskController:
             'running': self.running,
             'qr_results': self.qr_results,
             'window_status': self.window_status,
-            'task_data': self.current_task_data
+            'task_data': self.current_task_data,
+            'last_response_latency': self.last_response_latency
         }
         
+    def handle_connection_change(self, connected):
+        """串口连接状态变化（重连后下位机可能已重启，序列号重新开始）
+        
+        Args:
+            connected: True为已重连，False为已断开
+        """
+        if connected:
+            self.sequence_tracker.reset()
+            
     def reset_task_data(self):
         """重置任务数据"""
-        self.current_task_data.clear()
-        self.qr_results.clear()
-        self.window_status.clear()
+        with self._state_lock:
+            self.current_task_data.clear()
+            self.qr_results.clear()
+            self.window_status.clear()
+        self.sequence_tracker.reset()
         self.logger.log_system("任务数据已重置")
\ No newline at end of file
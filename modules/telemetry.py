@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+遥测数据模块
+把任务耗时、每条指令的响应耗时、二维码/OCR识别结果（按板、光照条件）写入SQLite，
+便于长期统计查询。记录只放入有界队列（队列满时丢弃并计数），
+由后台线程批量写入（WAL模式），不会阻塞指令处理。
+
+表结构:
+- tasks: 任务（start到over）开始、结束时间和耗时
+- commands: 指令、响应、响应耗时（从收到指令到响应写入串口）
+- recognitions: 识别类型、板号、识别到的区域数、耗时、图像亮度和光照条件
+"""
+
+import sqlite3
+import threading
+import time
+from queue import Queue, Empty, Full
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    ts REAL NOT NULL,
+    command TEXT,
+    response TEXT,
+    latency REAL,
+    success INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recognitions (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    board INTEGER NOT NULL,
+    success INTEGER NOT NULL,
+    found INTEGER NOT NULL,
+    regions INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    brightness REAL,
+    lighting TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_started_at ON tasks(started_at);
+CREATE INDEX IF NOT EXISTS idx_commands_ts ON commands(ts);
+CREATE INDEX IF NOT EXISTS idx_commands_command ON commands(command, ts);
+CREATE INDEX IF NOT EXISTS idx_recognitions_ts ON recognitions(ts);
+CREATE INDEX IF NOT EXISTS idx_recognitions_board ON recognitions(board, kind, ts);
+"""
+
+_INSERTS = {
+    'tasks': "INSERT INTO tasks (session, started_at, ended_at, duration) VALUES (?, ?, ?, ?)",
+    'commands': "INSERT INTO commands (session, ts, command, response, latency, success) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+    'recognitions': "INSERT INTO recognitions (session, ts, kind, board, success, found, regions, "
+                    "duration, brightness, lighting, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+}
+
+# 光照条件（按图像平均亮度0-255划分）
+LIGHTING_LEVELS = ((60, '暗'), (190, '正常'), (256, '亮'))
+
+# 预置统计查询（:since/:until为时间戳，NULL表示不限）
+SUMMARY_QUERIES = {
+    'commands': ("各指令响应耗时", """
+        SELECT command AS 指令, COUNT(*) AS 次数,
+               ROUND(AVG(latency) * 1000, 2) AS 平均耗时ms,
+               ROUND(MAX(latency) * 1000, 2) AS 最大耗时ms,
+               ROUND(100.0 * SUM(response = 'error' OR success = 0) / COUNT(*), 1) AS 错误率
+        FROM commands
+        WHERE (:since IS NULL OR ts >= :since) AND (:until IS NULL OR ts < :until)
+        GROUP BY command ORDER BY 次数 DESC
+    """),
+    'recognition': ("识别成功率（按板、类型和光照条件）", """
+        SELECT board AS 板, kind AS 类型, lighting AS 光照, COUNT(*) AS 次数,
+               ROUND(100.0 * SUM(success) / COUNT(*), 1) AS 成功率,
+               ROUND(100.0 * SUM(found) / SUM(regions), 1) AS 区域识别率,
+               ROUND(AVG(duration) * 1000, 1) AS 平均耗时ms,
+               ROUND(AVG(brightness), 1) AS 平均亮度
+        FROM recognitions
+        WHERE (:since IS NULL OR ts >= :since) AND (:until IS NULL OR ts < :until)
+        GROUP BY board, kind, lighting ORDER BY board, kind, lighting
+    """),
+    'tasks': ("每日任务耗时", """
+        SELECT DATE(started_at, 'unixepoch', 'localtime') AS 日期, COUNT(*) AS 任务数,
+               ROUND(AVG(duration), 1) AS 平均耗时s,
+               ROUND(MIN(duration), 1) AS 最短s, ROUND(MAX(duration), 1) AS 最长s
+        FROM tasks
+        WHERE (:since IS NULL OR started_at >= :since) AND (:until IS NULL OR started_at < :until)
+        GROUP BY 日期 ORDER BY 日期
+    """),
+    'sessions': ("各会话指令数和错误数", """
+        SELECT session AS 会话, COUNT(*) AS 指令数,
+               SUM(response = 'error' OR success = 0) AS 错误数,
+               ROUND(AVG(latency) * 1000, 2) AS 平均耗时ms
+        FROM commands
+        WHERE (:since IS NULL OR ts >= :since) AND (:until IS NULL OR ts < :until)
+        GROUP BY session ORDER BY session
+    """)
+}
+
+_STOP = object()
+
+def classify_lighting(brightness):
+    """按平均亮度划分光照条件"""
+    if brightness is None:
+        return None
+    for limit, name in LIGHTING_LEVELS:
+        if brightness < limit:
+            return name
+    return LIGHTING_LEVELS[-1][1]
+
+def image_brightness(image):
+    """图像平均亮度（隔8像素采样，耗时可忽略）"""
+    if image is None:
+        return None
+    return float(image[::8, ::8].mean())
+
+class TelemetryStore:
+    """遥测数据存储（后台线程批量写入SQLite）"""
+    
+    def __init__(self, db_path, batch_size=200, flush_interval=1.0, max_queue=10000):
+        """初始化遥测数据存储
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            batch_size: 每个事务最多写入的记录数
+            flush_interval: 最长写入间隔（秒）
+            max_queue: 队列最大记录数，满时丢弃新记录
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=max_queue)
+        self.thread = None
+        self.dropped = 0
+        self.written = 0
+        
+        # 在调用线程中建表，数据库不可用时立即报错
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+        
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+        
+    def start(self):
+        """启动写入线程"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._writer_loop, name="telemetry")
+        self.thread.daemon = True
+        self.thread.start()
+        
+    def stop(self, timeout=5.0):
+        """写入队列中剩余的记录后停止"""
+        if not (self.thread and self.thread.is_alive()):
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except Full:
+            pass
+        self.thread.join(timeout=timeout)
+        
+    def session(self, name):
+        """获取绑定会话名称的记录接口（多机器人会话共用一个数据库）"""
+        return TelemetrySession(self, name)
+        
+    def _submit(self, table, row):
+        try:
+            self.queue.put_nowait((table, row))
+        except Full:
+            self.dropped += 1
+        
+    def record_command(self, command, response, latency=None, success=True, session=''):
+        """记录指令响应
+        
+        Args:
+            command: 指令（不含序列号）
+            response: 响应内容
+            latency: 从收到指令到响应写入串口的耗时（秒）
+            success: 响应是否发送成功
+        """
+        self._submit('commands', (session, time.time(), command, response, latency, int(bool(success))))
+        
+    def record_recognition(self, kind, board, found, regions, duration, brightness=None,
+                           error=None, session=''):
+        """记录一次识别
+        
+        Args:
+            kind: 识别类型（二维码/OCR）
+            board: 板号
+            found: 识别到内容的区域数
+            regions: 区域总数
+            duration: 识别耗时（秒）
+            brightness: 图像平均亮度（0-255）
+            error: 错误信息（识别失败时）
+        """
+        success = error is None and found > 0
+        self._submit('recognitions', (session, time.time(), kind, board, int(success), found, regions,
+                                      duration, brightness, classify_lighting(brightness), error))
+        
+    def record_task(self, started_at, ended_at, session=''):
+        """记录一次任务（时间戳，秒）"""
+        self._submit('tasks', (session, started_at, ended_at, ended_at - started_at))
+        
+    def _writer_loop(self):
+        """写入循环：攒够batch_size条或到达flush_interval后在一个事务中写入"""
+        connection = self._connect()
+        try:
+            while True:
+                batch, stop = [], False
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                    deadline = time.monotonic() + self.flush_interval
+                    while True:
+                        if item is _STOP:
+                            stop = True
+                            break
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    pass
+                
+                if batch:
+                    self._write_batch(connection, batch)
+                if stop:
+                    # 停止前写完队列中剩余的记录
+                    remaining = []
+                    while True:
+                        try:
+                            item = self.queue.get_nowait()
+                        except Empty:
+                            break
+                        if item is not _STOP:
+                            remaining.append(item)
+                    if remaining:
+                        self._write_batch(connection, remaining)
+                    break
+        finally:
+            connection.close()
+        
+    def _write_batch(self, connection, batch):
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        try:
+            with connection:
+                for table, table_rows in rows.items():
+                    connection.executemany(_INSERTS[table], table_rows)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            print(f"写入遥测数据失败: {str(e)}")
+
+class TelemetrySession:
+    """绑定会话名称的遥测记录接口（与TelemetryStore的record_*方法相同）"""
+    
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        
+    def record_command(self, command, response, latency=None, success=True):
+        self.store.record_command(command, response, latency, success, session=self.name)
+        
+    def record_recognition(self, kind, board, found, regions, duration, brightness=None, error=None):
+        self.store.record_recognition(kind, board, found, regions, duration, brightness, error,
+                                      session=self.name)
+        
+    def record_task(self, started_at, ended_at):
+        self.store.record_task(started_at, ended_at, session=self.name)
+
+def run_summary(db_path, name, since=None, until=None):
+    """执行预置统计查询
+    
+    Args:
+        db_path: 数据库文件路径
+        name: 查询名称（见SUMMARY_QUERIES）
+        since/until: 时间范围（时间戳）
+    
+    Returns:
+        tuple: (列名列表, 行列表)
+    """
+    _, sql = SUMMARY_QUERIES[name]
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = connection.execute(sql, {'since': since, 'until': until})
+        columns = [description[0] for description in cursor.description]
+        return columns, cursor.fetchall()
+    finally:
+        connection.close()
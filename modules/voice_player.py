@@ -8,7 +8,7 @@
 import os
 import threading
 import time
-from queue import Queue
+from queue import Queue, Empty
 
 try:
     import pyttsx3
@@ -74,11 +74,12 @@ class VoicePlayer:
         """语音播报循环"""
         while self.running:
             try:
-                if not self.voice_queue.empty():
-                    text = self.voice_queue.get()
-                    self._speak_text(text)
-                    
-                time.sleep(0.1)
+                # 阻塞等待播报任务，超时用于检查退出标志
+                try:
+                    text = self.voice_queue.get(timeout=0.5)
+                except Empty:
+                    continue
+                self._speak_text(text)
                 
             except Exception as e:
                 print(f"语音播报异常: {str(e)}")
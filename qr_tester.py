@@ -13,16 +13,23 @@ import sys
 import os
 from datetime import datetime
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from typing import Dict, List, Optional, Tuple
 
 # 添加模块路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from modules.image_recognition import ImageRecognition
+from modules.board_generator import render_board1, render_qr_code, load_labels
+from modules.frame_source import open_frame_source, IMAGE_EXTENSIONS
 from config import Config
 
 class QRTester:
     """QR码测试器"""
     
+    # 多QR码测试图像中各位置的内容
+    MULTI_QR_CONTENTS = {'top_left': 'AB', 'top_right': 'BC', 'bottom_left': 'AC', 'bottom_right': 'ABC'}
+    
     def __init__(self, debug=False):
         self.debug = debug
         self.image_recognition = ImageRecognition()
@@ -101,6 +108,11 @@ class QRTester:
                 print(f"❌ 图像识别模块测试失败: {results['error']}")
                 return False
             
+            if results != self.MULTI_QR_CONTENTS:
+                print(f"❌ 图像识别模块识别结果不正确: {results}")
+                print(f"   期望: {self.MULTI_QR_CONTENTS}")
+                return False
+            
             print(f"✅ 图像识别模块测试成功，识别到 {len(results)} 个QR码:")
             for position, content in results.items():
                 print(f"  - {position}: {content}")
@@ -234,7 +246,7 @@ class QRTester:
             qr.make(fit=True)
             
             # 转换为PIL图像
-            pil_img = qr.make_image(fill_color="black", back_color="white")
+            pil_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
             
             # 转换为OpenCV格式
             opencv_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
@@ -242,32 +254,13 @@ class QRTester:
             return opencv_img
             
         except ImportError:
-            print("⚠️ qrcode库未安装，使用模拟图像")
-            # 创建简单的模拟图像
-            img = np.ones((200, 200, 3), dtype=np.uint8) * 255
-            cv2.putText(img, content, (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-            return img
+            # qrcode库未安装时使用OpenCV生成QR码
+            code = render_qr_code(content, 200)
+            return cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
     
     def _create_multi_qr_test_image(self) -> np.ndarray:
-        """创建包含多个QR码的测试图像"""
-        # 创建640x480的白色图像
-        image = np.ones((480, 640, 3), dtype=np.uint8) * 255
-        
-        # 在四个角落添加QR码内容标识
-        positions = [
-            (50, 50, "AB"),      # top_left
-            (350, 50, "BC"),     # top_right  
-            (50, 300, "AC"),     # bottom_left
-            (350, 300, "ABC")    # bottom_right
-        ]
-        
-        for x, y, content in positions:
-            # 绘制矩形框模拟QR码
-            cv2.rectangle(image, (x, y), (x+100, y+100), (0, 0, 0), 2)
-            cv2.putText(image, content, (x+20, y+60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-        
-        return image
+        """创建包含多个QR码的测试图像（四个区域各一个真实QR码）"""
+        return render_board1(self.MULTI_QR_CONTENTS)
     
     def run_comprehensive_test(self) -> Dict:
         """运行综合测试"""
@@ -350,6 +343,202 @@ class QRTester:
             else:
                 print("无效选择，请重试")
 
+# ==================== 批量离线评估 ====================
+
+# 工作进程中的图像识别实例
+_batch_recognition = None
+
+def _init_batch_worker():
+    """进程池初始化：每个工作进程创建自己的图像识别实例"""
+    global _batch_recognition
+    _batch_recognition = ImageRecognition()
+
+def _evaluate_image(task) -> Dict:
+    """进程池任务：识别一张图像并记录各阶段耗时
+    
+    Args:
+        task: (名称, 板号, 图像路径, 图像数据)，图像路径为None时使用图像数据
+    """
+    name, board, path, image = task
+    timings = {}
+    
+    start = time.perf_counter()
+    if path is not None:
+        image = cv2.imread(path)
+    timings['load'] = time.perf_counter() - start
+    
+    if image is None:
+        return {'name': name, 'board': board, 'result': {'error': '无法读取图像'}, 'timings': timings}
+    
+    start = time.perf_counter()
+    if board == 1:
+        result = _batch_recognition.recognize_qr_codes_board1(image_data=image)
+    else:
+        result = _batch_recognition.recognize_ocr_board2(image_data=image)
+    timings[f'board{board}'] = time.perf_counter() - start
+    timings['total'] = timings['load'] + timings[f'board{board}']
+    
+    return {'name': name, 'board': board, 'result': result, 'timings': timings}
+
+def _score_result(record: Dict, label: Dict) -> Dict:
+    """将识别结果与标注对比
+    
+    Returns:
+        dict: {'correct': 整张图像是否完全正确, 'items': 正确的位置/窗口数, 'total_items': 位置/窗口总数}
+    """
+    result = record['result']
+    if record['board'] == 1:
+        expected = label.get('board1', {})
+        positions = ['top_left', 'top_right', 'bottom_left', 'bottom_right']
+        matched = sum(1 for position in positions if result.get(position) == expected.get(position))
+        return {'correct': matched == len(positions), 'items': matched, 'total_items': len(positions)}
+    
+    expected = label.get('board2', {})
+    window_status = result.get('window_status', {})
+    matched = sum(1 for num, available in expected.items()
+                  if window_status.get(num, {}).get('available') == available)
+    return {'correct': matched == len(expected), 'items': matched, 'total_items': len(expected)}
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """计算已排序数据的分位数"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def _batch_tasks(source: str, board: str, labels: Dict):
+    """生成批量评估任务
+    
+    图像目录只传递路径（图像在工作进程中解码）；视频文件在主进程中解码后传递帧数据。
+    board为auto时按标注或文件名（board2_*）确定板号。
+    """
+    def board_of(name):
+        if board != 'auto':
+            return int(board)
+        label = labels.get(os.path.basename(name))
+        if label:
+            return label['board']
+        return 2 if os.path.basename(name).startswith('board2') else 1
+    
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(source, filename)
+                yield filename, board_of(filename), path, None
+        return
+    
+    with open_frame_source(source) as frames:
+        for frame in frames:
+            yield frame.name, board_of(frame.name), None, frame.image
+
+def run_batch_evaluation(source: str, board: str = 'auto', labels_path: Optional[str] = None,
+                         output_path: Optional[str] = None, workers: Optional[int] = None) -> Dict:
+    """批量离线评估图像目录或视频文件
+    
+    Args:
+        source: 图像目录或视频文件
+        board: 板号（'1'、'2'或'auto'）
+        labels_path: 标注文件（labels.jsonl，默认使用图像目录中的标注文件）
+        output_path: 逐张识别结果的JSONL输出文件
+        workers: 进程数（默认CPU核数）
+    
+    Returns:
+        dict: 评估报告
+    """
+    if labels_path is None and os.path.isdir(source) and os.path.exists(os.path.join(source, 'labels.jsonl')):
+        labels_path = source
+    labels = load_labels(labels_path) if labels_path else {}
+    
+    workers = workers or os.cpu_count() or 1
+    timings = {}
+    scores = {1: [], 2: []}
+    counts = {'images': 0, 'errors': 0}
+    output = open(output_path, 'w', encoding='utf-8') if output_path else None
+    
+    def collect(record):
+        counts['images'] += 1
+        for stage, value in record['timings'].items():
+            timings.setdefault(stage, []).append(value)
+        if 'error' in record['result']:
+            counts['errors'] += 1
+        
+        label = labels.get(os.path.basename(record['name']))
+        if label:
+            record['score'] = _score_result(record, label)
+            scores[record['board']].append(record['score'])
+        
+        if output:
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        if counts['images'] % 500 == 0:
+            print(f"已处理 {counts['images']} 张图像")
+    
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+            # 限制同时提交的任务数，避免视频帧全部读入内存
+            pending = set()
+            for task in _batch_tasks(source, board, labels):
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+                pending.add(executor.submit(_evaluate_image, task))
+            for future in pending:
+                collect(future.result())
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start_time
+    
+    latency = {}
+    for stage, values in timings.items():
+        values.sort()
+        latency[stage] = {
+            'p50': _percentile(values, 0.50),
+            'p95': _percentile(values, 0.95),
+            'p99': _percentile(values, 0.99)
+        }
+    
+    accuracy = {}
+    for board_number, board_scores in scores.items():
+        if board_scores:
+            accuracy[f'board{board_number}'] = {
+                'images': len(board_scores),
+                'image_accuracy': sum(score['correct'] for score in board_scores) / len(board_scores),
+                'item_accuracy': (sum(score['items'] for score in board_scores) /
+                                  max(1, sum(score['total_items'] for score in board_scores)))
+            }
+    
+    return {
+        'source': source,
+        'images': counts['images'],
+        'errors': counts['errors'],
+        'workers': workers,
+        'elapsed': elapsed,
+        'images_per_sec': counts['images'] / elapsed if elapsed > 0 else 0,
+        'latency': latency,
+        'accuracy': accuracy
+    }
+
+def print_batch_report(report: Dict):
+    """打印批量评估报告"""
+    print("\n=== 批量评估报告 ===")
+    print(f"来源: {report['source']}")
+    print(f"图像数: {report['images']}，识别失败: {report['errors']}，进程数: {report['workers']}")
+    print(f"总耗时: {report['elapsed']:.2f}s，吞吐量: {report['images_per_sec']:.1f}张/秒")
+    
+    if report['latency']:
+        print(f"\n{'阶段':<12}{'P50(ms)':>10}{'P95(ms)':>10}{'P99(ms)':>10}")
+        for stage, stats in report['latency'].items():
+            print(f"{stage:<12}{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}")
+    
+    if report['accuracy']:
+        print("\n准确率:")
+        for board, stats in report['accuracy'].items():
+            item_name = '位置' if board == 'board1' else '窗口'
+            print(f"  {board}: 整图 {stats['image_accuracy'] * 100:.1f}%，"
+                  f"{item_name} {stats['item_accuracy'] * 100:.1f}%（{stats['images']}张有标注）")
+    else:
+        print("\n没有标注，未计算准确率")
+    print("====================\n")
+
 def main():
     parser = argparse.ArgumentParser(description='QR码识别测试程序')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
@@ -357,9 +546,20 @@ def main():
                        help='运行指定测试')
     parser.add_argument('--image', help='测试指定图像文件')
     parser.add_argument('--duration', type=int, default=10, help='实时测试持续时间(秒)')
+    parser.add_argument('--batch', help='批量离线评估图像目录或视频文件')
+    parser.add_argument('--board', choices=['1', '2', 'auto'], default='auto',
+                       help='批量评估的板号 (默认: auto，按标注或文件名判断)')
+    parser.add_argument('--labels', help='标注文件labels.jsonl (默认: 图像目录中的labels.jsonl)')
+    parser.add_argument('--output', help='批量评估逐张结果的JSONL输出文件')
+    parser.add_argument('--workers', type=int, help='批量评估进程数 (默认: CPU核数)')
     
     args = parser.parse_args()
     
+    if args.batch:
+        report = run_batch_evaluation(args.batch, args.board, args.labels, args.output, args.workers)
+        print_batch_report(report)
+        return
+    
     tester = QRTester(debug=args.debug)
     
     if args.image:
@@ -18,20 +18,25 @@ import os
 # 添加模块路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import Config
+from modules.serial_comm import LineFramer, read_serial_chunk, configure_low_latency, restore_low_latency
 
 class SerialTester:
     """串口测试器"""
     
-    def __init__(self, port: str, baudrate: int = 9600, timeout: float = 1.0):
+    def __init__(self, port: str, baudrate: int = 9600, timeout: float = 1.0,
+                 low_latency: bool = False):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
+        self.low_latency = low_latency
+        self.low_latency_status: Optional[Dict] = None
         self.serial_conn: Optional[serial.Serial] = None
         self.is_connected = False
         self.is_listening = False
         self.listen_thread: Optional[threading.Thread] = None
         self.received_data: List[str] = []
         self.test_results: List[Dict] = []
+        self.framer = LineFramer()
         
         # 预定义快捷指令
         self.quick_commands = {
@@ -60,15 +65,24 @@ class SerialTester:
             )
             self.is_connected = True
             print(f"✓ 串口连接成功: {self.port} @ {self.baudrate}")
+            self.low_latency_status = None
+            if self.low_latency:
+                status = self.low_latency_status = configure_low_latency(self.serial_conn)
+                if status['async_low_latency']:
+                    print(f"✓ 低延迟模式已启用 (latency_timer: {status['latency_timer']}ms)")
+                else:
+                    print("⚠ 设备不支持低延迟标志，使用默认设置")
             return True
         except Exception as e:
             print(f"✗ 串口连接失败: {e}")
             return False
     
     def disconnect(self):
-        """断开串口连接"""
+        """断开串口连接（恢复设备原来的低延迟标志）"""
         self.stop_listening()
         if self.serial_conn and self.serial_conn.is_open:
+            restore_low_latency(self.serial_conn, self.low_latency_status)
+            self.low_latency_status = None
             self.serial_conn.close()
         self.is_connected = False
         print("串口已断开")
@@ -94,14 +108,14 @@ class SerialTester:
         """监听循环"""
         while self.is_listening and self.serial_conn and self.serial_conn.is_open:
             try:
-                if self.serial_conn.in_waiting > 0:
-                    data = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                    if data:
-                        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-                        formatted_data = f"[{timestamp}] RX: {data}"
-                        print(formatted_data)
-                        self.received_data.append(formatted_data)
-                time.sleep(0.01)
+                chunk = read_serial_chunk(self.serial_conn, timeout=0.5)
+                if not chunk:
+                    continue
+                for data, _ in self.framer.feed(chunk):
+                    timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+                    formatted_data = f"[{timestamp}] RX: {data}"
+                    print(formatted_data)
+                    self.received_data.append(formatted_data)
             except Exception as e:
                 print(f"监听错误: {e}")
                 break
@@ -131,22 +145,26 @@ class SerialTester:
             }
             
             if expect_response:
-                start_time = time.time()
+                start_time = time.monotonic()
                 response_received = False
+                response_framer = LineFramer()
                 
-                while time.time() - start_time < timeout:
-                    if self.serial_conn.in_waiting > 0:
-                        response = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                        if response:
-                            response_time = time.time() - start_time
-                            result['response'] = response
-                            result['response_time'] = f"{response_time:.3f}s"
-                            
-                            resp_timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-                            print(f"[{resp_timestamp}] RX: {response} (耗时: {response_time:.3f}s)")
-                            response_received = True
-                            break
-                    time.sleep(0.01)
+                while not response_received:
+                    remaining = timeout - (time.monotonic() - start_time)
+                    if remaining <= 0:
+                        break
+                    chunk = read_serial_chunk(self.serial_conn, timeout=remaining)
+                    lines = response_framer.feed(chunk) if chunk else []
+                    if lines:
+                        # 以行到达时间计算响应耗时
+                        response, arrival = lines[0]
+                        response_time = arrival - start_time
+                        result['response'] = response
+                        result['response_time'] = f"{response_time:.3f}s"
+                        
+                        resp_timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+                        print(f"[{resp_timestamp}] RX: {response} (耗时: {response_time:.3f}s)")
+                        response_received = True
                 
                 if not response_received:
                     result['error'] = f'超时未收到响应 (>{timeout}s)'
@@ -182,6 +200,82 @@ class SerialTester:
         print(f"\n快速测试完成，成功: {sum(1 for r in results if r['success'])}/{len(results)}")
         return results
     
+    def measure_latency(self, command: str = 'ping', count: int = 50, timeout: float = 2.0) -> Dict:
+        """连续发送指令测量往返延迟（不启动监听线程）
+        
+        Returns:
+            dict: 往返时间统计（毫秒）
+        """
+        rtts = []
+        lost = 0
+        framer = LineFramer()
+        data = (command + '\r\n').encode('utf-8')
+        
+        for _ in range(count):
+            self.serial_conn.reset_input_buffer()
+            framer.reset()
+            start_time = time.monotonic()
+            self.serial_conn.write(data)
+            
+            lines = []
+            while not lines:
+                remaining = timeout - (time.monotonic() - start_time)
+                if remaining <= 0:
+                    break
+                chunk = read_serial_chunk(self.serial_conn, timeout=remaining)
+                lines = framer.feed(chunk) if chunk else []
+                
+            if lines:
+                rtts.append((lines[0][1] - start_time) * 1000)
+            else:
+                lost += 1
+                
+        stats = {'count': count, 'lost': lost}
+        if rtts:
+            rtts.sort()
+            stats.update({
+                'min': rtts[0],
+                'avg': sum(rtts) / len(rtts),
+                'p50': rtts[len(rtts) // 2],
+                'p95': rtts[min(len(rtts) - 1, int(len(rtts) * 0.95))],
+                'max': rtts[-1]
+            })
+        return stats
+    
+    def run_latency_comparison(self, command: str = 'ping', count: int = 50) -> Dict:
+        """分别在默认模式和低延迟模式下测量往返延迟并对比
+        
+        先测默认模式；设备上遗留的低延迟标志（如其他程序设置后未恢复）在默认模式测量期间临时清除，
+        每次测量后恢复设备原来的设置。
+        """
+        results = {}
+        for mode, low_latency in (('默认', False), ('低延迟', True)):
+            print(f"\n--- {mode}模式: 发送 {count} 次 '{command}' ---")
+            self.low_latency = low_latency
+            if not self.connect():
+                return results
+            if not low_latency:
+                self.low_latency_status = configure_low_latency(self.serial_conn, enable=False)
+                if self.low_latency_status['original']:
+                    print("⚠ 设备已处于低延迟模式，默认模式测量期间临时关闭")
+            results[mode] = self.measure_latency(command, count)
+            self.disconnect()
+            
+        print("\n=== 往返延迟对比 (ms) ===")
+        print(f"{'模式':<8}{'最小':>8}{'平均':>8}{'P50':>8}{'P95':>8}{'最大':>8}{'丢失':>6}")
+        for mode, stats in results.items():
+            if 'avg' not in stats:
+                print(f"{mode:<8}{'全部超时':>40}")
+                continue
+            print(f"{mode:<8}{stats['min']:>8.2f}{stats['avg']:>8.2f}{stats['p50']:>8.2f}"
+                  f"{stats['p95']:>8.2f}{stats['max']:>8.2f}{stats['lost']:>6}")
+                  
+        if all('avg' in stats for stats in results.values()) and len(results) == 2:
+            saved = results['默认']['p50'] - results['低延迟']['p50']
+            print(f"P50延迟降低: {saved:.2f}ms")
+        print("========================\n")
+        return results
+    
     def show_quick_commands(self):
         """显示快捷指令列表"""
         print("\n=== 快捷指令列表 ===")
@@ -306,6 +400,9 @@ def main():
     parser.add_argument('--timeout', '-t', type=float, default=1.0, help='超时时间 (默认: 1.0s)')
     parser.add_argument('--config', action='store_true', help='显示当前配置')
     parser.add_argument('--test', help='运行指定的测试指令 (逗号分隔)')
+    parser.add_argument('--latency', type=int, metavar='N',
+                        help='延迟测量模式：分别在默认/低延迟模式下发送N次指令，对比往返时间')
+    parser.add_argument('--latency-command', default='ping', help='延迟测量使用的指令 (默认: ping)')
     
     args = parser.parse_args()
     
@@ -332,7 +429,10 @@ def main():
     # 创建测试器
     tester = SerialTester(port, baudrate, timeout)
     
-    if args.test:
+    if args.latency:
+        # 延迟测量模式
+        tester.run_latency_comparison(args.latency_command, args.latency)
+    elif args.test:
         # 批量测试模式
         commands = [cmd.strip() for cmd in args.test.split(',')]
         print(f"批量测试模式，指令: {commands}")
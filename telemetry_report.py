@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+遥测数据统计程序
+对遥测数据库（Config.TELEMETRY_DB_PATH）执行预置统计查询：
+各指令响应耗时、按板/类型/光照条件的识别成功率、每日任务耗时、各会话错误数。
+系统运行中也可以查询（WAL模式下读取不阻塞写入）。
+
+示例:
+    python telemetry_report.py
+    python telemetry_report.py logs/telemetry.db --query recognition --since 2025-06-01
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# 添加模块路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from modules.telemetry import SUMMARY_QUERIES, run_summary
+
+def parse_time(text):
+    """解析时间参数为时间戳（YYYY-MM-DD [HH:MM[:SS]]）"""
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, time_format).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析的时间: {text}")
+
+def print_table(columns, rows):
+    """按列宽对齐输出（中文字符按两个字符宽度计算）"""
+    def width(text):
+        return sum(2 if ord(char) > 0x2e80 else 1 for char in text)
+    
+    cells = [[str(column) for column in columns]] + [['' if value is None else str(value) for value in row]
+                                                     for row in rows]
+    widths = [max(width(row[index]) for row in cells) for index in range(len(columns))]
+    for row in cells:
+        print('  '.join(cell + ' ' * (widths[index] - width(cell)) for index, cell in enumerate(row)))
+
+def main():
+    parser = argparse.ArgumentParser(description='遥测数据统计程序')
+    parser.add_argument('db_path', nargs='?', default='logs/telemetry.db',
+                        help='遥测数据库路径 (默认: logs/telemetry.db)')
+    parser.add_argument('--query', '-q', choices=sorted(SUMMARY_QUERIES), action='append',
+                        help='统计查询（可重复指定，默认全部）')
+    parser.add_argument('--since', '-s', type=parse_time, help='开始时间（YYYY-MM-DD [HH:MM[:SS]]）')
+    parser.add_argument('--until', '-u', type=parse_time, help='结束时间（YYYY-MM-DD [HH:MM[:SS]]）')
+    
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.db_path):
+        print(f"遥测数据库不存在: {args.db_path}（需在配置中启用TELEMETRY_ENABLED）", file=sys.stderr)
+        return 1
+    
+    for name in args.query or SUMMARY_QUERIES:
+        title, _ = SUMMARY_QUERIES[name]
+        try:
+            columns, rows = run_summary(args.db_path, name, args.since, args.until)
+        except sqlite3.Error as e:
+            print(f"查询失败: {str(e)}", file=sys.stderr)
+            return 1
+        print(f"\n{title}")
+        print('=' * 50)
+        if rows:
+            print_table(columns, rows)
+        else:
+            print("无数据")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,17 +5,62 @@
 用于测试各个模块的基本功能
 """
 
+import gzip
 import os
+import pty
+import select
+import selectors
 import sys
+import tempfile
+import threading
 import time
+import tty
 
 # 添加模块路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
 
 # 导入模块
 from logger import SystemLogger
+from structured_log import read_structured_log
+from log_index import LogIndex, count_logs, query_logs, _open_log_at
+from logger import LogArchiver, lock_log_file
+from log_replayer import parse_log_files
 from voice_player import VoicePlayer
 from image_recognition import ImageRecognition
+from serial_comm import SerialCommunication, discover_ports
+from session_manager import SessionManager
+from task_controller import TaskController
+from simulation import NullVoicePlayer
+from sequenced_protocol import SEQUENCE_MODULUS, SequenceTracker
+from binary_protocol import (
+    BinaryFramer, OP_CHECK_WINDOW, OP_NAK, OP_OK, OP_QR_RESULTS, OP_START, OP_TEXT,
+    decode_qr_results, encode_command, encode_frame, encode_response
+)
+
+def open_virtual_port(link=None):
+    """创建一对伪终端（原始模式），可选用符号链接模拟固定的设备路径
+    
+    Returns:
+        tuple: (主端fd, 从端fd, 串口路径)
+    """
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    port = os.ttyname(slave_fd)
+    if link:
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(port, link)
+        port = link
+    return master_fd, slave_fd, port
+
+def wait_until(condition, timeout=5.0):
+    """等待条件成立"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
 
 def test_logger():
     """测试日志系统"""
@@ -44,6 +89,248 @@ def test_logger():
     logger.stop()
     print("日志系统测试完成")
     
+def test_structured_log_fields():
+    """测试结构化日志对无法直接编码的字段值的处理"""
+    print("\n=== 测试结构化日志字段编码 ===")
+    
+    for structured_format in ('jsonl', 'binary'):
+        log_dir = tempfile.mkdtemp()
+        logger = SystemLogger(log_dir=log_dir, structured_format=structured_format, console_rate=None)
+        logger.start()
+        logger.log("系统", "超长字段", text='长' * 30000, **{'字段' * 100: 1})
+        logger.log("系统", "非基本类型字段", value=object(), big=2 ** 70, items={1, 2})
+        logger.log("系统", "之后的日志")
+        logger.flush_logs()
+        
+        # 同一批的日志都写入文字日志、结构化日志和最近日志
+        records = [record for record in read_structured_log(logger.structured_file)
+                   if record['msg'] in ("超长字段", "非基本类型字段", "之后的日志")]
+        assert [record['msg'] for record in records] == ["超长字段", "非基本类型字段", "之后的日志"]
+        assert str(records[1]['big']) == str(2 ** 70) and records[1]['items'] == '{1, 2}'
+        if structured_format == 'binary':
+            assert len(records[0]['text'].encode('utf-8')) <= 65535
+        assert "之后的日志" in logger.get_recent_logs(1)[0]
+        print(f"  {structured_format}: {len(records)}条记录")
+        logger.stop()
+        
+        remove_log_dir(log_dir)
+    print("结构化日志字段编码测试完成")
+    
+def read_log_messages(path, event_types):
+    """读取文字日志中指定事件类型的消息"""
+    messages = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            for event_type in event_types:
+                prefix = f"] [{event_type}] "
+                if prefix in line:
+                    messages.append((event_type, line.rstrip('\n').split(prefix, 1)[1]))
+    return messages
+    
+def remove_log_dir(log_dir):
+    """删除测试用的日志目录"""
+    for name in os.listdir(log_dir):
+        os.remove(os.path.join(log_dir, name))
+    os.rmdir(log_dir)
+    
+def test_repeat_collapse():
+    """测试重复日志合并（连续重复的日志、指令-响应对）"""
+    print("\n=== 测试重复日志合并 ===")
+    
+    log_dir = tempfile.mkdtemp()
+    logger = SystemLogger(log_dir=log_dir, repeat_window=10.0, console_rate=None)
+    logger.start()
+    
+    # 连续重复的单条日志
+    for _ in range(5):
+        logger.log("识别", "未识别到二维码")
+    logger.log("识别", "识别到二维码")
+    
+    # 连续重复的指令-响应对（响应相同）
+    for latency in (0.010, 0.020, 0.030):
+        logger.log_uart_receive("ping")
+        logger.log_uart_send("pong", latency=latency)
+    # 响应不同：结束合并，指令和响应照常写入
+    logger.log_uart_receive("ping")
+    logger.log_uart_send("error")
+    # 只有指令没有响应时不单独合并
+    logger.log_uart_receive("check A")
+    logger.log_uart_receive("check A")
+    # flush_logs立即写入汇总
+    logger.log("识别", "识别到二维码")
+    logger.log("识别", "识别到二维码")
+    logger.flush_logs()
+    
+    def short(message):
+        # "ping （又重复2次，12:00:00.000 ~ 12:00:01.000）" -> "ping +2"
+        if ' （又重复' not in message:
+            return message
+        original, rest = message.split(' （又重复', 1)
+        return f"{original} +{rest.split('次', 1)[0]}"
+        
+    messages = [(event_type, short(message))
+                for event_type, message in read_log_messages(logger.log_file, ('识别', 'UART接收', 'UART发送'))]
+    expected = [
+        ('识别', '未识别到二维码'), ('识别', '未识别到二维码 +4'), ('识别', '识别到二维码'),
+        ('UART接收', 'ping'), ('UART发送', 'pong'), ('UART接收', 'ping +2'), ('UART发送', 'pong +2'),
+        ('UART接收', 'ping'), ('UART发送', 'error'),
+        ('UART接收', 'check A'), ('UART接收', 'check A'),
+        ('识别', '识别到二维码'), ('识别', '识别到二维码 +1'),
+    ]
+    assert messages == expected, f"合并结果错误: {messages}"
+    
+    # 汇总保留响应耗时统计
+    summary = [record for record in read_structured_log(logger.structured_file)
+               if record['type'] == 'UART发送' and record.get('repeat')][0]
+    assert summary['repeat'] == 2 and summary['msg'] == 'pong'
+    assert abs(summary['latency'] - 0.025) < 1e-9
+    assert (summary['latency_min'], summary['latency_max']) == (0.020, 0.030)
+    print("  单条日志、指令-响应对和flush_logs合并正常")
+    
+    # 日志回放展开汇总为各次指令
+    commands = [(entry['command'], entry['reply']) for entry in parse_log_files([logger.log_file])]
+    assert commands.count(('ping', 'pong')) == 3 and ('ping', 'error') in commands
+    assert commands.count(('check A', None)) == 2
+    
+    # 日志查询把汇总行当作原指令
+    results = [text for _, text in query_logs([log_dir], command='ping', reply='pong')]
+    assert len(results) == 2 and '又重复2次' in results[1], f"查询结果错误: {results}"
+    print("  日志回放和查询解析汇总行")
+    logger.stop()
+    remove_log_dir(log_dir)
+    
+    # 窗口到期：之后的重复重新开始计数
+    log_dir = tempfile.mkdtemp()
+    logger = SystemLogger(log_dir=log_dir, repeat_window=0.3, console_rate=None)
+    logger.start()
+    logger.log("识别", "未识别到二维码")
+    logger.log("识别", "未识别到二维码")
+    time.sleep(0.5)
+    logger.log("识别", "未识别到二维码")
+    logger.flush_logs()
+    messages = [message for _, message in read_log_messages(logger.log_file, ('识别',))]
+    assert len(messages) == 3 and '又重复1次' in messages[1] and messages[2] == '未识别到二维码', messages
+    print("  窗口到期后写入汇总")
+    logger.stop()
+    remove_log_dir(log_dir)
+    print("重复日志合并测试完成")
+    
+def write_test_log(path, start_minute, minutes, mode='w'):
+    """写入测试日志：每秒一条指令及其响应，每分钟一条错误"""
+    lines = []
+    for minute in range(start_minute, start_minute + minutes):
+        for second in range(60):
+            timestamp = f"2025-06-28 12:{minute:02d}:{second:02d}"
+            command = ('check A', 'check 1', 'ping')[second % 3]
+            reply = {'check A': 'no_sample', 'check 1': 'wait' if second % 2 else 'ok', 'ping': 'pong'}[command]
+            lines.append(f"[{timestamp}] [UART接收] {command}\n[{timestamp}] [UART发送] {reply}\n")
+            if second == 30:
+                lines.append(f"[{timestamp}] [错误] 识别超时 {minute}\n")
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(''.join(lines))
+        
+def scan_test_log(path, since=None, until=None):
+    """逐行扫描日志得到期望的查询结果：(各事件类型条数, 指令-响应对列表)"""
+    counts, pairs, pending = {}, [], None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            timestamp, event_type, message = line[1:20], line[23:line.index('] ', 23)], line.rstrip('\n').split('] ', 2)[2]
+            if (since and timestamp < since) or (until and timestamp > until):
+                continue
+            counts[event_type] = counts.get(event_type, 0) + 1
+            if event_type == 'UART接收':
+                pending = (line, message)
+            elif event_type == 'UART发送' and pending:
+                pairs.append((pending[1], message, pending[0] + line))
+                pending = None
+    return counts, pairs
+    
+def test_log_index():
+    """测试日志索引：增量索引、按块压缩后的定位、按时间/类型/指令查询"""
+    print("\n=== 测试日志索引 ===")
+    
+    log_dir = tempfile.mkdtemp()
+    path = os.path.join(log_dir, 'pharmacy_robot_20250628_120000.log')
+    write_test_log(path, 0, 20)
+    index = LogIndex(log_dir)
+    
+    # 增量索引：只索引新增的完整行
+    entry = index.update(path)
+    blocks, size = len(entry['blocks']), entry['size']
+    assert blocks > 1 and size == os.path.getsize(path)
+    write_test_log(path, 20, 20, mode='a')
+    partial = "[2025-06-28 12:40:00] [UART接收] che"
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(partial)
+    first_blocks = entry['blocks'][:blocks]
+    entry = index.update(path)
+    assert entry['blocks'][:blocks] == first_blocks, "已索引的块被重新索引"
+    assert len(entry['blocks']) > blocks
+    assert entry['size'] == os.path.getsize(path) - len(partial.encode('utf-8')), "不完整的行被索引"
+    assert entry['types']['错误'] == 40
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("ck A\n[2025-06-28 12:40:00] [UART发送] no_sample\n")
+    assert index.update(path)['size'] == os.path.getsize(path)
+    print(f"  增量索引: {len(index.load()[os.path.basename(path)]['blocks'])}块")
+    
+    def check_queries(label):
+        # 与逐行扫描的结果一致
+        for since, until in ((None, None), ('2025-06-28 12:05:30', '2025-06-28 12:17:10'),
+                             ('2025-06-28 12:39:00', None), ('2025-06-28 13:00:00', None)):
+            counts, pairs = scan_test_log(path, since, until)
+            assert count_logs([log_dir], since, until) == counts, f"{label}: 统计结果错误 {since}~{until}"
+            errors = [text for _, text in query_logs([log_dir], since, until, event_types=['错误'])]
+            assert len(errors) == counts.get('错误', 0)
+            found = [text for _, text in query_logs([log_dir], since, until, command='check 1', reply='wait')]
+            assert found == [text for command, reply, text in pairs if (command, reply) == ('check 1', 'wait')], \
+                f"{label}: 指令查询结果错误 {since}~{until}"
+        assert list(query_logs([log_dir], text='识别超时 33'))[0][1].endswith("识别超时 33\n")
+        
+    check_queries("未压缩")
+    print("  按时间、类型和指令查询正常")
+    
+    # 归档：索引后按块压缩，查询从块所在的gzip成员开始解压
+    with open(path, 'rb') as f:
+        original = f.read()
+    archiver = LogArchiver(log_dir, 'pharmacy_robot_*.log', retention_days=0, index=LogIndex(log_dir))
+    archiver.start()
+    archiver.submit([path])
+    assert wait_until(lambda: os.path.exists(path + '.gz') and not os.path.exists(path))
+    assert wait_until(lambda: 'members' in LogIndex(log_dir).load()[os.path.basename(path)])
+    archiver.stop()
+    entry = LogIndex(log_dir).load()[os.path.basename(path)]
+    assert entry['closed'] and len(entry['members']) == len(entry['blocks'])
+    for offset, length, _, _, _, _ in entry['blocks']:
+        with _open_log_at(path + '.gz', entry, offset) as f:
+            assert isinstance(f, gzip.GzipFile) and f.read(length) == original[offset:offset + length]
+    
+    # 用未压缩的内容作为期望结果
+    path = os.path.join(tempfile.mkdtemp(), os.path.basename(path))
+    with open(path, 'wb') as f:
+        f.write(original)
+    check_queries("按块压缩")
+    print(f"  压缩后按{len(entry['members'])}个gzip成员定位查询")
+    
+    # 保留期清理：过期文件删除，仍在写入的文件即使过期也保留
+    expired = time.time() - 40 * 24 * 3600
+    stale = os.path.join(log_dir, 'pharmacy_robot_20250101_000000.log')
+    active = os.path.join(log_dir, 'pharmacy_robot_20250102_000000.log')
+    for name in (stale, active):
+        with open(name, 'w', encoding='utf-8') as f:
+            f.write("[2025-01-01 00:00:00] [系统] 启动\n")
+        os.utime(name, (expired, expired))
+    with lock_log_file(open(active, 'a', encoding='utf-8')):
+        LogArchiver(log_dir, 'pharmacy_robot_*.log', retention_days=30)._enforce_retention()
+        assert not os.path.exists(stale), "过期日志未删除"
+        assert os.path.exists(active), "正在写入的日志被删除"
+    os.remove(active)
+    print("  保留期清理跳过正在写入的文件")
+    
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+    remove_log_dir(log_dir)
+    print("日志索引测试完成")
+    
 def test_voice_player():
     """测试语音播报系统"""
     print("\n=== 测试语音播报系统 ===")
@@ -137,6 +424,444 @@ def test_mappings():
     logger.stop()
     print("映射关系测试完成")
     
+class VirtualRobotLink:
+    """伪终端上的串口通信和任务控制器，测试代码在主端扮演下位机"""
+    
+    def __init__(self, logger, pipelining=False):
+        self.master_fd, self.slave_fd, port = open_virtual_port()
+        self.serial_comm = SerialCommunication(port=port, timeout=0.1, auto_reconnect=False)
+        self.controller = TaskController(logger, self.serial_comm, ImageRecognition(logger),
+                                         NullVoicePlayer(logger), pipelining=pipelining)
+        self.serial_comm.set_data_callback(self.controller.handle_command, with_timestamp=True)
+        self.framer = BinaryFramer()
+        self.buffer = b''
+        assert self.serial_comm.connect(), "串口连接失败"
+        self.controller.start()
+        
+    def send(self, data):
+        """下位机发送（文本行或原始字节）"""
+        os.write(self.master_fd, data if isinstance(data, bytes) else (data + '\n').encode('utf-8'))
+        
+    def _read(self, timeout):
+        ready, _, _ = select.select([self.master_fd], [], [], timeout)
+        return os.read(self.master_fd, 4096) if ready else b''
+        
+    def read_lines(self, count, timeout=3.0):
+        """读取count行响应（超时返回已读到的行）"""
+        deadline = time.monotonic() + timeout
+        while self.buffer.count(b'\n') < count and time.monotonic() < deadline:
+            self.buffer += self._read(deadline - time.monotonic())
+        lines = self.buffer.split(b'\n')
+        self.buffer = b'\n'.join(lines[count:])
+        return [line.decode('utf-8').strip() for line in lines[:count]]
+        
+    def read_frames(self, count, timeout=3.0):
+        """读取count个二进制响应帧"""
+        frames = []
+        deadline = time.monotonic() + timeout
+        while len(frames) < count and time.monotonic() < deadline:
+            chunk = self._read(deadline - time.monotonic())
+            if chunk:
+                frames.extend(self.framer.feed(chunk)[0])
+        return frames
+        
+    def close(self):
+        self.controller.stop()
+        self.serial_comm.disconnect()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+        
+def test_serial_reconnect():
+    """测试串口断开后自动重连（伪终端模拟USB转串口适配器拔出后重新插入）"""
+    print("\n=== 测试串口自动重连 ===")
+    
+    link = os.path.join(tempfile.mkdtemp(), 'ttyROBOT')
+    master_fd, slave_fd, port = open_virtual_port(link)
+    
+    serial_comm = SerialCommunication(port=port, timeout=0.1)
+    serial_comm.reconnect_initial_delay = 0.1
+    events = []
+    serial_comm.set_connection_callback(events.append)
+    assert serial_comm.connect(), "串口连接失败"
+    
+    try:
+        os.write(master_fd, b'start\n')
+        assert serial_comm.receive_queue.get(timeout=2) == 'start'
+        
+        # 拔出：关闭伪终端，接收线程读到错误后交给监督线程重连
+        print("模拟串口断开...")
+        os.close(master_fd)
+        os.close(slave_fd)
+        assert wait_until(lambda: False in events), "未检测到串口断开"
+        assert not serial_comm.is_connected()
+        
+        # 断线期间发送的响应保留在队列中，重连后发出
+        serial_comm.send_command("ok")
+        
+        # 插回：同一路径指向新的伪终端
+        print("模拟串口重新插入...")
+        master_fd, slave_fd, _ = open_virtual_port(link)
+        assert wait_until(lambda: True in events), "串口未重连"
+        print(f"重连成功，重连次数: {serial_comm.reconnect_count}")
+        
+        os.write(master_fd, b'check board 1\n')
+        assert serial_comm.receive_queue.get(timeout=2) == 'check board 1'
+        assert wait_until(lambda: os.read(master_fd, 64) == b'ok\n'), "断线期间的响应未发出"
+    finally:
+        serial_comm.disconnect()
+        for fd in (master_fd, slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        os.remove(link)
+        os.rmdir(os.path.dirname(link))
+    print("串口自动重连测试完成")
+    
+def test_serial_wait_for_port():
+    """测试首次连接时串口不存在，之后出现时由监督线程打开"""
+    print("\n=== 测试等待串口出现 ===")
+    
+    link = os.path.join(tempfile.mkdtemp(), 'ttyROBOT')
+    serial_comm = SerialCommunication(port=link, timeout=0.1)
+    serial_comm.reconnect_initial_delay = 0.1
+    events = []
+    serial_comm.set_connection_callback(events.append)
+    master_fd = slave_fd = None
+    
+    try:
+        assert not serial_comm.connect(wait_for_port=True)
+        master_fd, slave_fd, _ = open_virtual_port(link)
+        assert wait_until(lambda: True in events), "串口出现后未连接"
+        os.write(master_fd, b'start\n')
+        assert serial_comm.receive_queue.get(timeout=2) == 'start'
+    finally:
+        serial_comm.disconnect()
+        for fd in (master_fd, slave_fd):
+            if fd is not None:
+                os.close(fd)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.rmdir(os.path.dirname(link))
+    print("等待串口出现测试完成")
+    
+def test_port_discovery():
+    """测试并行探测机器人串口（伪终端：一个应答握手，一个不应答，一个不存在）"""
+    print("\n=== 测试串口探测 ===")
+    
+    robot_master, robot_slave, robot_port = open_virtual_port()
+    silent_master, silent_slave, silent_port = open_virtual_port()
+    
+    def answer_handshake():
+        data = b''
+        while b'ping\n' not in data:
+            data += os.read(robot_master, 64)
+        os.write(robot_master, b'pong\n')
+        
+    responder = threading.Thread(target=answer_handshake)
+    responder.daemon = True
+    responder.start()
+    
+    try:
+        start_time = time.monotonic()
+        ports = discover_ports([silent_port, '/dev/nonexistent_tty', robot_port], timeout=1.0)
+        elapsed = time.monotonic() - start_time
+        print(f"探测结果: {ports}，耗时 {elapsed:.2f}s")
+        assert ports == [robot_port], f"探测结果错误: {ports}"
+        # 并行握手：总耗时约为一次握手超时
+        assert elapsed < 1.9, f"探测耗时过长: {elapsed:.2f}s"
+    finally:
+        for fd in (robot_master, robot_slave, silent_master, silent_slave):
+            os.close(fd)
+    print("串口探测测试完成")
+    
+def test_session_io_recovery():
+    """测试多会话共享I/O线程在等待出错后恢复（伪终端模拟两台机器人）"""
+    print("\n=== 测试会话I/O恢复 ===")
+    
+    log_dir = tempfile.mkdtemp()
+    ports = [open_virtual_port() for _ in range(2)]
+    manager = SessionManager([{'name': f'robot{index + 1}', 'port': port, 'baudrate': 115200,
+                               'timeout': 0.1, 'camera_device_id': 0}
+                              for index, (_, _, port) in enumerate(ports)],
+                             log_dir=log_dir, log_options={'console_rate': None})
+    manager.start()
+    
+    def ping_all():
+        for master_fd, _, _ in ports:
+            os.write(master_fd, b'ping\n')
+        for master_fd, _, _ in ports:
+            ready, _, _ = select.select([master_fd], [], [], 3)
+            assert ready and os.read(master_fd, 64) == b'pong\n', "会话未响应"
+            
+    try:
+        ping_all()
+        
+        # 监听中混入已关闭的文件描述符，且一次等待出错
+        read_fd, write_fd = os.pipe()
+        with manager.selector_lock:
+            manager.selector.register(read_fd, selectors.EVENT_READ, manager.sessions['robot1'])
+        os.close(read_fd)
+        os.close(write_fd)
+        selector = manager.selector
+        original_select = selector.select
+        failures = []
+        
+        def failing_select(timeout=None):
+            if not failures:
+                failures.append(1)
+                raise OSError("模拟的I/O等待错误")
+            return original_select(timeout)
+            
+        selector.select = failing_select
+        assert wait_until(lambda: failures), "I/O线程未运行"
+        assert wait_until(lambda: read_fd not in [key.fd for key in selector.get_map().values()]), \
+            "失效的文件描述符未移除"
+        assert manager.io_thread.is_alive(), "I/O线程已退出"
+        ping_all()
+        print("  等待出错后两个会话仍正常响应")
+    finally:
+        manager.stop()
+        for master_fd, slave_fd, _ in ports:
+            os.close(master_fd)
+            os.close(slave_fd)
+        for root, directories, files in os.walk(log_dir, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+            for name in directories:
+                os.rmdir(os.path.join(root, name))
+        os.rmdir(log_dir)
+    print("会话I/O恢复测试完成")
+    
+def decode_response_frame(frame):
+    """解码单个响应帧，返回(操作码, 负载)"""
+    framer = BinaryFramer()
+    frames, errors = framer.feed(frame)
+    assert errors == 0 and len(frames) == 1, f"响应帧无效: {frame!r}"
+    return frames[0]
+    
+def test_sequence_tracker():
+    """测试序列号跟踪：丢帧、重复帧、回绕和序列号重新开始"""
+    print("\n=== 测试序列号跟踪 ===")
+    
+    tracker = SequenceTracker()
+    assert tracker.register(0, 'start') == (SequenceTracker.NEW, [])
+    assert tracker.register(3, 'check A') == (SequenceTracker.NEW, [1, 2]), "丢帧未检测到"
+    assert tracker.register(1, 'check board 1') == (SequenceTracker.NEW, []), "迟到的重传帧未按新指令处理"
+    assert tracker.register(3, 'check A') == (SequenceTracker.DUPLICATE_PENDING, [])
+    tracker.record_reply(3, 'collected')
+    assert tracker.register(3, 'check A') == (SequenceTracker.DUPLICATE_ANSWERED, [])
+    assert tracker.cached_reply(3) == 'collected'
+    print(f"  丢帧{tracker.lost_count}个，重复帧{tracker.duplicate_count}个")
+    
+    # 回绕：65535之后是0，不算丢帧
+    tracker = SequenceTracker()
+    tracker.register(SEQUENCE_MODULUS - 2, 'check 1')
+    tracker.register(SEQUENCE_MODULUS - 1, 'check 2')
+    assert tracker.register(0, 'check 3') == (SequenceTracker.NEW, [])
+    assert tracker.register(2, 'check 4') == (SequenceTracker.NEW, [1])
+    assert tracker.register(SEQUENCE_MODULUS - 1, 'check 2')[0] == SequenceTracker.DUPLICATE_PENDING
+    print("  序列号回绕正常")
+    
+    # 重新开始：缓存中的序列号带来不同的指令，或远早于期望值
+    tracker = SequenceTracker()
+    for seq in range(41):
+        tracker.register(seq, 'check A')
+        tracker.record_reply(seq, 'ok')
+    assert tracker.register(0, 'start') == (SequenceTracker.NEW, []), "重启后的序列号被当作重复帧"
+    assert tracker.cached_reply(5) is None
+    tracker = SequenceTracker()
+    tracker.register(1000, 'check A')
+    assert tracker.register(10, 'start') == (SequenceTracker.NEW, [])
+    assert tracker.register(11, 'check B') == (SequenceTracker.NEW, [])
+    print("  序列号重新开始被检测到")
+    print("序列号跟踪测试完成")
+    
+def test_pipelining():
+    """测试带序列号的指令流水线（伪终端模拟下位机）"""
+    print("\n=== 测试指令流水线 ===")
+    
+    logger = SystemLogger()
+    logger.start()
+    link = VirtualRobotLink(logger, pipelining=True)
+    started = []
+    link.controller.command_handlers['start'] = lambda: started.append(1) or "ok"
+    link.controller.command_handlers['slow'] = lambda: time.sleep(0.5) or "done"
+    
+    try:
+        # 乱序响应：慢指令先发，快指令的响应先返回
+        link.send("#1 start")
+        assert link.read_lines(1) == ['#1 ok']
+        link.send("#2 slow")
+        link.send("#3 ping")
+        assert link.read_lines(2) == ['#3 pong', '#2 done'], "响应未按完成顺序返回"
+        print("  乱序响应正常")
+        
+        # 丢帧：请求重传缺失的序列号
+        link.send("#6 ping")
+        assert sorted(link.read_lines(3)) == ['#4 resend', '#5 resend', '#6 pong']
+        print("  丢帧请求重传")
+        
+        # 重复帧：重发缓存的响应，不重复执行（包括start）
+        link.send("#6 ping")
+        link.send("#1 start")
+        assert link.read_lines(2) == ['#6 pong', '#1 ok']
+        assert len(started) == 1, "重发的start被再次执行"
+        print("  重复帧从缓存响应")
+        
+        # 回绕
+        link.send(f"#{SEQUENCE_MODULUS - 1} start")
+        link.send("#0 ping")
+        assert link.read_lines(2) == [f'#{SEQUENCE_MODULUS - 1} ok', '#0 pong']
+        assert len(started) == 2
+        print("  序列号回绕正常")
+        
+        # 下位机不发start直接重启：缓存中的序列号带来不同的指令时重新执行
+        link.send("#0 over")
+        assert link.read_lines(1) == ['#0 ok'], "重启后的指令收到了缓存的响应"
+        print("  下位机重启被检测到")
+    finally:
+        link.close()
+        logger.stop()
+    print("指令流水线测试完成")
+    
+def test_batch_commands():
+    """测试批量查询指令的展开和合并响应"""
+    print("\n=== 测试批量查询指令 ===")
+    
+    logger = SystemLogger()
+    logger.start()
+    link = VirtualRobotLink(logger)
+    link.controller.qr_results = {'top_left': 'A', 'top_right': 'AB'}
+    
+    try:
+        link.send("check A,B,C")
+        assert link.read_lines(1) == ['A=collected:静脉血样本,唾液样本;B=collected:唾液样本;C=no_sample']
+        link.send("check A-C")
+        assert link.read_lines(1) == ['A=collected:静脉血样本,唾液样本;B=collected:唾液样本;C=no_sample']
+        link.send("check 1-4")
+        assert link.read_lines(1) == ['1=wait;2=wait;3=ok;4=ok']
+        link.send("check 1, 3")
+        assert link.read_lines(1) == ['1=wait;3=ok']
+        print("  列表和范围展开正常")
+        
+        # 无效的批量指令按未知指令处理
+        for command in ("check 4-1", "check 1-999999", "check 1-5", "check A-Z", "check board 1,2",
+                        "check A,", "check A-", "check 1-B", "check X,Y"):
+            link.send(command)
+            assert link.read_lines(1) == ['error'], f"{command} 应返回error"
+        assert link.controller._expand_batch_command("check board 1") is None
+        print("  无效范围返回error")
+        
+        # 单项指令的响应与批量指令中的一致
+        link.send("check 2")
+        assert link.read_lines(1) == ['wait']
+    finally:
+        link.close()
+        logger.stop()
+    print("批量查询指令测试完成")
+    
+def test_binary_response_encoding():
+    """测试二进制响应编码不丢失二维码内容"""
+    print("\n=== 测试二进制响应编码 ===")
+    
+    # 窗口组合：紧凑编码，往返一致
+    for response in ("top_left:AB,top_right:C", "bottom_left:ABC", "top_left:A,bottom_right:BC"):
+        opcode, payload = decode_response_frame(encode_response(response))
+        assert opcode == OP_QR_RESULTS, f"{response} 未使用紧凑编码"
+        assert decode_qr_results(payload) == dict(part.split(':', 1) for part in response.split(','))
+        print(f"  {response} -> 紧凑编码")
+        
+    # 其他内容：紧凑编码无法表示，以文本帧原样传输
+    for response in ("top_left:HELLO-123", "top_left:a:b", "top_left:ab", "top_left:BA",
+                     "top_left:AAB", "top_left:", "top_left:A,top_left:B", "top_left:A,center:B"):
+        opcode, payload = decode_response_frame(encode_response(response))
+        assert opcode == OP_TEXT, f"{response} 不应使用紧凑编码"
+        assert payload.decode('utf-8') == response
+        print(f"  {response} -> 文本帧")
+    print("二进制响应编码测试完成")
+    
+def test_binary_framer():
+    """测试二进制分帧：重新同步、跨读取拼帧、CRC错误、负载上限"""
+    print("\n=== 测试二进制分帧 ===")
+    
+    start = encode_frame(OP_START)
+    check_b = encode_frame(OP_CHECK_WINDOW, b'B')
+    
+    # 帧前的噪声（包括单独的起始字节）被跳过
+    framer = BinaryFramer()
+    frames, errors = framer.feed(b'\x00\xff\xa5\x13' + start + check_b)
+    assert frames == [(OP_START, b''), (OP_CHECK_WINDOW, b'B')], f"重新同步失败: {frames}"
+    assert errors == 1 and not framer.buffer
+    print(f"  噪声后重新同步: {len(frames)}帧，损坏{errors}次")
+    
+    # 一帧分多次读到：不完整时等待，不计为错误
+    framer = BinaryFramer()
+    for index in range(len(check_b) - 1):
+        assert framer.feed(check_b[index:index + 1]) == ([], 0)
+    assert framer.feed(check_b[-1:]) == ([(OP_CHECK_WINDOW, b'B')], 0)
+    print("  跨读取拼帧正常")
+    
+    # CRC错误：丢弃该帧，后面的帧正常解析
+    corrupted = bytearray(check_b)
+    corrupted[4] ^= 0x01
+    frames, errors = BinaryFramer().feed(bytes(corrupted) + start)
+    assert frames == [(OP_START, b'')] and errors == 1
+    print("  CRC错误帧被丢弃")
+    
+    # 负载超过操作码上限（错误的起始字节）：立即判定为损坏，不等待后续数据
+    framer = BinaryFramer()
+    frames, errors = framer.feed(bytes((0xA5, 0x03, 0xE8, OP_START)))
+    assert frames == [] and errors == 1 and not framer.buffer
+    frames, errors = framer.feed(bytes((0xA5, 0x00, 0x05, OP_CHECK_WINDOW)) + start)
+    assert frames == [(OP_START, b'')] and errors == 1
+    frames, errors = framer.feed(bytes((0xA5, 0x00, 0x00, 0x42)) + start)
+    assert frames == [(OP_START, b'')] and errors == 1, "未知操作码未被拒绝"
+    print("  超长负载和未知操作码被拒绝")
+    print("二进制分帧测试完成")
+    
+def test_binary_mode_switch():
+    """测试ASCII与二进制协议切换，以及损坏帧的重发请求"""
+    print("\n=== 测试协议模式切换 ===")
+    
+    logger = SystemLogger()
+    logger.start()
+    link = VirtualRobotLink(logger)
+    
+    try:
+        link.send("ping")
+        assert link.read_lines(1) == ['pong']
+        
+        # mode binary的ok仍以ASCII发送，之后使用二进制帧
+        link.send("mode binary")
+        assert link.read_lines(1) == ['ok']
+        assert wait_until(lambda: link.serial_comm.protocol_mode == 'binary')
+        link.send(encode_command('start'))
+        assert link.read_frames(1) == [(OP_OK, b'')]
+        link.send(encode_command('ping'))
+        assert link.read_frames(1) == [(OP_TEXT, b'pong')]
+        print("  二进制模式收发正常")
+        
+        # 损坏的帧：回复NAK，不按未知指令处理
+        corrupted = bytearray(encode_command('ping'))
+        corrupted[-1] ^= 0xFF
+        link.send(bytes(corrupted))
+        assert link.read_frames(1) == [(OP_NAK, b'')]
+        assert link.serial_comm.crc_error_count == 1
+        print("  损坏帧回复NAK")
+        
+        # mode ascii的ok以二进制帧发送，之后恢复文本协议
+        link.send(encode_command('mode ascii'))
+        assert link.read_frames(1) == [(OP_OK, b'')]
+        assert wait_until(lambda: link.serial_comm.protocol_mode == 'ascii')
+        link.send("ping")
+        assert link.read_lines(1) == ['pong']
+        print("  切换回ASCII模式")
+    finally:
+        link.close()
+        logger.stop()
+    print("协议模式切换测试完成")
+    
 def test_integration():
     """集成测试"""
     print("\n=== 集成测试 ===")
@@ -217,9 +942,22 @@ def main():
     try:
         # 运行各项测试
         test_logger()
+        test_structured_log_fields()
+        test_repeat_collapse()
+        test_log_index()
         test_voice_player()
         test_image_recognition()
         test_mappings()
+        test_serial_reconnect()
+        test_serial_wait_for_port()
+        test_port_discovery()
+        test_session_io_recovery()
+        test_sequence_tracker()
+        test_pipelining()
+        test_batch_commands()
+        test_binary_response_encoding()
+        test_binary_framer()
+        test_binary_mode_switch()
         test_integration()
         
         print("\n" + "=" * 50)